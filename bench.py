@@ -0,0 +1,187 @@
+"""
+Benchmarks puzzle generation and verification along the real difficulty schedule.
+
+Difficulty starts at DB().config["difficulty"] and goes up through DB.increment_difficulty once per block,
+so the levels are given as block heights. Results are printed (or written to --output) as JSON:
+
+    python bench.py --heights 0 100 10000 1000000 --repeat 50 --output bench.json
+
+With --startup it also measures, in fresh interpreters, how long importing the node takes and how long the
+first puzzle generation after boot takes.
+"""
+
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+from hashlib import sha256
+
+from blockchain.db import DB
+from sudoku.solver import SudokuSolver
+from sudoku.sudoku_board import SudokuBoard
+from sudoku.sudoku_gen import SudokuGenerator
+
+DEFAULT_HEIGHTS = [0, 10, 100, 1000, 10000, 100000, 1000000]
+
+STARTUP_SCRIPT = """
+import time
+start = time.perf_counter()
+import full_node
+imported = time.perf_counter()
+from sudoku.sudoku_gen import SudokuGenerator
+SudokuGenerator(22, "seed").generate_board()
+print(imported - start, time.perf_counter() - imported)
+"""
+
+
+class BenchmarkFailed(Exception):
+    pass
+
+
+def difficulties_at(heights):
+    """Maps block heights to the difficulty the chain has reached at that height"""
+    db = DB()
+    height, res = 0, {}
+    for target in sorted(heights):
+        while height < target:
+            db.increment_difficulty()
+            height += 1
+        res[target] = db.config["difficulty"]
+    return res
+
+
+def percentile(samples, pct):
+    """Nearest-rank percentile of the samples"""
+    ordered = sorted(samples)
+    return ordered[max(0, -(-len(ordered) * pct // 100) - 1)]
+
+
+def run_once(difficulty, seed, solver_timeout):
+    """Runs every benchmarked operation once, returning their durations in seconds"""
+    times = {}
+
+    start = time.perf_counter()
+    puzzle = SudokuGenerator(difficulty, seed).generate_board()
+    times["generate_board"] = time.perf_counter() - start
+
+    solution = SudokuBoard(puzzle.n, seed)
+    start = time.perf_counter()
+    encoded = solution.encode()
+    times["encode"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    decoded = SudokuBoard.decode(encoded)
+    times["decode"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    if not puzzle.is_valid_solution(decoded):
+        raise BenchmarkFailed(f"Decoded board doesn't solve the puzzle (seed {seed})")
+    times["is_valid_solution"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    if not puzzle.is_valid_solution(SudokuSolver(timeout=solver_timeout).solve(puzzle)):
+        raise BenchmarkFailed(f"Solver returned a wrong solution (seed {seed})")
+    times["solve"] = time.perf_counter() - start
+    return times
+
+
+def bench_level(height, difficulty, repeat, solver_timeout):
+    generator = SudokuGenerator(difficulty, "")
+    samples = {}
+    for i in range(repeat):
+        seed = sha256(f"{height}:{i}".encode()).hexdigest()
+        for op, duration in run_once(difficulty, seed, solver_timeout).items():
+            samples.setdefault(op, []).append(duration)
+
+    # Memory is measured on a separate run since tracing skews the timings
+    tracemalloc.start()
+    run_once(difficulty, sha256(f"{height}:mem".encode()).hexdigest(), solver_timeout)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        "height": height,
+        "difficulty": difficulty,
+        "n": generator.n,
+        "hidden_squares": generator._get_n_and_num_squares()[1],
+        "ops": {
+            op: {
+                "p50_ms": round(percentile(durations, 50) * 1000, 4),
+                "p99_ms": round(percentile(durations, 99) * 1000, 4),
+                "max_ms": round(max(durations) * 1000, 4),
+            }
+            for op, durations in samples.items()
+        },
+        "peak_memory_bytes": peak,
+    }
+
+
+def bench_startup(repeat):
+    samples = {"import_full_node": [], "first_puzzle": []}
+    for _ in range(repeat):
+        out = subprocess.run(
+            [sys.executable, "-W", "ignore", "-c", STARTUP_SCRIPT],
+            capture_output=True,
+            text=True,
+            check=True,
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+        ).stdout.split()
+        samples["import_full_node"].append(float(out[0]))
+        samples["first_puzzle"].append(float(out[1]))
+    return {
+        op: {
+            "p50_ms": round(percentile(durations, 50) * 1000, 4),
+            "p99_ms": round(percentile(durations, 99) * 1000, 4),
+        }
+        for op, durations in samples.items()
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Sudoku generation/verification benchmarks."
+    )
+    parser.add_argument(
+        "--heights",
+        type=int,
+        nargs="+",
+        default=DEFAULT_HEIGHTS,
+        help="Block heights to benchmark at.",
+    )
+    parser.add_argument("--repeat", type=int, default=20, help="Samples per height.")
+    parser.add_argument(
+        "--solver-timeout",
+        type=float,
+        default=30,
+        help="Seconds the solver may spend on one puzzle.",
+    )
+    parser.add_argument(
+        "--startup", action="store_true", help="Also measure node startup time."
+    )
+    parser.add_argument("--output", type=str, help="File to write the JSON report to.")
+    args = parser.parse_args()
+
+    report = {
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "repeat": args.repeat,
+        "levels": [
+            bench_level(height, difficulty, args.repeat, args.solver_timeout)
+            for height, difficulty in sorted(difficulties_at(args.heights).items())
+        ],
+    }
+    if args.startup:
+        report["startup"] = bench_startup(args.repeat)
+    if args.output:
+        with open(args.output, "w") as fp:
+            json.dump(report, fp, indent=2)
+    else:
+        print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
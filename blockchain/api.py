@@ -1,5 +1,6 @@
 from blockchain.blockchain import Blockchain
 from blockchain.db import DB
+from blockchain.verifiers import BlockVerifier
 from .blocks import Tx, Block
 from .wallet.address import Address
 from websocket_server import BlockchainEvent, WebsocketServer
@@ -21,46 +22,64 @@ class API:
         self.bc = Blockchain(DB(), Address.create())
 
     def get_user_balance(self, address):
-        return sum(self.bc.db.unspent_outputs_amount[str(address)].values())
+        return self.bc.db.utxos.balance(str(address))
 
     def get_user_unspent_txs(self, address):
-        res = []
-        for tx_hash, out_hash in self.bc.db.unspent_txs_by_user_hash[str(address)]:
-            amount = self.bc.db.unspent_outputs_amount[str(address)][out_hash]
-            res.extend(
-                {
-                    "tx": tx_hash,
-                    "output_index": index,
-                    "out_hash": out_hash,
-                    "amount": amount,
-                }
-                for index, out in enumerate(
-                    self.bc.db.transaction_by_hash[tx_hash]["outputs"]
-                )
-                if out["hash"] == out_hash
-            )
-
-        return res
+        return [
+            {
+                "tx": tx_hash,
+                "output_index": index,
+                "out_hash": utxo.out_hash,
+                "amount": utxo.amount,
+            }
+            for tx_hash, index, utxo in self.bc.db.utxos.by_address(str(address))
+        ]
 
-    def get_chain(self, from_block: int, limit: int = 20):
-        res = [b.as_dict for b in self.bc.chain[from_block : from_block + limit]]
+    def get_chain_blocks(self, from_block: int, limit: int = 20):
+        res = self.bc.chain[from_block : from_block + limit]
         # adding blocks from splitbrain
         if len(res) < limit:
-            res += self.bc.fork_blocks.values()
+            forks = sorted(self.bc.tree.blocks.values(), key=lambda b: b.index)
+            res += forks[: limit - len(res)]
         return res
 
+    def get_chain(self, from_block: int, limit: int = 20):
+        return [b.as_dict for b in self.get_chain_blocks(from_block, limit)]
+
+    def get_headers(self, from_block: int, limit: int = 20):
+        return [b.header for b in self.bc.chain[from_block : from_block + limit]]
+
+    def get_tx_proof(self, tx_hash: str):
+        block_index = self.bc.db.block_index_by_tx_hash.get(tx_hash)
+        if block_index is None:
+            return None
+        block = self.bc.chain[block_index]
+        tx_index = next(
+            (i for i, tx in enumerate(block.txs) if tx.hash == tx_hash), None
+        )
+        if tx_index is None:
+            return None
+        return {
+            "tx_hash": tx_hash,
+            "tx_index": tx_index,
+            "block": block.header,
+            "proof": block.tx_proof(tx_index),
+        }
+
     def get_block_currently_mining(self, private_key: int):
-        wallet = Address(private_key)
+        wallet = Address.cached(private_key)
         block = self.bc.force_block(wallet)
         puzzle = self.bc.to_puzzle(block)
         return {"puzzle": puzzle, "block": block.as_dict}
 
+    def verify_signatures(self, blocks):
+        BlockVerifier(self.bc.db).verify_signatures(
+            [Block.from_dict(b) for b in blocks]
+        )
+
     def add_block(self, block):
         block = Block.from_dict(block)
-        res = self.bc.add_block(block)
-        if res:
-            self.bc.rollover_block(block)
-        return res
+        return self.bc.add_block(block)
 
     async def mine_block(self, block: Block):
         # Reset the chain if there are more than 10000 blocks
@@ -92,3 +111,6 @@ class API:
 
     def get_head(self):
         return self.bc.head.as_dict if self.bc.head else {}
+
+    def get_head_block(self):
+        return self.bc.head
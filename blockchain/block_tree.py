@@ -0,0 +1,102 @@
+from collections import OrderedDict
+from typing import Dict, List, Optional, Set
+
+from .blocks import Block
+
+
+class BlockTree:
+    """
+    Blocks known off the main chain, indexed by hash: the branches competing with it (up to max_blocks, new
+    blocks are refused once it is full), and orphans, which are kept (up to max_orphans, the oldest are
+    dropped first) until their parent shows up
+
+    Every block on a branch has its parent either on the main chain or in the tree. The tree doesn't know
+    the main chain, Blockchain decides where blocks go and when to switch to a branch (see
+    Blockchain.add_block).
+
+    Attributes:
+        <int> max_blocks: Maximum number of branch blocks kept
+        <int> max_orphans: Maximum number of orphans kept
+
+    Public Methods:
+        <bool> add(Block block): Adds a block to a branch, unless the tree is full
+        <void> add_orphan(Block block): Adds a block whose parent is unknown
+        <Block> get(str block_hash): Gets a branch block (None if unknown)
+        <list> adopt(Block parent): Removes and gets the orphans of the block, dropping those at the wrong height
+        <list> branch(str block_hash): Gets the blocks from the start of the branch to the block
+        <Block> best_tip(): Gets the highest branch block, the first seen on ties (None if empty)
+        <void> discard(str block_hash): Removes a block (which went to the main chain)
+        <void> remove(str block_hash): Removes a block and everything built on it
+        <void> prune(int min_index): Removes the blocks below an index
+    """
+
+    def __init__(self, max_orphans: int = 64, max_blocks: int = 1024) -> None:
+        self.max_orphans = max_orphans
+        self.max_blocks = max_blocks
+        self.blocks: Dict[str, Block] = {}
+        self._children: Dict[str, Set[str]] = {}
+        self.orphans: "OrderedDict[str, Block]" = OrderedDict()
+
+    def __contains__(self, block_hash: str) -> bool:
+        return block_hash in self.blocks or block_hash in self.orphans
+
+    def __len__(self) -> int:
+        return len(self.blocks)
+
+    def add(self, block: Block) -> bool:
+        if len(self.blocks) >= self.max_blocks:
+            return False
+        block_hash = block.hash()
+        self.blocks[block_hash] = block
+        self._children.setdefault(block.prev_hash, set()).add(block_hash)
+        return True
+
+    def add_orphan(self, block: Block) -> None:
+        self.orphans[block.hash()] = block
+        while len(self.orphans) > self.max_orphans:
+            self.orphans.popitem(last=False)
+
+    def get(self, block_hash: str) -> Optional[Block]:
+        return self.blocks.get(block_hash)
+
+    def adopt(self, parent: Block) -> List[Block]:
+        parent_hash = parent.hash()
+        children = [b for b in self.orphans.values() if b.prev_hash == parent_hash]
+        for block in children:
+            del self.orphans[block.hash()]
+        # A block has to be right above its parent, the others can never go on the chain
+        return [b for b in children if b.index == parent.index + 1]
+
+    def branch(self, block_hash: str) -> List[Block]:
+        branch = []
+        block = self.blocks.get(block_hash)
+        while block is not None:
+            branch.append(block)
+            block = self.blocks.get(block.prev_hash)
+        branch.reverse()
+        return branch
+
+    def best_tip(self) -> Optional[Block]:
+        return max(self.blocks.values(), key=lambda b: b.index, default=None)
+
+    def discard(self, block_hash: str) -> None:
+        block = self.blocks.pop(block_hash, None)
+        if block is None:
+            return
+        siblings = self._children.get(block.prev_hash, set())
+        siblings.discard(block_hash)
+        if not siblings:
+            self._children.pop(block.prev_hash, None)
+
+    def remove(self, block_hash: str) -> None:
+        pending = [block_hash]
+        while pending:
+            block_hash = pending.pop()
+            self.discard(block_hash)
+            pending.extend(self._children.pop(block_hash, ()))
+
+    def prune(self, min_index: int) -> None:
+        for block in [b for b in self.blocks.values() if b.index < min_index]:
+            self.discard(block.hash())
+        for block_hash in [h for h, b in self.orphans.items() if b.index < min_index]:
+            del self.orphans[block_hash]
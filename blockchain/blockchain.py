@@ -1,6 +1,8 @@
-from .wallet.elliptic_curve import EllipticCurvePoint
-from sudoku.sudoku_gen import SudokuGenerator
+from sudoku.puzzle_cache import PuzzleCache
+from .block_tree import BlockTree
 from .blocks import Block, Tx, Input, Output
+from .mempool import Mempool
+from .merkle import MerkleTree
 from .verifiers import (
     TxVerifier,
     BlockOutOfChain,
@@ -16,15 +18,18 @@ logger = logging.getLogger("Blockchain")
 
 class Blockchain:
 
+    # How far below the head blocks of other branches are still taken
+    MAX_FORK_DEPTH = 100
+
     __slots__ = (
         "chain",
-        "unconfirmed_transactions",
+        "mempool",
         "db",
         "wallet",
         "on_new_block",
         "on_prev_block",
-        "fork_blocks",
-        "unconfirmed_used_utxos",
+        "tree",
+        "candidate_tree",
     )
 
     def __init__(self, db, wallet: Address, on_new_block=None, on_prev_block=None):
@@ -34,10 +39,17 @@ class Blockchain:
         self.on_new_block = on_new_block
         self.on_prev_block = on_prev_block
 
-        self.unconfirmed_transactions = {}
-        self.unconfirmed_used_utxos = set()
-        self.chain = []
-        self.fork_blocks = {}
+        self.mempool = Mempool(
+            self.db.config["mempool_max_txs"],
+            self.db.config["mempool_max_bytes"],
+            self.db.config["mempool_max_age"],
+        )
+        self.chain = db.chain
+        # Blocks off the chain, see add_block
+        self.tree = BlockTree()
+        # Merkle tree of the last block built by force_block, which the next one is built from
+        self.candidate_tree = MerkleTree()
+        PuzzleCache.get_instance().resize(self.db.config["puzzle_cache_size"])
 
     def create_first_block(self):
         """
@@ -59,160 +71,314 @@ class Blockchain:
         return bv.verify(self.head, block)
 
     def add_block(self, block):
-        if self.head and block.hash() == self.head.hash():
+        """
+        Adds a block and rolls it over when it goes on the head. Blocks for other branches go to the block
+        tree (as orphans while their parent is unknown) if their header checks out (see
+        BlockVerifier.verify_header) and the tree isn't full, and the chain switches to a branch as soon as
+        it is longer (see reorganize). Returns whether the head changed.
+
+        Every block at a height is mined at the same difficulty, so the branch with the most work is the
+        longest one, and on ties the chain stays on the branch it saw first.
+        """
+        if not self.head:
+            try:
+                self.is_valid_block(block)
+            except BlockVerificationFailed as e:
+                logger.error("Block verification failed: %s" % e)
+                return False
+            self.connect_block(block)
+            logger.info("   Block added")
+            return True
+
+        block_hash = block.hash()
+        if block_hash in self.tree or self.on_chain(block_hash, block.index):
             logger.error("Duplicate block")
             return False
-        try:
-            self.is_valid_block(block)
-        except BlockOutOfChain:
-            # Here we covering split brain case only for next 2 leves of blocks
-            # with high difficulty its a rare case, and more then 2 level much more rare.
-            if block.prev_hash == self.head.prev_hash:
-                logger.error("Split Brain detected")
-                self.fork_blocks[block.hash()] = block
+        # Checked on the header alone, so a block from a Block.from_dict never parses its txs
+        if block.index <= self.head.index - self.MAX_FORK_DEPTH:
+            logger.error("Block out of chain")
+            return False
+        # Blocks off the head are only fully verified when the chain switches to them, but they are kept and
+        # served to peers until then, so at least their work and txs have to check out
+        if block.prev_hash != self.head.hash():
+            try:
+                BlockVerifier(self.db).verify_header(
+                    block, self.difficulty_at(block.index)
+                )
+            except BlockVerificationFailed as e:
+                logger.error("Block verification failed: %s" % e)
                 return False
-            else:
-                for b_hash, b in self.fork_blocks.items():
-                    if block.prev_hash == b_hash:
-                        logger.error("Split Brain fixed. Longer chain choosen")
-                        self.rollback_block()
-                        self.chain.append(b)
-                        self.chain.append(block)
-                        self.fork_blocks = {}
-                        return True
-                    logger.error(
-                        "Second Split Brain detected. Not programmed to fix this"
-                    )
-                    return False
-        except BlockVerificationFailed as e:
-            logger.error("Block verification failed: %s" % e)
+        if not self.may_attach(block):
+            logger.error("Block out of chain. Kept until its parent arrives")
+            self.tree.add_orphan(block)
             return False
-        else:
-            self.chain.append(block)
-            self.fork_blocks = {}
-            self.db.increment_difficulty()
+
+        head_changed = False
+        if block.prev_hash == self.head.hash():
+            try:
+                self.is_valid_block(block)
+            except (BlockOutOfChain, BlockVerificationFailed) as e:
+                logger.error("Block verification failed: %s" % e)
+                return False
+            self.connect_block(block)
+            self.tree.prune(self.head.index - self.MAX_FORK_DEPTH)
             logger.info("   Block added")
+            head_changed = True
+        elif self.tree.add(block):
+            logger.error("Split Brain detected")
+        else:
+            logger.error("Too many blocks off the chain. Skipped")
+            return False
+
+        # Orphans waiting for the block can go on it now, and so on
+        parents = [block]
+        while parents:
+            for orphan in self.tree.adopt(parents.pop()):
+                if self.tree.add(orphan):
+                    parents.append(orphan)
+
+        best = self.tree.best_tip()
+        if best is not None and best.index > self.head.index:
+            logger.error("Split Brain fixed. Longer chain choosen")
+            head_changed = self.reorganize(best) or head_changed
+        return head_changed
+
+    def may_attach(self, block):
+        """
+        Whether the parent of the block is known, on the chain or in the block tree
+        """
+        if self.on_chain(block.prev_hash, block.index - 1):
             return True
-        logger.error("Hard chain out of sync")
+        parent = self.tree.get(block.prev_hash)
+        return parent is not None and parent.index == block.index - 1
+
+    def difficulty_at(self, index):
+        """
+        Difficulty of the block at index. The difficulty of the DB is the one of the block after the head, and
+        it goes up by a step with every block.
+        """
+        return self.db.config["difficulty"] + self.db.config["difficulty_step"] * (
+            index - len(self.chain)
+        )
+
+    def on_chain(self, block_hash, index):
+        return 0 <= index < len(self.chain) and self.chain[index].hash() == block_hash
+
+    def connect_block(self, block):
+        """
+        Puts a verified block on the head, returning the mempool txs it took out (see rollover_block). If
+        the block spends outputs that aren't there, it raises KeyError and nothing changes.
+        """
+        self.check_spends(block)
+        self.chain.append(block)
+        self.db.increment_difficulty()
+        return self.rollover_block(block)
+
+    def check_spends(self, block):
+        """
+        Raises KeyError for the first output the block spends that is neither unspent nor created by an
+        earlier tx of the block, or spent twice, so rollover_block never stops halfway
+        """
+        created, used = set(), set()
+        for tx in block.txs:
+            created.update((tx.hash, index) for index in range(len(tx.outputs)))
+            if tx.inputs[0].prev_tx_hash == "COINBASE":
+                continue
+            for inp in tx.inputs:
+                outpoint = (inp.prev_tx_hash, inp.output_index)
+                if outpoint in created:
+                    created.remove(outpoint)
+                elif outpoint in used or self.db.utxos.get(*outpoint) is None:
+                    raise KeyError(outpoint)
+                else:
+                    used.add(outpoint)
+
+    def reorganize(self, tip):
+        """
+        Switches the chain to the branch of the block tree ending at tip: rolls back to the block the branch
+        starts from, then verifies and connects the branch blocks one by one. The blocks rolled back go to
+        the tree. If a branch block is invalid it is dropped (with everything built on it) and the chain
+        goes back to where it was, mempool included, so this takes time proportional to the depth of the
+        fork only.
+        """
+        branch = self.tree.branch(tip.hash())
+        detached = []
+        while self.head and self.head.index >= branch[0].index:
+            detached.append(self.head)
+            self.rollback_block()
+
+        # Pool txs conflicting with the branch blocks, to put back if the branch turns out invalid
+        evicted = []
+        for connected, block in enumerate(branch):
+            try:
+                self.is_valid_block(block)
+                evicted += self.connect_block(block)
+            except Exception as e:
+                logger.error("Fork block verification failed: %s" % e)
+                self.tree.remove(block.hash())
+                self.rollback_blocks(connected)
+                for old in reversed(detached):
+                    self.connect_block(old)
+                self.drop_unspendable_txs()
+                for tx in evicted:
+                    # Ahead of the branch txs spending the same outputs, back from its rollback
+                    self.mempool.remove_block_txs([tx])
+                    try:
+                        self.add_tx(tx)
+                    except Exception as error:
+                        logger.error("Tx not put back in the mempool: %s" % error)
+                return False
+
+        for block in branch:
+            self.tree.discard(block.hash())
+        for old in reversed(detached):
+            self.tree.add(old)
+        self.drop_unspendable_txs()
+        return True
+
+    def drop_unspendable_txs(self):
+        """
+        Drops the txs waiting for a block which spend outputs that are gone, which happens when the txs
+        of rolled back blocks were spent again on the new branch
+        """
+        for tx_hash in self.mempool:
+            tx = self.mempool.get(tx_hash)
+            if any(
+                self.db.utxos.get(inp.prev_tx_hash, inp.output_index) is None
+                for inp in tx.inputs
+            ):
+                self.mempool.remove(tx_hash)
 
     def add_tx(self, tx):
-        if self.db.transaction_by_hash.get(tx.hash):
+        if tx.hash in self.mempool or tx.hash in self.db.block_index_by_tx_hash:
             return False
         tv = TxVerifier(self.db)
         fee = tv.verify(tx.inputs, tx.outputs)
-        for input in tx.inputs:
-            if (input.prev_tx_hash, input.output_index) in self.unconfirmed_used_utxos:
-                return False
-        for input in tx.inputs:
-            self.unconfirmed_used_utxos.add((input.prev_tx_hash, input.output_index))
-        self.db.transaction_by_hash[tx.hash] = tx.as_dict
-        self.unconfirmed_transactions[tx.hash] = fee
-        return True
+        self.mempool.expire()
+        # Refused when it spends the same outputs as a tx of the pool, or the pool is full of better txs
+        return self.mempool.add(tx, fee)
 
     def force_block(self, wallet: Address = None):
         """
-        Forcing to mine block. Gthering all txs with some limit. First take Txs with bigger fee.
+        Forcing to mine block. Gthering all txs with some limit. First take Txs with bigger fee rate.
         """
-        # Get tx hashes w/ highest fees
-        txs = sorted(
-            self.unconfirmed_transactions.items(), key=lambda x: x[1], reverse=True
-        )[: self.db.config["txs_per_block"]]
-        fee = sum([v[1] for v in txs])
-        txs = [Tx.from_dict(self.db.transaction_by_hash[v[0]]) for v in txs]
+        # Get txs w/ highest fee rates
+        self.mempool.expire()
+        selected = self.mempool.top(self.db.config["txs_per_block"])
+        fee = sum(fee for _, fee in selected)
+        txs = [self.create_coinbase_tx(fee, wallet)] + [tx for tx, _ in selected]
         block = Block(
-            txs=[self.create_coinbase_tx(fee, wallet)] + txs,
+            txs=txs,
             index=self.head.index + 1 if self.head else 0,
             prev_hash=self.head.hash() if self.head else 0x0,
+            merkel_root=self.update_candidate_tree(txs),
         )
         return block
 
+    def update_candidate_tree(self, txs):
+        """
+        Gets the merkle root of a new candidate block. Candidates mostly differ from the previous one in the
+        coinbase and the last txs, so only the changed leaves of the previous candidate's tree are redone.
+        """
+        tree = self.candidate_tree
+        hashes = [tx.hash for tx in txs]
+        keep = 1
+        while keep < min(len(tree), len(hashes)) and tree.leaf(keep) == hashes[keep]:
+            keep += 1
+        tree.truncate(keep)
+        if len(tree):
+            tree.update_leaf(0, hashes[0])
+        tree.extend(hashes[len(tree) :])
+        return tree.root
+
     def rollover_block(self, block):
         """
         As we use some sort of DB, we need way to update it depends we need add block or remove.
         So we have 2 methods Rollover and Rollback.
         Also i added some sort of callback in case some additional functionality should be added on top.
         For example some Blockchain analytic DB.
+        Returns the txs the block took out of the mempool. Blocks are checked with check_spends first.
         """
+        # Along with the txs of the block, the pool txs spending the same outputs can't be mined anymore
+        evicted = self.mempool.remove_block_txs(block.txs)
+        self.db.block_index = block.index
+
+        # Undo record of the block: the outputs it spent which were there before it, the outputs it created
+        # which are still unspent after it, and the fee of every tx
+        created, spent, fees = {}, [], []
         for tx in block.txs:
+            self.db.confirm_tx(tx.hash, tx.as_dict, block.index)
+            for index, out in enumerate(tx.outputs):
+                self.db.utxos.add(tx.hash, index, out.address, out.amount, out.hash)
+                created[(tx.hash, index)] = None
             if tx.inputs[0].prev_tx_hash == "COINBASE":
                 continue
-            del self.unconfirmed_transactions[tx.hash]
-        self.unconfirmed_used_utxos -= {
-            (input.prev_tx_hash, input.output_index)
-            for tx in block.txs
-            for input in tx.inputs
-        }
-        self.db.block_index = block.index
-        for tx in block.txs:
-            self.db.transaction_by_hash[tx.hash] = tx.as_dict
-            for out in tx.outputs:
-                self.db.unspent_txs_by_user_hash[out.address].add((tx.hash, out.hash))
-                self.db.unspent_outputs_amount[out.address][out.hash] = round(
-                    float(out.amount), 7
-                )
+            amount_in = 0
             for inp in tx.inputs:
-                if inp.prev_tx_hash == "COINBASE":
-                    continue
-                prev_out = self.db.transaction_by_hash[inp.prev_tx_hash]["outputs"][
-                    inp.output_index
-                ]
-                self.db.unspent_txs_by_user_hash[prev_out["address"]].remove(
-                    (inp.prev_tx_hash, prev_out["hash"])
-                )
-                del self.db.unspent_outputs_amount[prev_out["address"]][
-                    prev_out["hash"]
-                ]
+                outpoint = (inp.prev_tx_hash, inp.output_index)
+                utxo = self.db.utxos.spend(*outpoint)
+                amount_in += utxo.amount
+                if outpoint in created:
+                    del created[outpoint]
+                else:
+                    spent.append((*outpoint, utxo))
+            amount_out = sum(round(float(out.amount), 7) for out in tx.outputs)
+            fees.append((tx.hash, amount_in - amount_out))
+        self.db.save_undo(
+            block.index, {"created": list(created), "spent": spent, "fees": fees}
+        )
+        self.db.commit()
         if self.on_new_block:
             self.on_new_block(block, self.db)
+        return evicted
 
     def rollback_block(self):
+        """
+        Undoes the head block by replaying its undo record (see rollover_block), so only the outputs it
+        touched are looked at. Its txs go back to the mempool, except the coinbase which is dropped.
+        """
+        undo = self.db.pop_undo(self.head.index)
         block = self.chain.pop()
-        self.db.block_index -= 1
-        total_amount_in = 0
-        total_amount_out = 0
+        self.db.block_index = block.index - 1
+        self.db.decrement_difficulty()
 
-        for tx in block.txs:
-            # removing new unspent outputs
-            for out in tx.outputs:
-                self.db.unspent_txs_by_user_hash[str(out.address)].remove(
-                    (tx.hash, out.hash)
-                )
-                del self.db.unspent_outputs_amount[str(out.address)][out.hash]
-                total_amount_out += out.amount
-            # adding back previous unspent outputs
-            for inp in tx.inputs:
-                if inp.prev_tx_hash == "COINBASE":
-                    continue
-                prev_out = self.db.transaction_by_hash[inp.prev_tx_hash]["outputs"][
-                    inp.output_index
-                ]
-                self.db.unspent_txs_by_user_hash[prev_out["address"]].add(
-                    (inp.prev_tx_hash, prev_out["hash"])
-                )
-                self.db.unspent_outputs_amount[prev_out["address"]][
-                    prev_out["hash"]
-                ] = prev_out["amount"]
-                total_amount_in += round(float(prev_out["amount"]), 7)
+        # removing new unspent outputs, adding back previous unspent outputs
+        for outpoint in undo["created"]:
+            self.db.utxos.spend(*outpoint)
+        for tx_hash, index, utxo in undo["spent"]:
+            self.db.utxos.add(tx_hash, index, *utxo)
 
-            # adding Tx back un unprocessed stack
-            fee = total_amount_in - total_amount_out
-            self.unconfirmed_transactions[tx.hash] = fee
+        # adding Tx back un unprocessed stack, unless it spends outputs of the rolled back block
+        fees = dict(undo["fees"])
+        for tx in block.txs:
+            self.db.unconfirm_tx(tx.hash)
+            if tx.hash in fees and all(
+                self.db.utxos.get(inp.prev_tx_hash, inp.output_index)
+                for inp in tx.inputs
+            ):
+                self.mempool.add(tx, fees[tx.hash])
+        self.db.commit()
 
         if self.on_prev_block:
             self.on_prev_block(block, self.db)
 
+    def rollback_blocks(self, count):
+        """
+        Undoes the last count blocks, head first. A tx put back in the mempool can spend the outputs of a
+        block rolled back after it, so those are dropped once all are undone.
+        """
+        for _ in range(count):
+            self.rollback_block()
+        self.drop_unspendable_txs()
+
     def mine_block(self, block: Block):
         if BlockVerifier(self.db).verify(self.head, block):
-            self.add_block(block)
-            self.rollover_block(block)
-            return True
+            return self.add_block(block)
         return False
 
     def to_puzzle(self, block: Block):
-        return (
-            SudokuGenerator(self.db.config["difficulty"], block.seed)
-            .generate_board()
-            .encode()
+        return PuzzleCache.get_instance().get_encoded(
+            self.db.config["difficulty"], block.seed
         )
 
     @property
@@ -1,20 +1,59 @@
 import base64
+import json
+import operator
 import time
 from hashlib import sha256
 from blockchain.wallet.elliptic_curve import EllipticCurvePoint
-from merkletools import MerkleTools
+from . import wire
+from .merkle import MerkleTree
 
+_UNSET = object()
 
-class Input:
+
+class _Cached:
+    """
+    Base of the objects that cache their hash and dict form
+
+    Assigning a different value to a public attribute (or anything to a property) resets every slot named in
+    _CACHED to None, so the cached values are recomputed on next use. Cached dicts are shared between callers
+    and must not be mutated.
+    """
+
+    __slots__ = ()
+    _CACHED = ()
+
+    def __setattr__(self, name, value):
+        if name[0] != "_" and (
+            isinstance(getattr(type(self), name, None), property)
+            or getattr(self, name, _UNSET) != value
+        ):
+            for slot in self._CACHED:
+                object.__setattr__(self, slot, None)
+        object.__setattr__(self, name, value)
+
+
+def _same(current, seen):
+    """Whether two lists hold the very same objects"""
+    return (
+        seen is not None
+        and len(current) == len(seen)
+        and all(map(operator.is_, current, seen))
+    )
+
+
+class Input(_Cached):
     __slots__ = (
         "prev_tx_hash",
         "output_index",
         "signature",
         "_hash",
+        "_dict",
+        "_repr",
         "address",
         "index",
         "amount",
     )
+    _CACHED = "_hash", "_dict", "_repr"
 
     def __init__(self, prev_tx_hash, output_index, address, index=0, signature=None):
         self.prev_tx_hash = prev_tx_hash
@@ -48,14 +87,22 @@ class Input:
 
     @property
     def as_dict(self):
-        return {
-            "prev_tx_hash": self.prev_tx_hash,
-            "output_index": self.output_index,
-            "address": str(self.address),
-            "index": self.index,
-            "hash": self.hash,
-            "signature": self.signature,
-        }
+        if self._dict is None:
+            self._dict = {
+                "prev_tx_hash": self.prev_tx_hash,
+                "output_index": self.output_index,
+                "address": str(self.address),
+                "index": self.index,
+                "hash": self.hash,
+                "signature": self.signature,
+            }
+        return self._dict
+
+    def _dict_repr(self):
+        """repr of as_dict, which is what the input hash of a Tx is computed over"""
+        if self._repr is None:
+            self._repr = repr(self.as_dict)
+        return self._repr
 
     @classmethod
     def from_dict(cls, data):
@@ -70,8 +117,9 @@ class Input:
         return inst
 
 
-class Output:
-    __slots__ = "_hash", "address", "index", "amount", "input_hash"
+class Output(_Cached):
+    __slots__ = "_hash", "_dict", "address", "index", "amount", "input_hash"
+    _CACHED = "_hash", "_dict"
 
     def __init__(self, address, amount, index=0, input_hash=None):
         self.address = address
@@ -97,13 +145,15 @@ class Output:
 
     @property
     def as_dict(self):
-        return {
-            "amount": round(float(self.amount), 7),
-            "address": str(self.address),
-            "index": self.index,
-            "input_hash": self.input_hash,
-            "hash": self.hash,
-        }
+        if self._dict is None:
+            self._dict = {
+                "amount": round(float(self.amount), 7),
+                "address": str(self.address),
+                "index": self.index,
+                "input_hash": self.input_hash,
+                "hash": self.hash,
+            }
+        return self._dict
 
     @classmethod
     def from_dict(cls, data):
@@ -117,8 +167,26 @@ class Output:
         return inst
 
 
-class Tx:
-    __slots__ = "inputs", "outputs", "timestamp", "_hash"
+class Tx(_Cached):
+    """
+    Transaction
+
+    The hash, the input hash given to the outputs and the dict form are cached. They are recomputed when an
+    attribute of the Tx changes, or when any of its inputs or outputs changed (which replaces their cached
+    dict, so comparing the dicts the cache was built from by identity is enough to notice).
+    """
+
+    __slots__ = (
+        "inputs",
+        "outputs",
+        "timestamp",
+        "_hash",
+        "_dict",
+        "_input_hash",
+        "_seen_inputs",
+        "_seen_outputs",
+    )
+    _CACHED = "_hash", "_dict", "_input_hash", "_seen_inputs", "_seen_outputs"
 
     def __init__(self, inputs, outputs, timestamp=None):
         self.inputs = inputs
@@ -129,18 +197,35 @@ class Tx:
     def __repr__(self):
         return f"Tx(inputs={self.inputs}, outputs={self.outputs}, timestamp={self.timestamp})"
 
+    def _link_outputs(self):
+        """
+        Gives the outputs the hash of the inputs (and timestamp), to make output hashes unique
+        """
+        inputs = [el.as_dict for el in self.inputs]
+        if not _same(inputs, self._seen_inputs):
+            # str() of the list of input dicts, built from the reprs each input keeps
+            inputs_string = f"[{', '.join(el._dict_repr() for el in self.inputs)}]"
+            self._input_hash = sha256(
+                (inputs_string + str(self.timestamp)).encode()
+            ).hexdigest()
+            self._seen_inputs = inputs
+            self._hash = self._dict = None
+        for el in self.outputs:
+            el.input_hash = self._input_hash
+
+    def _refresh(self):
+        self._link_outputs()
+        outputs = [el.as_dict for el in self.outputs]
+        if not _same(outputs, self._seen_outputs):
+            self._seen_outputs = outputs
+            self._hash = self._dict = None
+
     @property
     def hash(self):
+        self._refresh()
         if self._hash:
             return self._hash
 
-        # calculating input_hash for outputs
-        inp_hash = sha256(
-            (str([el.as_dict for el in self.inputs]) + str(self.timestamp)).encode()
-        ).hexdigest()
-        for el in self.outputs:
-            el.input_hash = inp_hash
-
         hash_string = f'{[el.hash for el in self.inputs]}{[f"{el.amount}{el.address}{el.index}" for el in self.outputs]}{self.timestamp}'
 
         self._hash = sha256(
@@ -150,47 +235,61 @@ class Tx:
 
     @property
     def as_dict(self):
-        inp_hash = sha256(
-            (str([el.as_dict for el in self.inputs]) + str(self.timestamp)).encode()
-        ).hexdigest()
-        for el in self.outputs:
-            el.input_hash = inp_hash
-        return {
-            "inputs": [el.as_dict for el in self.inputs],
-            "outputs": [el.as_dict for el in self.outputs],
-            "timestamp": self.timestamp,
-            "hash": self.hash,
-        }
+        tx_hash = self.hash
+        if self._dict is None:
+            self._dict = {
+                "inputs": self._seen_inputs,
+                "outputs": self._seen_outputs,
+                "timestamp": self.timestamp,
+                "hash": tx_hash,
+            }
+        return self._dict
 
     @classmethod
     def from_dict(cls, data):
-        inps = [Input.from_dict(el) for el in data["inputs"]]
-        outs = [Output.from_dict(el) for el in data["outputs"]]
-        inp_hash = sha256(
-            (str([el.as_dict for el in inps]) + str(data["timestamp"])).encode()
-        ).hexdigest()
-        for el in outs:
-            el.input_hash = inp_hash
-
         inst = cls(
-            inps,
-            outs,
+            [Input.from_dict(el) for el in data["inputs"]],
+            [Output.from_dict(el) for el in data["outputs"]],
             data["timestamp"],
         )
-        inst._hash = None
+        inst._link_outputs()
         return inst
 
 
-class Block:
+def _json_default(value):
+    # Signatures may be bytes, sent as str like FastAPI does
+    if isinstance(value, bytes):
+        return value.decode()
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+
+class Block(_Cached):
+    """
+    Block
+
+    The hash, the dict form and its JSON and wire format encodings are cached, so serving the same blocks
+    over and over (sync, head) doesn't rebuild them. They are recomputed when an attribute of the block or
+    one of its txs changes.
+
+    Blocks made by from_dict only keep the tx dicts until something reads txs, so blocks rejected on their
+    header (duplicate, out of chain, wrong puzzle solution) never build their Tx objects.
+    """
 
     __slots__ = (
         "prev_hash",
         "index",
-        "txs",
+        "_txs",
+        "_tx_dicts",
         "timestamp",
         "merkel_root",
         "puzzle_solution",
+        "_hash",
+        "_dict",
+        "_json",
+        "_wire",
+        "_seen_txs",
     )
+    _CACHED = "_hash", "_dict", "_json", "_wire", "_seen_txs"
 
     def __init__(
         self, txs, index, prev_hash, timestamp=None, puzzle_solution=0, merkel_root=None
@@ -212,6 +311,22 @@ class Block:
             self.txs,
         )
 
+    @property
+    def txs(self):
+        if self._txs is None:
+            self._txs = [Tx.from_dict(el) for el in self._tx_dicts]
+            self._tx_dicts = None
+        return self._txs
+
+    @txs.setter
+    def txs(self, txs):
+        self._txs = txs
+        self._tx_dicts = None
+
+    @property
+    def tx_count(self):
+        return len(self._tx_dicts if self._txs is None else self._txs)
+
     def build_merkel_tree(self):
         """
         Merkel Tree used to hash all the transactions, and on mining do not recompute Txs hash everytime
@@ -221,22 +336,38 @@ class Block:
         """
         if self.merkel_root:
             return self.merkel_root
-        mt = MerkleTools(hash_type="SHA256")
-        for el in self.txs:
-            mt.add_leaf(el.hash)
-        mt.make_tree()
-        self.merkel_root = mt.get_merkle_root()
+        self.merkel_root = MerkleTree(el.hash for el in self.txs).root
         return self.merkel_root
 
     def hash(self, solution=None):
         if solution:
             self.puzzle_solution = solution
+        merkel_root = self.build_merkel_tree()
+        if self._hash:
+            return self._hash
+        self._hash = self.header_hash(
+            {
+                "merkel_root": merkel_root,
+                "prev_hash": self.prev_hash,
+                "index": self.index,
+                "puzzle_solution": self.puzzle_solution,
+                "timestamp": self.timestamp,
+            }
+        )
+        return self._hash
+
+    @staticmethod
+    def header_hash(header):
+        """
+        Hash of the block with this header, so a light client can check the hash and prev_hash links of the
+        headers it gets
+        """
         block_string = "{}{}{}{}{}".format(
-            self.build_merkel_tree(),
-            self.prev_hash,
-            self.index,
-            self.puzzle_solution,
-            self.timestamp,
+            header["merkel_root"],
+            header["prev_hash"],
+            header["index"],
+            header["puzzle_solution"],
+            header["timestamp"],
         )
         return sha256(
             sha256(block_string.encode()).hexdigest().encode("utf8")
@@ -258,24 +389,83 @@ class Block:
         return sha256(seed_string.encode()).hexdigest()
 
     @property
-    def as_dict(self):
+    def header(self):
+        """
+        Everything but the txs. Enough for a light client to follow the chain, recomputing the hash of every
+        block (see header_hash) and checking its puzzle solution, and to check tx inclusion proofs against
+        merkel_root.
+        """
         return {
             "index": self.index,
             "timestamp": self.timestamp,
             "prev_hash": self.prev_hash,
             "hash": self.hash(),
-            "txs": [el.as_dict for el in self.txs],
+            "merkel_root": self.build_merkel_tree(),
             "puzzle_solution": self.puzzle_solution,
-            "merkel_root": self.merkel_root,
+            "tx_count": self.tx_count,
         }
 
+    def tx_proof(self, index):
+        """
+        Merkle inclusion proof of the index-th tx (see MerkleTree.get_proof)
+        """
+        return MerkleTree(el.hash for el in self.txs).get_proof(index)
+
+    @property
+    def as_dict(self):
+        block_hash = self.hash()
+        txs = [el.as_dict for el in self.txs]
+        if not _same(txs, self._seen_txs):
+            self._seen_txs = txs
+            self._dict = self._json = self._wire = None
+        if self._dict is None:
+            self._dict = {
+                "index": self.index,
+                "timestamp": self.timestamp,
+                "prev_hash": self.prev_hash,
+                "hash": block_hash,
+                "txs": txs,
+                "puzzle_solution": self.puzzle_solution,
+                "merkel_root": self.merkel_root,
+            }
+        return self._dict
+
+    @property
+    def as_json(self):
+        """
+        as_dict encoded the way FastAPI would send it
+        """
+        data = self.as_dict
+        if self._json is None:
+            self._json = json.dumps(
+                data,
+                default=_json_default,
+                ensure_ascii=False,
+                allow_nan=False,
+                separators=(",", ":"),
+            ).encode()
+        return self._json
+
+    @property
+    def as_wire(self):
+        """
+        as_dict in the binary wire format, without the message header (see wire.join_blocks)
+        """
+        data = self.as_dict
+        if self._wire is None:
+            self._wire = wire.encode_block_body(data)
+        return self._wire
+
     @classmethod
     def from_dict(cls, data):
-        return cls(
-            [Tx.from_dict(el) for el in data["txs"]],
+        inst = cls(
+            None,
             data["index"],
             data["prev_hash"],
             data.get("timestamp"),
             data.get("puzzle_solution"),
             data.get("merkel_root"),
         )
+        inst._txs = None
+        inst._tx_dicts = list(data["txs"])
+        return inst
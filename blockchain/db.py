@@ -1,5 +1,8 @@
 import pickle
-from collections import defaultdict
+from collections.abc import Mapping
+
+from .store import BlockStore
+from .utxo import UTXOSet
 
 
 class DB:
@@ -12,13 +15,41 @@ class DB:
             "txs_per_block": 4,
             "mining_reward": 25,
             "difficulty": 22,
-            "difficulty_increase": lambda x: x + 2,
+            "difficulty_step": 2,
+            "puzzle_cache_size": 256,
+            "mempool_max_txs": 5000,
+            "mempool_max_bytes": 1 << 22,
+            "mempool_max_age": 3 * 3600,
         }
 
         self.block_index = 0
+        self.chain = []
         self.transaction_by_hash = {}
-        self.unspent_txs_by_user_hash = defaultdict(set)
-        self.unspent_outputs_amount = defaultdict(dict)
+        # Index of the block each confirmed tx is in
+        self.block_index_by_tx_hash = {}
+        self.utxos = UTXOSet()
+        # What rollover left to undo each block, see Blockchain.rollover_block
+        self.undo_by_block_index = {}
+
+    def confirm_tx(self, tx_hash, tx_dict, block_index):
+        self.transaction_by_hash[tx_hash] = tx_dict
+        self.block_index_by_tx_hash[tx_hash] = block_index
+
+    def unconfirm_tx(self, tx_hash):
+        self.transaction_by_hash.pop(tx_hash, None)
+        self.block_index_by_tx_hash.pop(tx_hash, None)
+
+    def save_undo(self, block_index, undo):
+        self.undo_by_block_index[block_index] = undo
+
+    def pop_undo(self, block_index):
+        return self.undo_by_block_index.pop(block_index)
+
+    def commit(self):
+        """Called once the chain and the data above are consistent again, nothing to save in memory"""
+
+    def close(self):
+        pass
 
     """
         Just simple routine to save/restore db data for block number
@@ -29,9 +60,10 @@ class DB:
             pickle.dump(self.__dict__, fp)
 
     def increment_difficulty(self):
-        self.config["difficulty"] = self.config["difficulty_increase"](
-            self.config["difficulty"]
-        )
+        self.config["difficulty"] += self.config["difficulty_step"]
+
+    def decrement_difficulty(self):
+        self.config["difficulty"] -= self.config["difficulty_step"]
 
     @classmethod
     def restore(cls, block_index):
@@ -41,3 +73,102 @@ class DB:
         inst = cls()
         inst.__dict__ = data
         return inst
+
+
+class _TxsByHash(Mapping):
+    def __init__(self, store):
+        self.store = store
+
+    def __getitem__(self, tx_hash):
+        tx = self.store.tx(tx_hash)
+        if tx is None:
+            raise KeyError(tx_hash)
+        return tx
+
+    def __iter__(self):
+        return iter(self.store.tx_hashes())
+
+    def __len__(self):
+        return self.store.tx_count()
+
+
+class _BlockIndexByTxHash(Mapping):
+    def __init__(self, store):
+        self.store = store
+
+    def __getitem__(self, tx_hash):
+        height = self.store.tx_height(tx_hash)
+        if height is None:
+            raise KeyError(tx_hash)
+        return height
+
+    def __iter__(self):
+        return iter(self.store.tx_hashes())
+
+    def __len__(self):
+        return self.store.tx_count()
+
+
+class PersistentDB(DB):
+    """
+    DB keeping the chain and the confirmed txs on disk in a BlockStore, so a node restarts where it stopped
+    and the chain isn't held in memory. The difficulty and the block
+    index are saved with the blocks, as are the unspent outputs and the undo records.
+    """
+
+    def __init__(self, path, sync_every=16, cache_size=256):
+        super().__init__()
+        self.chain = BlockStore(path, sync_every, cache_size)
+        self.transaction_by_hash = _TxsByHash(self.chain)
+        self.block_index_by_tx_hash = _BlockIndexByTxHash(self.chain)
+        self.config["difficulty"] = self.chain.get_state(
+            "difficulty", self.config["difficulty"]
+        )
+        self.block_index = self.chain.get_state("block_index", self.block_index)
+        self.utxos = self.chain.utxos
+        if self.chain and not self.chain.get_state("utxos"):
+            self._load_unspent_outputs()
+
+    def _load_unspent_outputs(self):
+        """Fills the unspent outputs of a store written before they were saved, replaying its txs in order"""
+        for tx in self.chain.txs():
+            for index, out in enumerate(tx["outputs"]):
+                self.utxos.add(
+                    tx["hash"], index, out["address"], out["amount"], out["hash"]
+                )
+            for inp in tx["inputs"]:
+                if inp["prev_tx_hash"] != "COINBASE":
+                    self.utxos.spend(inp["prev_tx_hash"], inp["output_index"])
+        self.commit()
+        self.chain.flush()
+
+    def confirm_tx(self, tx_hash, tx_dict, block_index):
+        # Stored along with its block
+        pass
+
+    def unconfirm_tx(self, tx_hash):
+        # Dropped along with its block
+        pass
+
+    def save_undo(self, block_index, undo):
+        self.chain.save_undo(block_index, undo)
+
+    def pop_undo(self, block_index):
+        undo = self.chain.pop_undo(block_index)
+        if undo is None:
+            raise KeyError(block_index)
+        return undo
+
+    def commit(self):
+        self.chain.set_state("utxos", True)
+        self.chain.set_state("difficulty", self.config["difficulty"])
+        self.chain.set_state("block_index", self.block_index)
+        self.chain.commit()
+
+    def close(self):
+        self.commit()
+        self.chain.close()
+
+    def backup(self):
+        self.commit()
+        self.chain.flush()
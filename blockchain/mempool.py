@@ -0,0 +1,239 @@
+import heapq
+import time
+from collections import OrderedDict
+from typing import Dict, Hashable, List, Optional, Tuple
+
+from . import wire
+from .blocks import Tx
+
+
+class _IndexedHeap:
+    """
+    Binary min heap of (key, item) pairs which knows the position of every item, so any item can be removed
+    in O(log n) and the k smallest items can be read without popping them
+    """
+
+    __slots__ = ("_entries", "_positions")
+
+    def __init__(self) -> None:
+        self._entries: List[Tuple[tuple, Hashable]] = []
+        self._positions: Dict[Hashable, int] = {}
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def push(self, key: tuple, item: Hashable) -> None:
+        self._entries.append((key, item))
+        self._positions[item] = len(self._entries) - 1
+        self._sift_up(len(self._entries) - 1)
+
+    def remove(self, item: Hashable) -> None:
+        i = self._positions.pop(item)
+        last = self._entries.pop()
+        if i < len(self._entries):
+            self._entries[i] = last
+            self._positions[last[1]] = i
+            self._sift_down(i)
+            self._sift_up(i)
+
+    def smallest(self, k: int) -> List[Hashable]:
+        """
+        The k smallest items in order, by walking the heap from the root with a heap of the candidates, in
+        O(k log k)
+        """
+        entries, res = self._entries, []
+        candidates = [(entries[0][0], 0)] if entries else []
+        while candidates and len(res) < k:
+            _, i = heapq.heappop(candidates)
+            res.append(entries[i][1])
+            for child in (2 * i + 1, 2 * i + 2):
+                if child < len(entries):
+                    heapq.heappush(candidates, (entries[child][0], child))
+        return res
+
+    def _move(self, i: int, entry: Tuple[tuple, Hashable]) -> None:
+        self._entries[i] = entry
+        self._positions[entry[1]] = i
+
+    def _sift_up(self, i: int) -> None:
+        entry = self._entries[i]
+        while i > 0:
+            parent = (i - 1) >> 1
+            if self._entries[parent][0] <= entry[0]:
+                break
+            self._move(i, self._entries[parent])
+            i = parent
+        self._move(i, entry)
+
+    def _sift_down(self, i: int) -> None:
+        entries, entry = self._entries, self._entries[i]
+        while True:
+            child = 2 * i + 1
+            if child >= len(entries):
+                break
+            if child + 1 < len(entries) and entries[child + 1][0] < entries[child][0]:
+                child += 1
+            if entry[0] <= entries[child][0]:
+                break
+            self._move(i, entries[child])
+            i = child
+        self._move(i, entry)
+
+
+class _Entry:
+    __slots__ = ("tx", "fee", "size", "rate", "added")
+
+    def __init__(self, tx: Tx, fee: float, size: int, added: float) -> None:
+        self.tx = tx
+        self.fee = fee
+        self.size = size
+        self.rate = fee / size
+        self.added = added
+
+
+class Mempool:
+    """
+    Txs waiting for a block, kept apart from the confirmed txs of the DB
+
+    Txs are ordered by fee rate (fee per byte of the tx in the wire format), first come first on ties, in
+    two indexed heaps: the highest rates for building blocks (top), the lowest to evict when the pool is
+    full. Adding and removing a tx are O(log n) and getting the best k txs is O(k log k). Txs are also kept
+    in the order they came in, so the ones older than max_age expire first. Two txs spending the same
+    output are never both in the pool.
+
+    Attributes:
+        <int> max_txs: Maximum number of txs kept
+        <int> max_bytes: Maximum total size of the txs kept
+        <float> max_age: Seconds after which a tx is dropped (see expire)
+        <int> size: Total size of the txs in the pool
+
+    Public Methods:
+        <bool> add(Tx tx, float fee): Adds a tx, evicting lower fee rate txs if the pool is full
+        <Tx> get(str tx_hash): Gets a tx (None if not in the pool)
+        <float> fee(str tx_hash): Gets the fee of a tx
+        <Tx> remove(str tx_hash): Removes a tx (None if not in the pool)
+        <list> remove_block_txs(list txs): Removes the txs of a block and the txs spending the same outputs
+        <list> top(int k): Gets the (tx, fee) of the k txs with the highest fee rate, best first
+        <list> expire(float now): Removes the txs older than max_age
+    """
+
+    def __init__(
+        self, max_txs: int = 5000, max_bytes: int = 1 << 22, max_age: float = 3 * 3600
+    ) -> None:
+        self.max_txs = max_txs
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.size = 0
+        self._entries: "OrderedDict[str, _Entry]" = OrderedDict()
+        self._best = _IndexedHeap()
+        self._worst = _IndexedHeap()
+        self._seq = 0
+        # Outpoint (tx hash, output index) -> hash of the pool tx spending it
+        self._spent: Dict[Tuple[str, int], str] = {}
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, tx_hash: str) -> bool:
+        return tx_hash in self._entries
+
+    def __iter__(self):
+        return iter(list(self._entries))
+
+    def add(self, tx: Tx, fee: float, now: float = None) -> bool:
+        tx_hash = tx.hash
+        if tx_hash in self._entries:
+            return False
+        outpoints = [(inp.prev_tx_hash, inp.output_index) for inp in tx.inputs]
+        if any(outpoint in self._spent for outpoint in outpoints):
+            return False
+        entry = _Entry(
+            tx,
+            fee,
+            len(wire.encode_tx(tx.as_dict)),
+            time.time() if now is None else now,
+        )
+        if entry.size > self.max_bytes:
+            return False
+
+        evicted = self._victims(entry)
+        if evicted is None:
+            return False
+        for victim in evicted:
+            self.remove(victim)
+
+        self._seq += 1
+        self._entries[tx_hash] = entry
+        self._best.push((-entry.rate, self._seq), tx_hash)
+        self._worst.push((entry.rate, -self._seq), tx_hash)
+        for outpoint in outpoints:
+            self._spent[outpoint] = tx_hash
+        self.size += entry.size
+        return True
+
+    def _victims(self, entry: _Entry) -> Optional[List[str]]:
+        """
+        The lowest fee rate txs to evict to make room for the entry, or None if the entry would be the one
+        to go. The candidates are read in batches doubling in size, so finding m victims is O(m log m).
+        """
+        k = 1
+        while True:
+            victims, count, size = [], len(self._entries) + 1, self.size + entry.size
+            worst = self._worst.smallest(k)
+            for tx_hash in worst:
+                if count <= self.max_txs and size <= self.max_bytes:
+                    break
+                victim = self._entries[tx_hash]
+                if victim.rate >= entry.rate:
+                    return None
+                victims.append(tx_hash)
+                count, size = count - 1, size - victim.size
+            if count <= self.max_txs and size <= self.max_bytes:
+                return victims
+            if len(worst) < k:
+                return None
+            k *= 2
+
+    def get(self, tx_hash: str) -> Optional[Tx]:
+        entry = self._entries.get(tx_hash)
+        return entry.tx if entry else None
+
+    def fee(self, tx_hash: str) -> float:
+        return self._entries[tx_hash].fee
+
+    def remove(self, tx_hash: str) -> Optional[Tx]:
+        entry = self._entries.pop(tx_hash, None)
+        if entry is None:
+            return None
+        self._best.remove(tx_hash)
+        self._worst.remove(tx_hash)
+        for inp in entry.tx.inputs:
+            self._spent.pop((inp.prev_tx_hash, inp.output_index), None)
+        self.size -= entry.size
+        return entry.tx
+
+    def remove_block_txs(self, txs: list) -> list:
+        removed = []
+        for tx in txs:
+            for inp in tx.inputs:
+                spender = self._spent.get((inp.prev_tx_hash, inp.output_index))
+                if spender is not None:
+                    removed.append(self.remove(spender))
+            self.remove(tx.hash)
+        return removed
+
+    def top(self, k: int) -> List[Tuple[Tx, float]]:
+        return [
+            (self._entries[tx_hash].tx, self._entries[tx_hash].fee)
+            for tx_hash in self._best.smallest(k)
+        ]
+
+    def expire(self, now: float = None) -> list:
+        cutoff = (time.time() if now is None else now) - self.max_age
+        expired = []
+        while self._entries:
+            entry = next(iter(self._entries.values()))
+            if entry.added > cutoff:
+                break
+            expired.append(self.remove(entry.tx.hash))
+        return expired
@@ -0,0 +1,120 @@
+from hashlib import sha256
+from typing import Iterable, List, Optional
+
+
+def _hash_pair(left: bytes, right: bytes) -> bytes:
+    return sha256(left + right).digest()
+
+
+class MerkleTree:
+    """
+    Incremental SHA256 Merkle tree over hex encoded leaves (tx hashes)
+
+    Builds the same tree as merkletools: nodes are paired from the left on every level and an odd node at
+    the end of a level is promoted unchanged to the next one. So the root is the right fold of the roots of
+    the perfect subtrees given by the binary representation of the number of leaves, and only the nodes of
+    those perfect subtrees are kept. Appending a leaf, changing one or computing the root is O(log n).
+
+    @Properties:
+        <str> root: Hex root of the tree (None when empty)
+
+    Public Methods:
+        <void> append(str leaf): Adds a leaf at the end
+        <void> extend(Iterable[str] leaves): Adds many leaves at the end
+        <str> leaf(int index): Gets a leaf
+        <void> update_leaf(int index, str leaf): Replaces a leaf
+        <void> truncate(int size): Drops the leaves from size onwards
+        <list> get_proof(int index): Gets the inclusion proof of a leaf, in the merkletools format
+        <bool> validate_proof(list proof, str target_hash, str merkle_root): Checks an inclusion proof
+    """
+
+    __slots__ = ("_levels",)
+
+    def __init__(self, leaves: Iterable[str] = ()) -> None:
+        # _levels[k][i] is the root of the perfect subtree over leaves i * 2^k to (i + 1) * 2^k - 1
+        self._levels: List[List[bytes]] = [[]]
+        self.extend(leaves)
+
+    def __len__(self) -> int:
+        return len(self._levels[0])
+
+    def append(self, leaf: str) -> None:
+        levels = self._levels
+        levels[0].append(bytes.fromhex(leaf))
+        k = 0
+        while len(levels[k]) % 2 == 0:
+            if k + 1 == len(levels):
+                levels.append([])
+            levels[k + 1].append(_hash_pair(levels[k][-2], levels[k][-1]))
+            k += 1
+
+    def extend(self, leaves: Iterable[str]) -> None:
+        for leaf in leaves:
+            self.append(leaf)
+
+    def leaf(self, index: int) -> str:
+        return self._levels[0][index].hex()
+
+    def update_leaf(self, index: int, leaf: str) -> None:
+        levels = self._levels
+        levels[0][index] = bytes.fromhex(leaf)
+        for k in range(len(levels) - 1):
+            index >>= 1
+            if index >= len(levels[k + 1]):
+                break
+            levels[k + 1][index] = _hash_pair(
+                levels[k][2 * index], levels[k][2 * index + 1]
+            )
+
+    def truncate(self, size: int) -> None:
+        for k, level in enumerate(self._levels):
+            del level[size >> k :]
+        del self._levels[max(1, size.bit_length()) :]
+
+    @property
+    def root(self) -> Optional[str]:
+        size = len(self)
+        if not size:
+            return None
+        root = None
+        for k, level in enumerate(self._levels):
+            if size >> k & 1:
+                peak = level[(size >> k) - 1]
+                root = peak if root is None else _hash_pair(peak, root)
+        return root.hex()
+
+    def _node(self, k: int, index: int) -> bytes:
+        """Node index of level k, which is only stored when its subtree is perfect"""
+        if (index + 1) << k <= len(self):
+            return self._levels[k][index]
+        if (2 * index + 1) << (k - 1) < len(self):
+            return _hash_pair(
+                self._node(k - 1, 2 * index), self._node(k - 1, 2 * index + 1)
+            )
+        return self._node(k - 1, 2 * index)
+
+    def get_proof(self, index: int) -> Optional[list]:
+        """
+        Gets the siblings on the path from the leaf to the root, from the bottom up, as {"left": hash} or
+        {"right": hash} depending on the side the sibling is on. Promoted nodes have no sibling on their level.
+        """
+        size = len(self)
+        if not 0 <= index < size:
+            return None
+        proof = []
+        for k in range((size - 1).bit_length()):
+            sibling = (index >> k) ^ 1
+            if sibling << k < size:
+                side = "left" if sibling < index >> k else "right"
+                proof.append({side: self._node(k, sibling).hex()})
+        return proof
+
+    @staticmethod
+    def validate_proof(proof: list, target_hash: str, merkle_root: str) -> bool:
+        node = bytes.fromhex(target_hash)
+        for step in proof:
+            if "left" in step:
+                node = _hash_pair(bytes.fromhex(step["left"]), node)
+            else:
+                node = _hash_pair(node, bytes.fromhex(step["right"]))
+        return node == bytes.fromhex(merkle_root)
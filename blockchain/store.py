@@ -0,0 +1,318 @@
+import json
+import os
+import sqlite3
+import struct
+import zlib
+from collections.abc import Sequence
+from threading import RLock
+
+from . import wire
+from .blocks import Block, Tx
+from .utils import LRUCache
+from .utxo import UTXO
+
+# Header of every log record: size and crc32 of the encoded block that follows
+_RECORD = struct.Struct(">II")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS blocks (
+    height INTEGER PRIMARY KEY,
+    hash TEXT NOT NULL UNIQUE,
+    offset INTEGER NOT NULL,
+    size INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS txs (
+    hash TEXT PRIMARY KEY,
+    height INTEGER NOT NULL,
+    data BLOB NOT NULL
+);
+CREATE INDEX IF NOT EXISTS txs_by_height ON txs (height);
+CREATE TABLE IF NOT EXISTS utxos (
+    tx_hash TEXT NOT NULL,
+    output_index INTEGER NOT NULL,
+    address TEXT NOT NULL,
+    amount REAL NOT NULL,
+    out_hash TEXT NOT NULL,
+    PRIMARY KEY (tx_hash, output_index)
+);
+CREATE INDEX IF NOT EXISTS utxos_by_address ON utxos (address);
+CREATE TABLE IF NOT EXISTS undo (
+    height INTEGER PRIMARY KEY,
+    data TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS state (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+"""
+
+
+class StoreCorrupted(Exception):
+    pass
+
+
+class BlockStore(Sequence):
+    """
+    The chain on disk, usable as the list of blocks
+
+    Blocks are appended to a log file as checksummed records in the wire format, and never rewritten:
+    popping a block only drops it from the index, and appends always go to the end of the log. A sqlite3
+    index maps heights and hashes to log records and tx hashes to their height and wire encoding, and keeps
+    the undo records and small state values as JSON (see get_state). The unspent outputs are kept in the index
+    too (see StoredUTXOSet), so they are saved along with the blocks they come from.
+
+    Writes are made durable in batches: commit() fsyncs the log and commits the index every sync_every
+    calls, always log first, so the index never points past what is on disk. Records written after the last
+    commit are cut off the log when the store is opened again. Recently used blocks are kept in a bounded
+    LRU cache.
+
+    Attributes:
+        <int> sync_every: Number of commit() calls between flushes to disk
+        <StoredUTXOSet> utxos: Unspent outputs of the stored chain
+
+    Public Methods:
+        <void> append(Block block): Adds a block (and indexes its txs) at the end
+        <Block> pop(): Removes the last block
+        <int> height_of(str block_hash): Gets the height of a block (None if unknown)
+        <dict> tx(str tx_hash): Gets the dict of a tx in the chain (None if unknown)
+        <int> tx_height(str tx_hash): Gets the height of the block a tx is in (None if unknown)
+        <Iterator[dict]> txs(): Gets every tx dict in chain order
+        <void> save_undo(int height, dict undo): Saves the undo record of a block (tuples come back as lists)
+        <dict> pop_undo(int height): Removes and gets the undo record of a block (None if there is none)
+        <any> get_state(str key, any default): Gets a saved state value
+        <void> set_state(str key, any value): Saves a JSON serializable state value (with the next flush)
+        <void> commit(): Marks the end of a change, flushing every sync_every calls
+        <void> flush(): Writes everything to disk now
+        <void> close(): Flushes and closes the files
+    """
+
+    LOG_FILE = "blocks.log"
+    INDEX_FILE = "index.sqlite"
+
+    def __init__(self, path: str, sync_every: int = 16, cache_size: int = 256):
+        os.makedirs(path, exist_ok=True)
+        self.sync_every = sync_every
+        self._uncommitted = 0
+        self._cache = LRUCache(cache_size)
+        self._lock = RLock()
+
+        self._index = sqlite3.connect(
+            os.path.join(path, self.INDEX_FILE), check_same_thread=False
+        )
+        self._index.executescript(_SCHEMA)
+        self.utxos = StoredUTXOSet(self)
+        self._length = self._index.execute("SELECT COUNT(*) FROM blocks").fetchone()[0]
+        end = self._index.execute(
+            f"SELECT COALESCE(MAX(offset + {_RECORD.size} + size), 0) FROM blocks"
+        ).fetchone()[0]
+
+        self._log = open(os.path.join(path, self.LOG_FILE), "a+b")
+        self._log.seek(0, os.SEEK_END)
+        if self._log.tell() < end:
+            raise StoreCorrupted("Block log is shorter than its index")
+        # Drop what was appended after the last commit
+        self._log.truncate(end)
+
+    def __len__(self) -> int:
+        return self._length
+
+    def __getitem__(self, height):
+        if isinstance(height, slice):
+            return [self[i] for i in range(*height.indices(self._length))]
+        if height < 0:
+            height += self._length
+        if not 0 <= height < self._length:
+            raise IndexError("Block height out of range")
+        block = self._cache.get(height)
+        if block is None:
+            with self._lock:
+                offset, size = self._index.execute(
+                    "SELECT offset, size FROM blocks WHERE height = ?", (height,)
+                ).fetchone()
+                block = Block.from_dict(
+                    wire.decode_block(wire.join_blocks([self._read(offset, size)]))
+                )
+            self._cache.put(height, block)
+        return block
+
+    def _read(self, offset: int, size: int) -> bytes:
+        self._log.seek(offset)
+        record = self._log.read(_RECORD.size + size)
+        if len(record) != _RECORD.size + size:
+            raise StoreCorrupted(f"Block record at {offset} is truncated")
+        record_size, checksum = _RECORD.unpack_from(record)
+        body = record[_RECORD.size :]
+        if record_size != size or zlib.crc32(body) != checksum:
+            raise StoreCorrupted(f"Block record at {offset} is corrupted")
+        return body
+
+    def append(self, block: Block) -> None:
+        body = block.as_wire
+        with self._lock:
+            self._log.seek(0, os.SEEK_END)
+            offset = self._log.tell()
+            self._log.write(_RECORD.pack(len(body), zlib.crc32(body)) + body)
+            height = self._length
+            self._index.execute(
+                "INSERT INTO blocks (height, hash, offset, size) VALUES (?, ?, ?, ?)",
+                (height, block.hash(), offset, len(body)),
+            )
+            self._index.executemany(
+                "INSERT OR REPLACE INTO txs (hash, height, data) VALUES (?, ?, ?)",
+                ((tx.hash, height, wire.encode_tx(tx.as_dict)) for tx in block.txs),
+            )
+            self._length += 1
+        self._cache.put(height, block)
+
+    def pop(self) -> Block:
+        block = self[-1]
+        with self._lock:
+            height = self._length - 1
+            self._index.execute("DELETE FROM blocks WHERE height = ?", (height,))
+            self._index.execute("DELETE FROM txs WHERE height = ?", (height,))
+            self._length -= 1
+        self._cache.pop(height)
+        return block
+
+    def height_of(self, block_hash: str):
+        with self._lock:
+            row = self._index.execute(
+                "SELECT height FROM blocks WHERE hash = ?", (block_hash,)
+            ).fetchone()
+        return row[0] if row else None
+
+    def tx(self, tx_hash: str):
+        with self._lock:
+            row = self._index.execute(
+                "SELECT data FROM txs WHERE hash = ?", (tx_hash,)
+            ).fetchone()
+        return _decode_tx(row[0]) if row else None
+
+    def tx_height(self, tx_hash: str):
+        with self._lock:
+            row = self._index.execute(
+                "SELECT height FROM txs WHERE hash = ?", (tx_hash,)
+            ).fetchone()
+        return row[0] if row else None
+
+    def tx_hashes(self):
+        with self._lock:
+            return [row[0] for row in self._index.execute("SELECT hash FROM txs")]
+
+    def tx_count(self) -> int:
+        with self._lock:
+            return self._index.execute("SELECT COUNT(*) FROM txs").fetchone()[0]
+
+    def txs(self):
+        with self._lock:
+            rows = self._index.execute(
+                "SELECT data FROM txs ORDER BY height, rowid"
+            ).fetchall()
+        for (data,) in rows:
+            yield _decode_tx(data)
+
+    def save_undo(self, height: int, undo) -> None:
+        with self._lock:
+            self._index.execute(
+                "INSERT OR REPLACE INTO undo (height, data) VALUES (?, ?)",
+                (height, json.dumps(undo)),
+            )
+
+    def pop_undo(self, height: int):
+        with self._lock:
+            row = self._index.execute(
+                "SELECT data FROM undo WHERE height = ?", (height,)
+            ).fetchone()
+            self._index.execute("DELETE FROM undo WHERE height = ?", (height,))
+        return json.loads(row[0]) if row else None
+
+    def get_state(self, key: str, default=None):
+        with self._lock:
+            row = self._index.execute(
+                "SELECT value FROM state WHERE key = ?", (key,)
+            ).fetchone()
+        return json.loads(row[0]) if row else default
+
+    def set_state(self, key: str, value) -> None:
+        with self._lock:
+            self._index.execute(
+                "INSERT OR REPLACE INTO state (key, value) VALUES (?, ?)",
+                (key, json.dumps(value)),
+            )
+
+    def commit(self) -> None:
+        self._uncommitted += 1
+        if self._uncommitted >= self.sync_every:
+            self.flush()
+
+    def flush(self) -> None:
+        with self._lock:
+            self._log.flush()
+            os.fsync(self._log.fileno())
+            self._index.commit()
+            self._uncommitted = 0
+
+    def close(self) -> None:
+        self.flush()
+        self._log.close()
+        self._index.close()
+
+
+def _decode_tx(data: bytes) -> dict:
+    # The wire format leaves the hashes out, the dict comes back with them
+    return Tx.from_dict(wire.decode_tx(data)).as_dict
+
+
+class StoredUTXOSet:
+    """
+    UTXOSet kept in the sqlite3 index of a BlockStore, so it is written and committed with the blocks
+    """
+
+    def __init__(self, store: BlockStore):
+        self._store = store
+
+    def _execute(self, sql, params=()):
+        with self._store._lock:
+            return self._store._index.execute(sql, params).fetchall()
+
+    def __len__(self) -> int:
+        return self._execute("SELECT COUNT(*) FROM utxos")[0][0]
+
+    def add(
+        self, tx_hash: str, index: int, address: str, amount: float, out_hash: str
+    ) -> None:
+        self._execute(
+            "INSERT OR REPLACE INTO utxos (tx_hash, output_index, address, amount, out_hash) "
+            "VALUES (?, ?, ?, ?, ?)",
+            (tx_hash, index, address, round(float(amount), 7), out_hash),
+        )
+
+    def spend(self, tx_hash: str, index: int) -> UTXO:
+        with self._store._lock:
+            utxo = self.get(tx_hash, index)
+            if utxo is None:
+                raise KeyError((tx_hash, index))
+            self._execute(
+                "DELETE FROM utxos WHERE tx_hash = ? AND output_index = ?",
+                (tx_hash, index),
+            )
+        return utxo
+
+    def get(self, tx_hash: str, index: int):
+        rows = self._execute(
+            "SELECT address, amount, out_hash FROM utxos WHERE tx_hash = ? AND output_index = ?",
+            (tx_hash, index),
+        )
+        return UTXO(*rows[0]) if rows else None
+
+    def by_address(self, address: str) -> list:
+        return [
+            (tx_hash, index, UTXO(address, amount, out_hash))
+            for tx_hash, index, amount, out_hash in self._execute(
+                "SELECT tx_hash, output_index, amount, out_hash FROM utxos WHERE address = ? ORDER BY rowid",
+                (address,),
+            )
+        ]
+
+    def balance(self, address: str) -> float:
+        return sum(utxo.amount for _, _, utxo in self.by_address(address))
@@ -1,21 +1,23 @@
+from collections import OrderedDict
+from threading import Lock
+
+
 class CompositeNumbers:
-    """Singleton class to find nth composite number"""
+    """
+    Singleton class to find nth composite number
+
+    Composites are sieved lazily (with a bytearray) only as far as the largest n asked for so far, doubling
+    the sieve whenever it runs out, so a fresh node doesn't pay for a big table on its first verification.
+    """
 
     __instance = None
 
     def __init__(self, *args, **kwargs):
         if CompositeNumbers.__instance is None:
             CompositeNumbers.__instance = self
-            is_prime = [True] * 10**5
-            for i in range(2, 10**5):
-                if i * i > 10**5:
-                    break
-
-                if is_prime[i]:
-                    for j in range(i * i, 10**5, i):
-                        is_prime[j] = False
-
-            self.composite_numbers = [i for i in range(4, 10**5) if not is_prime[i]]
+            self.composite_numbers = []
+            self._limit = 16
+            self._lock = Lock()
         else:
             raise Exception("This is a singleton class")
 
@@ -25,5 +27,85 @@ class CompositeNumbers:
             cls(*args, **kwargs)
         return cls.__instance
 
+    def _sieve(self, limit):
+        is_composite = bytearray(limit)
+        for i in range(2, int(limit**0.5) + 1):
+            if not is_composite[i]:
+                is_composite[i * i :: i] = b"\x01" * len(range(i * i, limit, i))
+        self.composite_numbers = [i for i in range(4, limit) if is_composite[i]]
+        self._limit = limit
+
     def get_nth(self, n):
+        if n > len(self.composite_numbers):
+            with self._lock:
+                while n > len(self.composite_numbers):
+                    self._sieve(self._limit * 2)
         return self.composite_numbers[n - 1]
+
+
+class LRUCache:
+    """
+    Thread-safe bounded mapping which evicts the least recently used entry once full
+
+    Attributes:
+        <int> maxsize: Maximum number of entries kept
+        <int> hits: Number of lookups that found their key
+        <int> misses: Number of lookups that did not
+    """
+
+    def __init__(self, maxsize=128):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._lock = Lock()
+
+    def __len__(self):
+        return len(self._data)
+
+    def __contains__(self, key):
+        return key in self._data
+
+    def get(self, key, default=None):
+        with self._lock:
+            try:
+                value = self._data[key]
+            except KeyError:
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            self._evict()
+
+    def pop(self, key, default=None):
+        with self._lock:
+            return self._data.pop(key, default)
+
+    def resize(self, maxsize):
+        with self._lock:
+            self.maxsize = maxsize
+            self._evict()
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self.hits = self.misses = 0
+
+    @property
+    def stats(self):
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+        }
+
+    def _evict(self):
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
@@ -0,0 +1,59 @@
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+
+class UTXO(NamedTuple):
+    address: str
+    amount: float
+    out_hash: str
+
+
+class UTXOSet:
+    """
+    Unspent outputs keyed by their outpoint, the (tx hash, output index) pair inputs refer to them by, with
+    a secondary index by address. Adding, spending and looking up an output are O(1).
+
+    Public Methods:
+        <void> add(str tx_hash, int index, str address, float amount, str out_hash): Adds an unspent output
+        <UTXO> spend(str tx_hash, int index): Removes an unspent output (KeyError if there is none)
+        <UTXO> get(str tx_hash, int index): Gets an unspent output (None if there is none)
+        <list> by_address(str address): Gets the (tx hash, output index, UTXO) of every output of an address
+        <float> balance(str address): Gets the sum of the unspent outputs of an address
+    """
+
+    __slots__ = ("_outputs", "_by_address")
+
+    def __init__(self) -> None:
+        self._outputs: Dict[Tuple[str, int], UTXO] = {}
+        # Dicts used as insertion ordered sets of outpoints
+        self._by_address: Dict[str, Dict[Tuple[str, int], None]] = {}
+
+    def __len__(self) -> int:
+        return len(self._outputs)
+
+    def add(
+        self, tx_hash: str, index: int, address: str, amount: float, out_hash: str
+    ) -> None:
+        outpoint = (tx_hash, index)
+        self._outputs[outpoint] = UTXO(address, round(float(amount), 7), out_hash)
+        self._by_address.setdefault(address, {})[outpoint] = None
+
+    def spend(self, tx_hash: str, index: int) -> UTXO:
+        outpoint = (tx_hash, index)
+        utxo = self._outputs.pop(outpoint)
+        outpoints = self._by_address[utxo.address]
+        del outpoints[outpoint]
+        if not outpoints:
+            del self._by_address[utxo.address]
+        return utxo
+
+    def get(self, tx_hash: str, index: int) -> Optional[UTXO]:
+        return self._outputs.get((tx_hash, index))
+
+    def by_address(self, address: str) -> List[Tuple[str, int, UTXO]]:
+        return [
+            (tx_hash, index, self._outputs[(tx_hash, index)])
+            for tx_hash, index in self._by_address.get(address, ())
+        ]
+
+    def balance(self, address: str) -> float:
+        return sum(utxo.amount for _, _, utxo in self.by_address(address))
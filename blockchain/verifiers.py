@@ -1,10 +1,8 @@
 import base64
 
-import rsa
-import binascii
-
-from sudoku.sudoku_board import SudokuBoard
-from sudoku.sudoku_gen import SudokuGenerator
+from sudoku.puzzle_cache import PuzzleCache
+from sudoku.sudoku_board import SudokuBoard, SudokuBoardException
+from .merkle import MerkleTree
 from .wallet.address import Address
 from .wallet.elliptic_curve import EllipticCurvePoint
 
@@ -13,37 +11,32 @@ class TxVerifier:
     def __init__(self, db):
         self.db = db
 
-    def verify(self, inputs, outputs):
+    def verify(self, inputs, outputs, check_signatures=True, spent=None):
+        """
+        Checks the inputs spend unspent outputs with valid signatures, returning the fee. Signatures can be
+        skipped when they were already checked in a batch (see BlockVerifier.verify_signatures). spent is
+        the set of outpoints spent before by the other txs of the block, the ones of the tx are added to it.
+        """
+        spent = set() if spent is None else spent
         total_amount_in = 0
         for i, inp in enumerate(inputs):
             if inp.prev_tx_hash == "COINBASE" and i == 0:
                 total_amount_in = int(self.db.config["mining_reward"])
                 continue
 
-            try:
-                out = self.db.transaction_by_hash[inp.prev_tx_hash]["outputs"][
-                    inp.output_index
-                ]
-            except KeyError as e:
-                raise Exception("Transaction output not found.") from e
-
-            total_amount_in += round(float(out["amount"]), 7)
-            if (
-                inp.prev_tx_hash,
-                out["hash"],
-            ) not in self.db.unspent_txs_by_user_hash.get(out["address"], set()):
-                raise Exception("Output of transaction already spent.")
-
-            hash_string = (
-                f"{inp.prev_tx_hash}{inp.output_index}{inp.address}{inp.index}"
-            )
-            try:
-                Address.verify(
-                    hash_string.encode(),
-                    base64.b64decode(inp.signature),
-                    EllipticCurvePoint.decode_b64(inp.address),
-                )
-            except:
+            outpoint = (inp.prev_tx_hash, inp.output_index)
+            if outpoint in spent:
+                raise Exception("Output of transaction spent twice.")
+            spent.add(outpoint)
+            utxo = self.db.utxos.get(inp.prev_tx_hash, inp.output_index)
+            if utxo is None:
+                if inp.prev_tx_hash in self.db.block_index_by_tx_hash:
+                    raise Exception("Output of transaction already spent.")
+                raise Exception("Transaction output not found.")
+
+            total_amount_in += utxo.amount
+
+            if check_signatures and not Address.verify(*self.signature(inp)):
                 raise Exception(f"Signature verification failed: {inp.as_dict}")
 
         total_amount_out = sum(round(float(out.amount), 7) for out in outputs)
@@ -52,6 +45,33 @@ class TxVerifier:
 
         return total_amount_in - total_amount_out
 
+    @staticmethod
+    def signature(inp):
+        """
+        Gets the (message, signature, public key) an input was signed with
+        """
+        hash_string = f"{inp.prev_tx_hash}{inp.output_index}{inp.address}{inp.index}"
+        try:
+            return (
+                hash_string.encode(),
+                base64.b64decode(inp.signature),
+                EllipticCurvePoint.decode_b64(inp.address),
+            )
+        except:
+            raise Exception(f"Signature verification failed: {inp.as_dict}")
+
+    @classmethod
+    def signatures(cls, txs):
+        """
+        Gets the (message, signature, public key) of every signed input of the transactions
+        """
+        return [
+            cls.signature(inp)
+            for tx in txs
+            for i, inp in enumerate(tx.inputs)
+            if not (inp.prev_tx_hash == "COINBASE" and i == 0)
+        ]
+
 
 class BlockOutOfChain(Exception):
     pass
@@ -69,17 +89,15 @@ class BlockVerifier:
     def verify(self, head, block):
         total_block_reward = int(self.db.config["mining_reward"])
 
-        # verifying block solution
-        # Our deterministic thing for sudoku generation is using the set difficulty + the prev hash of the block as the seed.
-        s = SudokuGenerator(self.db.config["difficulty"], block.seed)
-        if not s.generate_board().is_valid_solution(
-            SudokuBoard.decode(block.puzzle_solution)
-        ):
-            raise BlockVerificationFailed("Invalid puzzle solution")
+        self.verify_header(block, self.db.config["difficulty"])
 
-        # verifying transactions in a block
+        # verifying transactions in a block, all signatures at once and then the spent outputs in order
+        self.verify_signatures([block])
+        spent = set()
         for tx in block.txs[1:]:
-            fee = self.tv.verify(tx.inputs, tx.outputs)
+            fee = self.tv.verify(
+                tx.inputs, tx.outputs, check_signatures=False, spent=spent
+            )
             total_block_reward += fee
 
         total_reward_out = sum(out.amount for out in block.txs[0].outputs)
@@ -89,7 +107,7 @@ class BlockVerifier:
 
         # verifying some other things
         if head:
-            if head.index >= block.index:
+            if block.index != head.index + 1:
                 raise BlockOutOfChain("Block index number wrong")
             if head.hash() != block.prev_hash:
                 raise BlockOutOfChain("New block not pointed to the head")
@@ -97,3 +115,33 @@ class BlockVerifier:
                 raise BlockOutOfChain("Block from the past")
 
         return True
+
+    def verify_header(self, block, difficulty):
+        """
+        Checks the puzzle solution of the block at the difficulty of its height, and that its merkle root
+        matches its txs. Needs nothing from the chain, so blocks off the chain are checked with it before
+        they are kept.
+        """
+        # verifying block solution
+        # Our deterministic thing for sudoku generation is using the set difficulty + the prev hash of the block as the seed.
+        puzzle = PuzzleCache.get_instance().get_board(difficulty, block.seed)
+        try:
+            solution = SudokuBoard.decode(block.puzzle_solution)
+        except (ValueError, KeyError, TypeError, SudokuBoardException):
+            raise BlockVerificationFailed("Invalid puzzle solution")
+        if not puzzle.is_valid_solution(solution):
+            raise BlockVerificationFailed("Invalid puzzle solution")
+
+        # The block hash and seed only cover the merkle root, so it has to match the txs actually sent
+        if block.merkel_root != MerkleTree(tx.hash for tx in block.txs).root:
+            raise BlockVerificationFailed("Merkle root doesn't match the txs")
+
+    def verify_signatures(self, blocks):
+        """
+        Checks the signatures of all transactions in the blocks across a pool of processes (see
+        Address.verify_many). Signatures that pass are remembered, so verifying the blocks one by one
+        afterwards doesn't check them again.
+        """
+        txs = [tx for block in blocks for tx in block.txs[1:]]
+        if not Address.verify_many(self.tv.signatures(txs)):
+            raise Exception("Signature verification failed")
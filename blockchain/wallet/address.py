@@ -1,5 +1,10 @@
 import os
-from .elliptic_curve import EllipticCurvePoint
+from concurrent.futures import ProcessPoolExecutor
+from hashlib import sha256
+from threading import Lock
+from typing import Iterable, Iterator, Tuple
+from .elliptic_curve import EllipticCurvePoint, FixedBaseTable
+from ..utils import LRUCache
 import ecdsa
 
 
@@ -7,12 +12,30 @@ class Address:
     """
     The sudokucoin address
 
+    The public key, address string and signing key are derived once per instance (and dropped when the
+    private key changes). Request handlers that only get a private key should use Address.cached so repeated
+    calls with the same key share one instance.
+
+    Address.verify keeps the parsed ecdsa verifying key of recently seen public keys, and remembers which
+    (message, signature, public key) triples already verified, so a transaction checked when it enters the
+    mempool isn't checked again when its block arrives. Address.verify_many checks a batch of signatures
+    (a block, or a range of blocks while syncing) across a pool of processes, which is started on first use
+    and kept for the life of the process (see Address.pool).
+
     Attributes:
         <int> private_key: Private key of the address
 
     Methods:
         <EllipticCurvePoint> to_public_key: Get the public key given the private key
         <str> to_address: Gets the Base58 address using Base58Check Encode
+        <FixedBaseTable> generator_table: Gets the (lazily built) table of GENERATOR multiples
+        <void> load_generator_table(str path): Loads the GENERATOR table from disk, building and saving it if needed
+        <Address> cached(int private_key): Gets the shared instance for the private key
+        <ProcessPoolExecutor> pool(): Gets the shared process pool, starting it if needed
+        <void> shutdown_pool(): Stops the shared process pool
+        <bool> verify_many(items): Checks many (msg, signature, public key) triples, stopping at the first bad one
+        <Iterator[str]> derive_addresses(private_keys): Gets the addresses of many private keys across processes
+        <Iterator[Address]> create_many(int count): Creates many new addresses across processes
     """
 
     GENERATOR = EllipticCurvePoint(
@@ -20,27 +43,118 @@ class Address:
         0x483ADA7726A3C4655DA4FBFC0E1108A8FD17B448A68554199C47D08FFB10D4B8,
     )
 
+    _generator_table = None
+    _generator_table_lock = Lock()
+    _instances = LRUCache(1024)
+    _verifying_keys = LRUCache(1024)
+    _verified_signatures = LRUCache(16384)
+    _pool = None
+    _pool_lock = Lock()
+    POOL_WORKERS = os.cpu_count() or 1
+    # Below this many signatures starting the process pool costs more than it saves
+    PARALLEL_VERIFY_MIN = 16
+    # Set on the shared instances of Address.cached, whose private key can't change
+    _frozen = False
+
     def __init__(self, private_key: int):
         self.private_key = private_key
 
+    @property
+    def private_key(self) -> int:
+        return self._private_key
+
+    @private_key.setter
+    def private_key(self, private_key: int) -> None:
+        if self._frozen:
+            raise AttributeError("The private key of a cached address can't change")
+        self._private_key = private_key
+        self._public_key = None
+        self._address = None
+        self._signing_key = None
+
+    @classmethod
+    def cached(cls, private_key: int) -> "Address":
+        """
+        Gets the process-wide instance for private_key (bounded LRU), so its derived keys are reused. The
+        instance is shared, so its private key can't be changed.
+        """
+        wallet = cls._instances.get(private_key)
+        if wallet is None:
+            wallet = cls(private_key)
+            wallet._frozen = True
+            cls._instances.put(private_key, wallet)
+        return wallet
+
+    @classmethod
+    def generator_table(cls) -> FixedBaseTable:
+        if cls._generator_table is None:
+            with cls._generator_table_lock:
+                if cls._generator_table is None:
+                    cls._generator_table = FixedBaseTable(cls.GENERATOR)
+        return cls._generator_table
+
+    @classmethod
+    def load_generator_table(cls, path: str) -> None:
+        """
+        Loads the GENERATOR table from path so startup doesn't have to build it, building it and saving it
+        there first if the file is missing or doesn't hold a valid table.
+        """
+        try:
+            with open(path, "rb") as fp:
+                table = FixedBaseTable.from_bytes(cls.GENERATOR, fp.read())
+        except (OSError, ValueError, IndexError):
+            table = FixedBaseTable(cls.GENERATOR)
+            with open(path + ".tmp", "wb") as fp:
+                fp.write(table.to_bytes())
+            os.replace(path + ".tmp", path)
+        cls._generator_table = table
+
+    @classmethod
+    def pool(cls) -> ProcessPoolExecutor:
+        """
+        Gets the process pool shared by the batch methods, started on first use. The GENERATOR table is built
+        before so the workers don't each build their own.
+        """
+        if cls._pool is None:
+            cls.generator_table()
+            with cls._pool_lock:
+                if cls._pool is None:
+                    cls._pool = ProcessPoolExecutor(cls.POOL_WORKERS)
+        return cls._pool
+
+    @classmethod
+    def shutdown_pool(cls) -> None:
+        """
+        Stops the shared process pool, dropping the work it hasn't started. The next batch starts a new one.
+        """
+        with cls._pool_lock:
+            pool, cls._pool = cls._pool, None
+        if pool is not None:
+            pool.shutdown(cancel_futures=True)
+
     def to_public_key(self) -> EllipticCurvePoint:
-        return self.GENERATOR * self.private_key
+        if self._public_key is None:
+            self._public_key = self.generator_table().multiply(self.private_key)
+        return self._public_key
 
     def to_address(self) -> str:
         # Note: Sudokucoin uses the \x02\xe4 prefix unlike Bitcoin's \x00 (see what addresses this generates)
         # (ok, well half the time it does indeed generate 68 as the first 2 characters. But the other half of
         # the time it is nice)
         # Conversion is defined as Base58CheckEncode(ripemd(sha256(pubkey)))
-        return self.to_public_key().to_address()
+        if self._address is None:
+            self._address = self.to_public_key().to_address()
+        return self._address
 
     def sign(self, msg: bytes) -> bytes:
         """
         Sign the message with the private key
         """
-        private_key = ecdsa.SigningKey.from_secret_exponent(
-            self.private_key, curve=ecdsa.SECP256k1
-        )
-        return private_key.sign(msg)
+        if self._signing_key is None:
+            self._signing_key = ecdsa.SigningKey.from_secret_exponent(
+                self.private_key, curve=ecdsa.SECP256k1
+            )
+        return self._signing_key.sign(msg)
 
     @classmethod
     def create(cls, private_key: int = None) -> "Address":
@@ -51,15 +165,141 @@ class Address:
             private_key = int.from_bytes(os.urandom(32), "big")
         return cls(private_key)
 
-    @staticmethod
-    def verify(msg: bytes, signature: bytes, public_key: EllipticCurvePoint) -> bool:
+    @classmethod
+    def derive_addresses(
+        cls, private_keys: Iterable[int], max_workers: int = None
+    ) -> Iterator[str]:
+        """
+        Get the addresses of many private keys, in order, deriving them across the shared pool of processes.
+        They are yielded as they are ready so callers can stream them. Closing the generator cancels the
+        derivations that haven't started. Pass max_workers=1 to derive them in this process.
+        """
+        private_keys = list(private_keys)
+        if max_workers == 1 or len(private_keys) < 2:
+            yield from map(_derive_address, private_keys)
+            return
+        pool = cls.pool()
+        size = max(1, min(256, len(private_keys) // (4 * cls.POOL_WORKERS)))
+        futures = [
+            pool.submit(_derive_addresses, private_keys[i : i + size])
+            for i in range(0, len(private_keys), size)
+        ]
+        try:
+            for future in futures:
+                yield from future.result()
+        finally:
+            for future in futures:
+                future.cancel()
+
+    @classmethod
+    def create_many(cls, count: int, max_workers: int = None) -> Iterator["Address"]:
+        """
+        Create many new addresses, deriving their public addresses across the shared pool of processes.
+        Closing the generator stops the derivation.
+        """
+        private_keys = [int.from_bytes(os.urandom(32), "big") for _ in range(count)]
+        addresses = cls.derive_addresses(private_keys, max_workers)
+        try:
+            for private_key, address in zip(private_keys, addresses):
+                wallet = cls(private_key)
+                wallet._address = address
+                yield wallet
+        finally:
+            addresses.close()
+
+    @classmethod
+    def verify(
+        cls, msg: bytes, signature: bytes, public_key: EllipticCurvePoint
+    ) -> bool:
         """
         Verify the signature of the message with the public key
         """
+        encoded = public_key.encode()
+        digest = cls._signature_digest(msg, signature, encoded)
+        if cls._verified_signatures.get(digest):
+            return True
+
+        verified = _verify_signature((msg, signature, encoded))
+        if verified:
+            cls._verified_signatures.put(digest, True)
+        return verified
+
+    @classmethod
+    def verify_many(
+        cls,
+        items: Iterable[Tuple[bytes, bytes, EllipticCurvePoint]],
+        max_workers: int = None,
+    ) -> bool:
+        """
+        Verify many (message, signature, public key) triples across the shared pool of processes, returning
+        whether all of them are valid. Stops at the first invalid signature. Pass max_workers=1 to verify them
+        in this process.
+        """
+        pending = []
+        for msg, signature, public_key in items:
+            encoded = public_key.encode()
+            digest = cls._signature_digest(msg, signature, encoded)
+            if not cls._verified_signatures.get(digest):
+                pending.append((digest, (msg, signature, encoded)))
+
+        if max_workers == 1 or len(pending) < cls.PARALLEL_VERIFY_MIN:
+            results = (_verify_signature(item) for _, item in pending)
+            return cls._record_verified(pending, results)
+        pool = cls.pool()
+        size = max(1, len(pending) // (4 * cls.POOL_WORKERS))
+        futures = [
+            pool.submit(_verify_signatures, [item for _, item in pending[i : i + size]])
+            for i in range(0, len(pending), size)
+        ]
         try:
-            public_key = ecdsa.VerifyingKey.from_string(
-                public_key.encode(), curve=ecdsa.SECP256k1
+            results = (verified for future in futures for verified in future.result())
+            return cls._record_verified(pending, results)
+        finally:
+            # The chunks after an invalid signature aren't needed anymore
+            for future in futures:
+                future.cancel()
+
+    @classmethod
+    def _record_verified(cls, pending: list, results: Iterable[bool]) -> bool:
+        for (digest, _), verified in zip(pending, results):
+            if not verified:
+                return False
+            cls._verified_signatures.put(digest, True)
+        return True
+
+    @staticmethod
+    def _signature_digest(msg: bytes, signature: bytes, encoded: bytes) -> bytes:
+        # Hash each part first so different splits of the same bytes can't collide
+        return sha256(
+            b"".join(sha256(part).digest() for part in (msg, signature, encoded))
+        ).digest()
+
+    @classmethod
+    def _verifying_key(cls, encoded: bytes) -> ecdsa.VerifyingKey:
+        verifying_key = cls._verifying_keys.get(encoded)
+        if verifying_key is None:
+            verifying_key = ecdsa.VerifyingKey.from_string(
+                encoded, curve=ecdsa.SECP256k1
             )
-            return public_key.verify(signature, msg)
-        except ecdsa.BadSignatureError:
-            return False
+            cls._verifying_keys.put(encoded, verifying_key)
+        return verifying_key
+
+
+def _derive_address(private_key: int) -> str:
+    return Address(private_key).to_address()
+
+
+def _derive_addresses(private_keys: list) -> list:
+    return [_derive_address(private_key) for private_key in private_keys]
+
+
+def _verify_signature(item: Tuple[bytes, bytes, bytes]) -> bool:
+    msg, signature, encoded = item
+    try:
+        return Address._verifying_key(encoded).verify(signature, msg)
+    except (ecdsa.BadSignatureError, ecdsa.MalformedPointError):
+        return False
+
+
+def _verify_signatures(items: list) -> list:
+    return [_verify_signature(item) for item in items]
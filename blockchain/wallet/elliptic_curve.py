@@ -1,6 +1,7 @@
 from dataclasses import dataclass
 import base64
 import math
+import random
 from Crypto.Hash import RIPEMD160
 import hashlib
 
@@ -46,6 +47,100 @@ def b58decode(s: str, alphabet: str) -> bytes:
     return n.to_bytes(math.ceil(n.bit_length() / 8), "big")
 
 
+# Jacobian coordinates helpers for EllipticCurvePoint.__mul__. A point (X, Y, Z) stands for the affine point
+# (X/Z^2, Y/Z^3); Z == 0 is the point at infinity.
+_JACOBIAN_INFINITY = (1, 1, 0)
+_WNAF_WIDTH = 5
+
+
+def _jacobian_double(point, a, p):
+    x, y, z = point
+    if z == 0 or y == 0:
+        return _JACOBIAN_INFINITY
+    yy = y * y % p
+    s = 4 * x * yy % p
+    m = 3 * x * x % p
+    if a:
+        m = (m + a * pow(z, 4, p)) % p
+    x3 = (m * m - 2 * s) % p
+    return x3, (m * (s - x3) - 8 * yy * yy) % p, 2 * y * z % p
+
+
+def _jacobian_add(point, other, a, p):
+    x1, y1, z1 = point
+    x2, y2, z2 = other
+    if z1 == 0:
+        return other
+    if z2 == 0:
+        return point
+    z1z1 = z1 * z1 % p
+    z2z2 = z2 * z2 % p
+    u1 = x1 * z2z2 % p
+    u2 = x2 * z1z1 % p
+    s1 = y1 * z2 * z2z2 % p
+    s2 = y2 * z1 * z1z1 % p
+    if u1 == u2:
+        if s1 != s2:
+            return _JACOBIAN_INFINITY
+        return _jacobian_double(point, a, p)
+    h = (u2 - u1) % p
+    r = (s2 - s1) % p
+    hh = h * h % p
+    hhh = h * hh % p
+    v = u1 * hh % p
+    x3 = (r * r - hhh - 2 * v) % p
+    return x3, (r * (v - x3) - s1 * hhh) % p, h * z1 * z2 % p
+
+
+def _jacobian_add_affine(point, x2, y2, a, p):
+    """_jacobian_add for an affine other point (Z = 1), which saves a few multiplications"""
+    x1, y1, z1 = point
+    if z1 == 0:
+        return x2, y2, 1
+    z1z1 = z1 * z1 % p
+    u2 = x2 * z1z1 % p
+    s2 = y2 * z1 * z1z1 % p
+    if x1 == u2:
+        if y1 != s2:
+            return _JACOBIAN_INFINITY
+        return _jacobian_double(point, a, p)
+    h = (u2 - x1) % p
+    r = (s2 - y1) % p
+    hh = h * h % p
+    hhh = h * hh % p
+    v = x1 * hh % p
+    x3 = (r * r - hhh - 2 * v) % p
+    return x3, (r * (v - x3) - y1 * hhh) % p, h * z1 % p
+
+
+def _from_jacobian(point, curve):
+    x, y, z = point
+    if z == 0:
+        return EllipticCurvePoint(0, 0, curve)
+    z_inv = modular_inverse(z, curve.field_size)
+    z_inv2 = z_inv * z_inv % curve.field_size
+    return EllipticCurvePoint(
+        x * z_inv2 % curve.field_size, y * z_inv2 * z_inv % curve.field_size, curve
+    )
+
+
+def _wnaf(k, width):
+    """Width-w non-adjacent form of k >= 0, least significant digit first. Digits are odd and |d| < 2^(w-1)"""
+    digits = []
+    window = 1 << width
+    while k:
+        if k & 1:
+            digit = k % window
+            if digit >= window >> 1:
+                digit -= window
+            k -= digit
+        else:
+            digit = 0
+        digits.append(digit)
+        k >>= 1
+    return digits
+
+
 def sha256(msg):
     return hashlib.sha256(msg).digest()
 
@@ -175,16 +270,38 @@ class EllipticCurvePoint:
             return EllipticCurvePoint(intersection_x, intersection_y, self.curve)
 
     def __mul__(self, times: int):
-        # Stolen from Andrej Karpathy's implementation and refactored slightly
+        """
+        Scalar multiplication using a width-w NAF of times and Jacobian coordinates, where (X, Y, Z) stands for
+        the affine point (X/Z^2, Y/Z^3). Jacobian adds and doubles need no modular inverse, so there is a single
+        inversion at the end instead of one per step, and the NAF needs about one add per w + 1 doublings.
+        """
         assert int(times) == times
-        result = EllipticCurvePoint(0, 0, self.curve)
-        current_point = self
-        while times:
-            if times % 2 == 1:
-                result += current_point
-            current_point += current_point
-            times >>= 1
-        return result
+        times = int(times)
+        if times == 0 or self.is_point_at_infinity():
+            return EllipticCurvePoint(0, 0, self.curve)
+        if times < 0:
+            negated = EllipticCurvePoint(
+                self.x, -self.y % self.curve.field_size, self.curve
+            )
+            return negated * -times
+
+        p, a = self.curve.field_size, self.curve.a
+        point = (self.x, self.y, 1)
+        # Odd multiples P, 3P, 5P, ... (2^(w-1) - 1)P for the non-zero NAF digits
+        double = _jacobian_double(point, a, p)
+        odd_multiples = [point]
+        for _ in range(1, 1 << (_WNAF_WIDTH - 2)):
+            odd_multiples.append(_jacobian_add(odd_multiples[-1], double, a, p))
+
+        result = _JACOBIAN_INFINITY
+        for digit in reversed(_wnaf(times, _WNAF_WIDTH)):
+            result = _jacobian_double(result, a, p)
+            if digit > 0:
+                result = _jacobian_add(result, odd_multiples[digit >> 1], a, p)
+            elif digit < 0:
+                x, y, z = odd_multiples[-digit >> 1]
+                result = _jacobian_add(result, (x, -y % p, z), a, p)
+        return _from_jacobian(result, self.curve)
 
     def __rmul__(self, times: int):
         return self * times
@@ -210,3 +327,114 @@ class EllipticCurvePoint:
     @classmethod
     def decode_b64(cls, data: str):
         return cls.decode(base64.b64decode(data))
+
+
+class FixedBaseTable:
+    """
+    Precomputed multiples of one base point, so multiplying it by a scalar takes only additions.
+
+    The scalar is split into windows of `window` bits; entry [i][j - 1] of the table is j * 2^(window * i) * base
+    (in affine coordinates), so k * base is the sum of one entry per non-zero window of k. For secp256k1 with
+    8 bit windows that is at most 32 additions instead of ~256 doublings and ~43 additions.
+
+    Attributes:
+        <EllipticCurvePoint> base: The base point
+        <int> window: Bits per window
+        <int> bits: Largest scalar bit length covered by the table
+
+    Methods:
+        <EllipticCurvePoint> multiply(int k): Gets k * base
+        <bytes> to_bytes(): Serializes the table, to persist it
+        <FixedBaseTable> from_bytes(EllipticCurvePoint base, bytes data): Loads a table from to_bytes
+    """
+
+    def __init__(self, base, window=8, bits=256, table=None):
+        self.base = base
+        self.window = window
+        self.bits = bits
+        self.table = table or self._build()
+
+    def _build(self):
+        p, a = self.base.curve.field_size, self.base.curve.a
+        size = (1 << self.window) - 1
+        jacobian = []
+        window_base = (self.base.x, self.base.y, 1)
+        for _ in range(-(-self.bits // self.window)):
+            multiple = window_base
+            for _ in range(size):
+                jacobian.append(multiple)
+                multiple = _jacobian_add(multiple, window_base, a, p)
+            window_base = multiple  # (2^window) * previous window base
+        # Normalize everything with a single inversion (Montgomery's trick)
+        prefix = [1]
+        for _, _, z in jacobian:
+            prefix.append(prefix[-1] * (z or 1) % p)
+        inverse = modular_inverse(prefix[-1], p)
+        affine = [None] * len(jacobian)
+        for i in range(len(jacobian) - 1, -1, -1):
+            x, y, z = jacobian[i]
+            if z == 0:
+                continue
+            z_inv = inverse * prefix[i] % p
+            inverse = inverse * z % p
+            z_inv2 = z_inv * z_inv % p
+            affine[i] = (x * z_inv2 % p, y * z_inv2 * z_inv % p)
+        return [affine[i : i + size] for i in range(0, len(affine), size)]
+
+    def multiply(self, k):
+        if k < 0 or k.bit_length() > self.bits:
+            return self.base * k
+        p, a = self.base.curve.field_size, self.base.curve.a
+        mask = (1 << self.window) - 1
+        result = _JACOBIAN_INFINITY
+        for row in self.table:
+            digit = k & mask
+            k >>= self.window
+            if digit and row[digit - 1] is not None:
+                result = _jacobian_add_affine(result, *row[digit - 1], a, p)
+        return _from_jacobian(result, self.base.curve)
+
+    def to_bytes(self):
+        data = bytearray([self.window]) + self.bits.to_bytes(2, "big")
+        for row in self.table:
+            for entry in row:
+                # (0, 0) stands for multiples that are the point at infinity
+                x, y = entry or (0, 0)
+                data += x.to_bytes(32, "big") + y.to_bytes(32, "big")
+        # Digest of the table, so a corrupted file isn't loaded
+        return bytes(data) + sha256(bytes(data))
+
+    @classmethod
+    def from_bytes(cls, base, data):
+        """
+        Loads a table, refusing (with a ValueError) data that is truncated, corrupted or built for another
+        base point: besides the digest, every entry must be on the curve, and the first entry of every row
+        and a few random others must match a multiplication of the base point.
+        """
+        body, digest = data[:-32], data[-32:]
+        if len(body) < 3 or sha256(body) != digest:
+            raise ValueError("Table is corrupted")
+        window, bits = body[0], int.from_bytes(body[1:3], "big")
+        size, rows = (1 << window) - 1, -(-bits // window)
+        if not window or len(body) != 3 + 64 * size * rows:
+            raise ValueError("Table is truncated")
+        entries = []
+        for i in range(3, len(body), 64):
+            x = int.from_bytes(body[i : i + 32], "big")
+            y = int.from_bytes(body[i + 32 : i + 64], "big")
+            point = EllipticCurvePoint(x, y, base.curve)
+            if not point.is_point_at_infinity() and not point.is_point_on_curve():
+                raise ValueError("Table has points off the curve")
+            entries.append((x, y) if x or y else None)
+        table = [entries[i : i + size] for i in range(0, len(entries), size)]
+
+        rng = random.SystemRandom()
+        checks = [(i, 1) for i in range(rows)]
+        checks += [(rng.randrange(rows), rng.randrange(1, size + 1)) for _ in range(16)]
+        for i, j in checks:
+            expected = base * (j << (window * i))
+            if table[i][j - 1] != (
+                None if expected.is_point_at_infinity() else (expected.x, expected.y)
+            ):
+                raise ValueError("Table does not belong to this base point")
+        return cls(base, window, bits, table)
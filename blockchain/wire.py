@@ -0,0 +1,282 @@
+"""
+Binary encoding of blocks and transactions for node to node traffic
+
+Works on the dicts given by Block.as_dict / Tx.as_dict (and taken by from_dict). Hashes that the receiver
+recomputes anyway (tx, input and output hashes, the block hash) are left out. Integers are varints, amounts
+are doubles, and the fields which hold hex hashes, base64 strings, bytes, numbers or None depending on the
+block (prev_hash, merkel_root, puzzle_solution, addresses, signatures) are written as tagged values. Hex
+hashes and base64 strings are sent as their raw bytes when they decode back to exactly the same string, so
+decoding gives back the very same values (and so the same hashes).
+
+Every message starts with the format version. Peers ask for it with CONTENT_TYPE in Content-Type / Accept,
+JSON stays available for everyone else.
+"""
+
+import base64
+import binascii
+import re
+import struct
+
+CONTENT_TYPE = "application/x-sudokucoin"
+VERSION = 1
+
+_DOUBLE = struct.Struct(">d")
+_HEX32_STR = re.compile("[0-9a-f]{64}")
+
+_NONE, _INT, _STR, _BYTES, _HEX32, _B64_STR, _B64_BYTES = range(7)
+
+
+class WireFormatException(Exception):
+    pass
+
+
+def _b64_raw(value):
+    """Raw bytes of a base64 string (or bytes), if encoding them again gives back the same value"""
+    try:
+        raw = base64.b64decode(value, validate=True)
+    except (binascii.Error, ValueError):
+        return None
+    encoded = base64.b64encode(raw)
+    return (
+        raw
+        if encoded == (value if isinstance(value, bytes) else value.encode())
+        else None
+    )
+
+
+class _Writer:
+    __slots__ = ("buffer",)
+
+    def __init__(self, header=True):
+        self.buffer = bytearray([VERSION] if header else [])
+
+    def varint(self, value):
+        if type(value) is not int or value < 0:
+            raise WireFormatException(f"Expected a non negative integer, got {value!r}")
+        while value > 0x7F:
+            self.buffer.append(value & 0x7F | 0x80)
+            value >>= 7
+        self.buffer.append(value)
+
+    def raw(self, data):
+        self.varint(len(data))
+        self.buffer += data
+
+    def double(self, value):
+        self.buffer += _DOUBLE.pack(value)
+
+    def value(self, value):
+        if value is None:
+            self.buffer.append(_NONE)
+        elif type(value) is int:
+            self.buffer.append(_INT)
+            self.varint(value << 1 if value >= 0 else (-value << 1) - 1)
+        elif isinstance(value, str):
+            # Exactly 64 lowercase hex digits: fromhex skips whitespace, so looser strings give fewer bytes
+            if _HEX32_STR.fullmatch(value):
+                self.buffer.append(_HEX32)
+                self.buffer += bytes.fromhex(value)
+                return
+            raw = _b64_raw(value) if value else None
+            if raw is not None:
+                self.buffer.append(_B64_STR)
+                self.raw(raw)
+            else:
+                self.buffer.append(_STR)
+                self.raw(value.encode())
+        elif isinstance(value, bytes):
+            raw = _b64_raw(value) if value else None
+            if raw is not None:
+                self.buffer.append(_B64_BYTES)
+                self.raw(raw)
+            else:
+                self.buffer.append(_BYTES)
+                self.raw(value)
+        else:
+            raise WireFormatException(f"Can't encode {value!r}")
+
+    def tx(self, tx):
+        self.varint(tx["timestamp"])
+        self.varint(len(tx["inputs"]))
+        for inp in tx["inputs"]:
+            self.value(inp["prev_tx_hash"])
+            self.varint(inp["output_index"])
+            self.value(inp["address"])
+            self.varint(inp["index"])
+            self.value(inp["signature"])
+        self.varint(len(tx["outputs"]))
+        for out in tx["outputs"]:
+            self.double(out["amount"])
+            self.value(out["address"])
+            self.varint(out["index"])
+
+    def block(self, block):
+        self.varint(block["index"])
+        self.varint(block["timestamp"])
+        self.value(block["prev_hash"])
+        self.value(block.get("merkel_root"))
+        self.value(block.get("puzzle_solution"))
+        self.varint(len(block["txs"]))
+        for tx in block["txs"]:
+            self.tx(tx)
+
+
+class _Reader:
+    __slots__ = "data", "offset"
+
+    def __init__(self, data):
+        self.data = bytes(data)
+        if not self.data:
+            raise WireFormatException("Empty message")
+        if self.data[0] != VERSION:
+            raise WireFormatException(f"Unsupported wire format version {self.data[0]}")
+        self.offset = 1
+
+    def take(self, size):
+        start, end = self.offset, self.offset + size
+        if end > len(self.data):
+            raise WireFormatException("Message truncated")
+        self.offset = end
+        return self.data[start:end]
+
+    def byte(self):
+        try:
+            byte = self.data[self.offset]
+        except IndexError:
+            raise WireFormatException("Message truncated") from None
+        self.offset += 1
+        return byte
+
+    def varint(self):
+        byte = self.byte()
+        if byte < 0x80:
+            return byte
+        value, shift = byte & 0x7F, 7
+        while True:
+            byte = self.byte()
+            value |= (byte & 0x7F) << shift
+            if byte < 0x80:
+                return value
+            shift += 7
+
+    def raw(self):
+        return self.take(self.varint())
+
+    def double(self):
+        return _DOUBLE.unpack(self.take(_DOUBLE.size))[0]
+
+    def value(self):
+        tag = self.byte()
+        if tag == _NONE:
+            return None
+        if tag == _INT:
+            value = self.varint()
+            return value >> 1 if not value & 1 else -((value + 1) >> 1)
+        if tag == _STR:
+            try:
+                return self.raw().decode()
+            except UnicodeDecodeError as e:
+                raise WireFormatException("Invalid string") from e
+        if tag == _BYTES:
+            return self.raw()
+        if tag == _HEX32:
+            return self.take(32).hex()
+        if tag == _B64_STR:
+            return base64.b64encode(self.raw()).decode()
+        if tag == _B64_BYTES:
+            return base64.b64encode(self.raw())
+        raise WireFormatException(f"Unknown value tag {tag}")
+
+    def tx(self):
+        timestamp = self.varint()
+        inputs = [
+            {
+                "prev_tx_hash": self.value(),
+                "output_index": self.varint(),
+                "address": self.value(),
+                "index": self.varint(),
+                "signature": self.value(),
+            }
+            for _ in range(self.varint())
+        ]
+        outputs = [
+            {
+                "amount": self.double(),
+                "address": self.value(),
+                "index": self.varint(),
+                "input_hash": None,
+            }
+            for _ in range(self.varint())
+        ]
+        return {"inputs": inputs, "outputs": outputs, "timestamp": timestamp}
+
+    def block(self):
+        return {
+            "index": self.varint(),
+            "timestamp": self.varint(),
+            "prev_hash": self.value(),
+            "merkel_root": self.value(),
+            "puzzle_solution": self.value(),
+            "txs": [self.tx() for _ in range(self.varint())],
+        }
+
+    def end(self, result):
+        if self.offset != len(self.data):
+            raise WireFormatException("Trailing data after message")
+        return result
+
+
+def encode_tx(tx: dict) -> bytes:
+    writer = _Writer()
+    try:
+        writer.tx(tx)
+    except (KeyError, TypeError) as e:
+        raise WireFormatException(f"Malformed tx: {e}") from e
+    return bytes(writer.buffer)
+
+
+def decode_tx(data: bytes) -> dict:
+    reader = _Reader(data)
+    return reader.end(reader.tx())
+
+
+def encode_block_body(block: dict) -> bytes:
+    """
+    Encodes a block without the message header, so encoded blocks can be kept and joined with join_blocks
+    """
+    writer = _Writer(header=False)
+    try:
+        writer.block(block)
+    except (KeyError, TypeError) as e:
+        raise WireFormatException(f"Malformed block: {e}") from e
+    return bytes(writer.buffer)
+
+
+def join_blocks(bodies: list) -> bytes:
+    """
+    Makes the message of many blocks encoded with encode_block_body, as encode_blocks would
+    """
+    writer = _Writer()
+    writer.varint(len(bodies))
+    writer.buffer += b"".join(bodies)
+    return bytes(writer.buffer)
+
+
+def encode_blocks(blocks: list) -> bytes:
+    return join_blocks([encode_block_body(block) for block in blocks])
+
+
+def decode_blocks(data: bytes) -> list:
+    reader = _Reader(data)
+    return reader.end([reader.block() for _ in range(reader.varint())])
+
+
+def encode_block(block: dict) -> bytes:
+    return encode_blocks([block])
+
+
+def decode_block(data: bytes) -> dict:
+    blocks = decode_blocks(data)
+    if len(blocks) != 1:
+        raise WireFormatException(f"Expected one block, got {len(blocks)}")
+    return blocks[0]
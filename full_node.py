@@ -1,10 +1,12 @@
 import binascii
 import json.decoder
 
-from fastapi import FastAPI, BackgroundTasks, Request
+from fastapi import FastAPI, BackgroundTasks, HTTPException, Query, Request
+from fastapi.exceptions import RequestValidationError
 from fastapi.middleware.cors import CORSMiddleware
-import uvicorn
-import requests
+from fastapi.responses import Response, StreamingResponse
+from pydantic import ValidationError
+from starlette.concurrency import iterate_in_threadpool
 import asyncio
 import logging
 import sys
@@ -12,10 +14,12 @@ import sys
 from blockchain.verifiers import BlockVerificationFailed, BlockOutOfChain
 from blockchain.wallet.address import Address
 from models import *
-from blockchain.db import DB
+from blockchain.db import DB, PersistentDB
 from blockchain.blockchain import Blockchain
 from blockchain.api import API
 from blockchain.blocks import Input, Output, Tx
+from blockchain import wire
+from sudoku.sudoku_board import SudokuBoardException
 
 # Custom formatter
 class ColorFormatter(logging.Formatter):
@@ -48,11 +52,15 @@ app = FastAPI()
 app.config = {}
 app.jobs = {}
 
+MAX_WALLETS_PER_REQUEST = 10000
+
 # Make app accept CORS
 app.add_middleware(CORSMiddleware, allow_origins=["*"], allow_methods=["*"])
 
 ### TASKS
 def sync_data():
+    import requests
+
     logger.info("================== Sync started =================")
     bc = app.config["api"]
     head = bc.get_head()
@@ -65,12 +73,24 @@ def sync_data():
             start = head["index"] + 1 if head else 0
             while True:
                 logger.info(url, {"from_block": start, "limit": 20})
-                res = requests.get(url, params={"from_block": start, "limit": 20})
+                res = requests.get(
+                    url,
+                    params={"from_block": start, "limit": 20},
+                    headers={"Accept": f"{wire.CONTENT_TYPE}, application/json"},
+                )
                 if res.status_code == 200:
-                    data = res.json()
+                    if is_wire_format(res.headers):
+                        data = wire.decode_blocks(res.content)
+                    else:
+                        data = res.json()
                     if not data:
                         break
                     sync_running = True
+                    try:
+                        bc.verify_signatures(data)
+                    except Exception as e:
+                        logger.exception(e)
+                        return
                     for block in data:
                         try:
                             bc.add_block(block)
@@ -88,7 +108,13 @@ def sync_data():
             return
 
 
-def broadcast(path, data, params=False, fiter_host=None):
+def broadcast(path, data, params=False, fiter_host=None, encode=None):
+    """
+    Sends data to every other node, as query params, JSON or, when encode is given, in the binary wire
+    format made by encode (falling back to JSON for nodes which don't understand it)
+    """
+    import requests
+
     for node in list(app.config["nodes"])[:]:
         if (
             node == ("%s:%s" % (app.config["host"], app.config["port"]))
@@ -100,6 +126,18 @@ def broadcast(path, data, params=False, fiter_host=None):
         try:
             # header added here as we run all nodes on one domain and need somehow understand the sender node
             # to not create broadcast loop
+            if encode:
+                res = requests.post(
+                    url,
+                    data=encode(data),
+                    timeout=2,
+                    headers={
+                        "node": "%s:%s" % (app.config["host"], app.config["port"]),
+                        "Content-Type": wire.CONTENT_TYPE,
+                    },
+                )
+                if res.status_code not in (415, 422):
+                    continue
             if params:
                 requests.post(
                     url,
@@ -122,6 +160,53 @@ def broadcast(path, data, params=False, fiter_host=None):
             pass
 
 
+def is_wire_format(headers):
+    return headers.get("content-type", "").startswith(wire.CONTENT_TYPE)
+
+
+async def read_body(request: Request, decode, model):
+    """
+    Gets the block or tx dict sent either in the binary wire format (parsed with decode) or as JSON, checked
+    against the pydantic model either way. Bodies that can't be parsed or don't match the model get a 422.
+    """
+    if is_wire_format(request.headers):
+        try:
+            data = decode(await request.body())
+        except wire.WireFormatException as e:
+            raise HTTPException(status_code=422, detail=str(e))
+        try:
+            # Only checked: the hashes are computed over the decoded values, which the model could coerce
+            model(**data)
+        except ValidationError as e:
+            raise RequestValidationError(e.errors())
+        return data
+    try:
+        data = await request.json()
+    except (json.JSONDecodeError, UnicodeDecodeError) as e:
+        raise HTTPException(status_code=422, detail=f"Invalid JSON: {e}")
+    if not isinstance(data, dict):
+        raise HTTPException(status_code=422, detail="Expected a JSON object")
+    try:
+        return model(**data).dict()
+    except ValidationError as e:
+        raise RequestValidationError(e.errors())
+
+
+def blocks_response(request: Request, blocks):
+    """
+    Sends a list of blocks from their cached encodings, in the wire format if the client asks for it
+    """
+    if wire.CONTENT_TYPE in request.headers.get("accept", ""):
+        return Response(
+            wire.join_blocks([block.as_wire for block in blocks]),
+            media_type=wire.CONTENT_TYPE,
+        )
+    return Response(
+        b"[" + b",".join(block.as_json for block in blocks) + b"]",
+        media_type="application/json",
+    )
+
+
 ### SERVER OPERATIONS
 
 
@@ -135,7 +220,12 @@ async def mine(request: Request):
             return {"success": True, "message": "Successfully mined block!"}
         else:
             return {"success": False, "message": "Block not mined!"}
-    except (UnicodeDecodeError, json.JSONDecodeError, binascii.Error) as e:
+    except (
+        UnicodeDecodeError,
+        json.JSONDecodeError,
+        binascii.Error,
+        SudokuBoardException,
+    ) as e:
         logger.exception(e)
         return {"success": False, "error": "Invalid board"}
     except (BlockVerificationFailed, BlockOutOfChain) as e:
@@ -157,9 +247,35 @@ def generate_wallet():
     return {"private_key": str(wallet.private_key), "address": wallet.to_address()}
 
 
+@app.post("/chain/wallets")
+def generate_wallets(count: int):
+    if not 0 < count <= MAX_WALLETS_PER_REQUEST:
+        return {
+            "success": False,
+            "msg": f"count must be between 1 and {MAX_WALLETS_PER_REQUEST}",
+        }
+    wallets = Address.create_many(count)
+
+    # One JSON object per line, sent as soon as each key is derived
+    async def lines():
+        try:
+            async for wallet in iterate_in_threadpool(wallets):
+                yield json.dumps(
+                    {
+                        "private_key": str(wallet.private_key),
+                        "address": wallet.to_address(),
+                    }
+                ) + "\n"
+        finally:
+            # Also when the client goes away, so the pool doesn't derive keys nobody reads
+            wallets.close()
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+
 @app.get("/chain/wallet/address")
 def get_address(private_key: int):
-    wallet = Address(private_key)
+    wallet = Address.cached(private_key)
     return {"address": wallet.to_address()}
 
 
@@ -172,7 +288,7 @@ async def create_transaction(request: Request, background_tasks: BackgroundTasks
         data["address_to"],
         round(float(data["amount"]), 7),
     )
-    wallet = Address(private_key_from)
+    wallet = Address.cached(private_key_from)
     public_key_from = wallet.to_public_key().encode_b64()
     unspent_txs = bc.get_user_unspent_txs(wallet.to_address())
     total = 0
@@ -205,7 +321,9 @@ async def create_transaction(request: Request, background_tasks: BackgroundTasks
     else:
         if res:
             logger.info(f"Tx added to the stack")
-            background_tasks.add_task(broadcast, "/chain/tx_create", tx.as_dict, False)
+            background_tasks.add_task(
+                broadcast, "/chain/tx_create", tx.as_dict, False, None, wire.encode_tx
+            )
             return {"success": True}
         logger.info("Tx already in stack. Skipped.")
         return {"success": False, "msg": "Duplicate"}
@@ -261,35 +379,56 @@ async def status():
 
 
 @app.get("/chain/sync")
-async def sync(from_block: int, limit: int = 20):
+async def sync(request: Request, from_block: int, limit: int = 20):
+    bc = app.config["api"]
+    return blocks_response(request, bc.get_chain_blocks(from_block, limit))
+
+
+@app.get("/chain/headers")
+async def headers(from_block: int = Query(0, alias="from"), limit: int = 20):
     bc = app.config["api"]
-    return bc.get_chain(from_block, limit)
+    return bc.get_headers(from_block, limit)
+
+
+@app.get("/chain/tx_proof")
+async def tx_proof(tx_hash: str):
+    bc = app.config["api"]
+    proof = bc.get_tx_proof(tx_hash)
+    if proof is None:
+        raise HTTPException(status_code=404, detail="Transaction not found in chain")
+    return proof
 
 
 @app.get("/chain/head")
-async def head():
+async def head(request: Request):
     bc = app.config["api"]
-    return bc.get_head()
+    block = bc.get_head_block()
+    if block is None:
+        return {}
+    if wire.CONTENT_TYPE in request.headers.get("accept", ""):
+        return Response(wire.join_blocks([block.as_wire]), media_type=wire.CONTENT_TYPE)
+    return Response(block.as_json, media_type="application/json")
 
 
 @app.post("/chain/add_block")
-async def add_block(
-    block: BlockModel, background_tasks: BackgroundTasks, request: Request
-):
-    logger.info(f"New block arived: #{block.index} from {request.headers.get('node')}")
+async def add_block(background_tasks: BackgroundTasks, request: Request):
+    block = await read_body(request, wire.decode_block, BlockModel)
+    logger.info(
+        f"New block arived: #{block['index']} from {request.headers.get('node')}"
+    )
     if app.config["sync_running"]:
         logger.error(f"################### Not added, cause sync is running")
         return {"success": False, "msg": "Out of sync"}
     bc = app.config["api"]
     head = bc.get_head()
 
-    if (head["index"] + 1) < block.index:
+    if (head["index"] + 1) < block["index"]:
         app.config["sync_running"] = True
         background_tasks.add_task(sync_data)
         logger.error(f"################### Not added, cause node out of sync.")
         return {"success": False, "msg": "Out of sync"}
     try:
-        res = bc.add_block(block.dict())
+        res = bc.add_block(block)
         if res:
             restart_miner()
     except Exception as e:
@@ -301,9 +440,10 @@ async def add_block(
             background_tasks.add_task(
                 broadcast,
                 "/chain/add_block",
-                block.dict(),
+                block,
                 False,
                 request.headers.get("node"),
+                wire.encode_block,
             )
             return {"success": True}
         logger.info("Old block. Skipped.")
@@ -311,11 +451,12 @@ async def add_block(
 
 
 @app.post("/chain/tx_create")
-async def add_tx(tx: TxModel, background_tasks: BackgroundTasks, request: Request):
+async def add_tx(background_tasks: BackgroundTasks, request: Request):
+    tx = await read_body(request, wire.decode_tx, TxModel)
     logger.info(f"New Tx arived")
     bc = app.config["api"]
     try:
-        res = bc.add_tx(tx.dict())
+        res = bc.add_tx(tx)
     except Exception as e:
         logger.exception(e)
         return {"success": False, "msg": str(e)}
@@ -325,9 +466,10 @@ async def add_tx(tx: TxModel, background_tasks: BackgroundTasks, request: Reques
             background_tasks.add_task(
                 broadcast,
                 "/chain/tx_create",
-                tx.dict(),
+                tx,
                 False,
                 request.headers.get("node"),
+                wire.encode_tx,
             )
             return {"success": True}
         logger.info("Tx already in stack. Skipped.")
@@ -357,6 +499,8 @@ async def on_startup():
 async def on_shutdown():
     if app.jobs.get("mining"):
         app.jobs.get("mining").set()
+    Address.shutdown_pool()
+    app.config["db"].close()
 
 
 #### Utils ###########################
@@ -377,6 +521,7 @@ if __name__ == "__main__":
     logger.addHandler(handler)
 
     import argparse
+    import uvicorn
 
     parser = argparse.ArgumentParser(description="Blockchain full node.")
     parser.add_argument(
@@ -391,9 +536,23 @@ if __name__ == "__main__":
         "--mine", required=False, type=bool, help="Port on which run the node."
     )
     parser.add_argument("--diff", required=False, type=int, help="Difficulty")
+    parser.add_argument(
+        "--generator-table",
+        required=False,
+        type=str,
+        help="File to keep the precomputed key derivation table in.",
+    )
+    parser.add_argument(
+        "--data-dir",
+        required=False,
+        type=str,
+        help="Directory to keep the chain in. If not the chain is only kept in memory.",
+    )
 
     args = parser.parse_args()
-    _DB = DB()
+    if args.generator_table:
+        Address.load_generator_table(args.generator_table)
+    _DB = PersistentDB(args.data_dir) if args.data_dir else DB()
     _DB.config["difficulty"]
     _W = Address.create()
     _BC = Blockchain(_DB, _W)
@@ -1,4 +1,4 @@
-from typing import List
+from typing import List, Optional
 from pydantic import BaseModel, Field
 
 from blockchain.blocks import Tx, Block, Input, Output
@@ -29,7 +29,8 @@ class OutputModel(BaseModel):
     amount: int
     address: str
     index: int
-    input_hash: str
+    # Recomputed from the inputs of the tx, so the wire format leaves it out
+    input_hash: Optional[str] = None
 
     def to_output(self):
         return Output(self.address, self.amount, self.index, self.input_hash)
@@ -56,6 +57,7 @@ class BlockModel(BaseModel):
     puzzle_solution: str
     timestamp: int
     prev_hash: str
+    merkel_root: Optional[str] = None
     txs: List[TxModel]
 
     class Config:
@@ -0,0 +1,70 @@
+from blockchain.utils import LRUCache
+
+from .sudoku_board import SudokuBoard
+from .sudoku_gen import SudokuGenerator
+
+
+class PuzzleCache:
+    """
+    Bounded LRU cache of generated puzzles keyed by (difficulty, seed)
+
+    Generating a puzzle means building the solved board and hiding squares again, which the verifier,
+    to_puzzle and miners polling for the current block all used to do for the same block seed.
+    Returned boards are shared between callers and must not be mutated.
+
+    Attributes:
+        <int> maxsize: Maximum number of puzzles kept
+
+    @Properties:
+        <dict> stats: Hit/miss counters and current size
+
+    Public Methods:
+        <SudokuBoard> get_board(int difficulty, str seed): Gets the (cached) puzzle
+        <str> get_encoded(int difficulty, str seed): Gets the (cached) encoded puzzle
+        <void> resize(int maxsize): Changes the maximum number of cached puzzles
+        <void> clear(): Drops all cached puzzles and resets the counters
+    """
+
+    __instance = None
+
+    def __init__(self, maxsize: int = 256) -> None:
+        self._cache = LRUCache(maxsize)
+
+    @classmethod
+    def get_instance(cls) -> "PuzzleCache":
+        """Gets the process-wide cache"""
+        if cls.__instance is None:
+            cls.__instance = cls()
+        return cls.__instance
+
+    @property
+    def maxsize(self) -> int:
+        return self._cache.maxsize
+
+    @property
+    def stats(self) -> dict:
+        return self._cache.stats
+
+    def _get_entry(self, difficulty: int, seed: str) -> list:
+        key = (difficulty, seed)
+        entry = self._cache.get(key)
+        if entry is None:
+            # [board, encoded board]; the encoded form is only built once someone asks for it
+            entry = [SudokuGenerator(difficulty, seed).generate_board(), None]
+            self._cache.put(key, entry)
+        return entry
+
+    def get_board(self, difficulty: int, seed: str) -> SudokuBoard:
+        return self._get_entry(difficulty, seed)[0]
+
+    def get_encoded(self, difficulty: int, seed: str) -> str:
+        entry = self._get_entry(difficulty, seed)
+        if entry[1] is None:
+            entry[1] = entry[0].encode()
+        return entry[1]
+
+    def resize(self, maxsize: int) -> None:
+        self._cache.resize(maxsize)
+
+    def clear(self) -> None:
+        self._cache.clear()
@@ -0,0 +1,252 @@
+import random
+import time
+from array import array
+from typing import List, Tuple, Union
+
+from .sudoku_board import SudokuBoard
+
+
+class SudokuSolverException(Exception):
+    pass
+
+
+class SolverBudgetExceeded(SudokuSolverException):
+    pass
+
+
+class SudokuSolver:
+    """
+    Exact solver for nxn boards with the rectangular boxes given by SudokuBoard._get_box_size
+
+    Candidates are kept implicitly as bitsets: every row, column and box has a mask of the numbers already
+    placed in it, so the candidates of a cell are the numbers missing from all three masks. Naked singles
+    (cells with one candidate) and hidden singles (numbers with one possible cell in a row, column or box)
+    are filled in until nothing changes, then the empty cell with the fewest candidates is guessed and the
+    search backtracks on contradictions (restarting with a growing guess limit, see RESTART_NODES).
+
+    Attributes:
+        <int> max_nodes: Maximum number of guesses before giving up (None for no limit)
+        <float> timeout: Maximum number of seconds to search for (None for no limit)
+        <int> nodes: Number of guesses made by the last solve
+
+    Public Methods:
+        <SudokuBoard> solve(SudokuBoard | str puzzle): Solves a board, or a board encoded by SudokuBoard.encode
+    """
+
+    RESTART_NODES = 64
+
+    def __init__(self, max_nodes: int = None, timeout: float = None) -> None:
+        self.max_nodes = max_nodes
+        self.timeout = timeout
+        self.nodes = 0
+
+    def solve(self, puzzle: Union[SudokuBoard, str]) -> SudokuBoard:
+        board = SudokuBoard.decode(puzzle) if isinstance(puzzle, str) else puzzle
+        if not board.valid:
+            raise SudokuSolverException("Puzzle breaks the sudoku rules")
+        n = board.n
+        box_rows, box_cols = board._get_box_size()
+        boxes_per_row = n // box_cols
+        full = ((1 << n) - 1) << 1  # bit k set for every number k in 1..n
+        deadline = time.monotonic() + self.timeout if self.timeout else None
+        self.nodes = 0
+
+        grid = board.cells.tolist()
+        # Units are numbered rows first, then columns, then boxes
+        cell_units = [
+            (
+                i // n,
+                n + i % n,
+                2 * n + (i // n // box_rows) * boxes_per_row + i % n // box_cols,
+            )
+            for i in range(n * n)
+        ]
+        units: List[List[int]] = [[] for _ in range(3 * n)]
+        for i, (row, col, box) in enumerate(cell_units):
+            units[row].append(i)
+            units[col].append(i)
+            units[box].append(i)
+
+        used = [0] * (3 * n)  # Mask of the numbers placed in each unit
+        empty = set()
+        for i, number in enumerate(grid):
+            if number:
+                for unit in cell_units[i]:
+                    used[unit] |= 1 << number
+            else:
+                empty.add(i)
+
+        def candidates(i: int) -> int:
+            row, col, box = cell_units[i]
+            return full & ~(used[row] | used[col] | used[box])
+
+        def peers(i: int):
+            """Every other cell sharing a unit with i, each exactly once"""
+            row, col, box = cell_units[i]
+            yield from units[row]
+            yield from units[col]
+            for j in units[box]:
+                if cell_units[j][0] != row and cell_units[j][1] != col:
+                    yield j
+
+        # places[unit][k] is how many empty cells of the unit still have k as a candidate
+        places = [[0] * (n + 1) for _ in range(3 * n)]
+        for i in empty:
+            cand = candidates(i)
+            while cand:
+                bit = cand & -cand
+                cand ^= bit
+                for unit in cell_units[i]:
+                    places[unit][bit.bit_length() - 1] += 1
+
+        naked = list(empty)  # Cells to check for a single candidate
+        hidden = [  # (unit, number) pairs to check for a single place
+            (unit, k)
+            for unit in range(3 * n)
+            for k in range(1, n + 1)
+            if places[unit][k] <= 1 and not used[unit] >> k & 1
+        ]
+        # (cell, bit, its candidates, peers that lost bit) of every placed number, in order
+        trail = []
+
+        def place(i: int, bit: int) -> None:
+            k = bit.bit_length() - 1
+            cand = candidates(i)
+            losing = [j for j in peers(i) if not grid[j] and candidates(j) & bit]
+            grid[i] = k
+            empty.discard(i)
+            for unit in cell_units[i]:
+                used[unit] |= bit
+            trail.append((i, bit, cand, losing))
+
+            # The cell no longer offers any of its candidates, its peers no longer offer k
+            while cand:
+                other = cand & -cand
+                cand ^= other
+                other_k = other.bit_length() - 1
+                for unit in cell_units[i]:
+                    places[unit][other_k] -= 1
+                    if places[unit][other_k] <= 1:
+                        hidden.append((unit, other_k))
+            for j in losing:
+                naked.append(j)
+                for unit in cell_units[j]:
+                    places[unit][k] -= 1
+                    if places[unit][k] <= 1:
+                        hidden.append((unit, k))
+
+        def undo(trail_length: int) -> None:
+            while len(trail) > trail_length:
+                i, bit, cand, losing = trail.pop()
+                k = bit.bit_length() - 1
+                grid[i] = 0
+                empty.add(i)
+                for unit in cell_units[i]:
+                    used[unit] ^= bit
+                for j in losing:
+                    for unit in cell_units[j]:
+                        places[unit][k] += 1
+                while cand:
+                    other = cand & -cand
+                    cand ^= other
+                    for unit in cell_units[i]:
+                        places[unit][other.bit_length() - 1] += 1
+
+        def propagate() -> bool:
+            """Fills in naked and hidden singles, returns False on a contradiction"""
+            self._check_deadline(deadline)
+            while naked or hidden:
+                while naked:
+                    i = naked.pop()
+                    if grid[i]:
+                        continue
+                    cand = candidates(i)
+                    if not cand:
+                        return False
+                    if not cand & (cand - 1):
+                        place(i, cand)
+                while hidden:
+                    unit, k = hidden.pop()
+                    if used[unit] >> k & 1:
+                        continue
+                    if not places[unit][k]:
+                        return False  # k has nowhere left to go in this unit
+                    if places[unit][k] == 1:
+                        bit = 1 << k
+                        place(
+                            next(
+                                i
+                                for i in units[unit]
+                                if not grid[i] and candidates(i) & bit
+                            ),
+                            bit,
+                        )
+                        break  # Check the naked singles this created first
+            return True
+
+        rng = random.Random(board.seed)
+
+        def branch() -> Tuple[int, List[int]]:
+            """Picks an empty cell with the fewest candidates and returns them as bits, in random order"""
+            fewest, cells = n + 1, []
+            for i in empty:
+                count = bin(candidates(i)).count("1")
+                if count < fewest:
+                    fewest, cells = count, [i]
+                elif count == fewest:
+                    cells.append(i)
+            cell = rng.choice(cells)
+            cand, options = candidates(cell), []
+            while cand:
+                bit = cand & -cand
+                cand ^= bit
+                options.append(bit)
+            rng.shuffle(options)
+            return cell, options
+
+        # (trail length, cell, options, index of the option being tried) for every guess
+        stack = []
+        consistent = propagate()
+        forced = len(trail)
+        # Early wrong guesses on big, sparse boards are expensive to backtrack out of, so the search restarts
+        # from the forced cells with a doubled guess limit whenever it makes too many guesses. The limit keeps
+        # growing, so the search is still exhaustive.
+        restart_limit, restart_nodes = self.RESTART_NODES, 0
+        while True:
+            if consistent:
+                if not empty:
+                    break
+                stack.append((len(trail), *branch(), -1))
+
+            naked.clear()
+            hidden.clear()
+            if restart_nodes >= restart_limit:
+                stack.clear()
+                undo(forced)
+                restart_limit, restart_nodes = restart_limit * 2, 0
+                consistent = True
+                continue
+
+            # Try the next option of the most recent guess, backtracking as needed
+            while stack:
+                trail_length, cell, options, tried = stack.pop()
+                undo(trail_length)
+                if tried + 1 < len(options):
+                    break
+            else:
+                raise SudokuSolverException("Puzzle has no solution")
+            if self.max_nodes is not None and self.nodes >= self.max_nodes:
+                raise SolverBudgetExceeded(f"Gave up after {self.nodes} guesses")
+            self.nodes += 1
+            restart_nodes += 1
+            stack.append((trail_length, cell, options, tried + 1))
+            place(cell, options[tried + 1])
+            consistent = propagate()
+
+        return SudokuBoard(n, board.seed, cells=array(board.cells.typecode, grid))
+
+    def _check_deadline(self, deadline: float) -> None:
+        if deadline is not None and time.monotonic() > deadline:
+            raise SolverBudgetExceeded(
+                f"Gave up after {self.timeout}s and {self.nodes} guesses"
+            )
@@ -1,13 +1,102 @@
 import base64
 import json
 import random
-from typing import List, Tuple
+import struct
+from array import array
+from typing import Iterable, List, Tuple
 
 
 class SudokuBoardException(Exception):
     pass
 
 
+# Binary board format (v1), base64 encoded on the wire:
+#   header: version (u8), n (u32), box rows (u32), box cols (u32), seed length (u16)
+#   followed by the utf-8 seed and the n*n cells, row by row, bit-packed at n.bit_length() bits each
+ENCODING_VERSION = 1
+_HEADER = struct.Struct(">BIIIH")
+_MAX_SEED_LENGTH = 2**16 - 1
+_LEGACY_PREFIX = b"{"
+
+
+def _typecode(n: int) -> str:
+    """Smallest array typecode that fits numbers up to n"""
+    if n < 2**8:
+        return "B"
+    return "H" if n < 2**16 else "I"
+
+
+def _pack_cells(cells: Iterable[int], bits: int) -> bytes:
+    """Packs cells (each in [0, 2^bits)) MSB first into bytes, zero padding the last byte"""
+    if bits == 8:
+        try:
+            return bytes(iter(cells))
+        except ValueError as e:
+            raise SudokuBoardException("Cell value does not fit in 8 bits") from e
+    packed = bytearray()
+    limit = 1 << bits
+    acc, acc_bits = 0, 0
+    for cell in cells:
+        if not 0 <= cell < limit:
+            raise SudokuBoardException(f"Cell value {cell} does not fit in {bits} bits")
+        acc = (acc << bits) | cell
+        acc_bits += bits
+        while acc_bits >= 8:
+            acc_bits -= 8
+            packed.append((acc >> acc_bits) & 0xFF)
+        acc &= (1 << acc_bits) - 1
+    if acc_bits:
+        packed.append((acc << (8 - acc_bits)) & 0xFF)
+    return bytes(packed)
+
+
+def _unpack_cells(data: bytes, bits: int, count: int, typecode: str) -> array:
+    """Inverse of _pack_cells: reads count cells of the given bit width into a flat array"""
+    if len(data) != (count * bits + 7) // 8:
+        raise SudokuBoardException("Encoded board has the wrong number of cells")
+    if bits == 8:
+        return array(typecode, iter(data))
+    cells = array(typecode)
+    mask = (1 << bits) - 1
+    acc, acc_bits = 0, 0
+    for byte in data:
+        acc = (acc << 8) | byte
+        acc_bits += 8
+        while acc_bits >= bits:
+            acc_bits -= bits
+            cells.append((acc >> acc_bits) & mask)
+        acc &= (1 << acc_bits) - 1
+    del cells[count:]
+    return cells
+
+
+class _Row(list):
+    """
+    Row of a SudokuBoard: a plain list of its numbers, whose item writes go through to the board's cells
+    """
+
+    __slots__ = "_cells", "_offset"
+
+    def __init__(self, cells: array, offset: int, n: int) -> None:
+        super().__init__(cells[offset : offset + n])
+        self._cells = cells
+        self._offset = offset
+
+    def __setitem__(self, index, value) -> None:
+        n = len(self)
+        super().__setitem__(index, value)
+        if len(self) != n:
+            raise SudokuBoardException("Board rows can't change size")
+        try:
+            self._cells[self._offset : self._offset + n] = array(
+                self._cells.typecode, self
+            )
+        except (TypeError, OverflowError) as e:
+            raise SudokuBoardException(
+                "Board cells must be non-negative integers"
+            ) from e
+
+
 class SudokuBoard:
     """
     Simple nxn sudoku board:
@@ -15,39 +104,101 @@ class SudokuBoard:
     Attributes:
         <int> n: Size of board
         <string> seed: Seed to generate the puzzle with
-        <List<List<int>>> board: 2D list of integers representing the board (None by default)
+        <array> cells: Flat array of the n*n cells, row by row (0 for hidden squares)
 
     @Properties:
+        <List<List<int>>> board: Rows of the board, built from cells on every access (writes to a row's items
+            go through to cells, use cells directly where speed matters)
         <bool> solved: True if the board is solved, False otherwise
         <bool> valid: True if the board is valid, False otherwise
 
     Public Methods:
         <void> hide_squares(int n): Hides n squares randomly from the board.
-        <str> encode(): Encodes the board in base64
-        <SudokuBoard> decode(str encoded_board): Decodes the board from base64
+        <str> encode(): Encodes the board in the compact binary format (base64)
+        <SudokuBoard> decode(str encoded_board): Decodes the board from base64 (binary or legacy JSON format)
         <bool> is_valid_solution(SudokuBoard other): Checks if the other board is a valid solution to this board
     """
 
-    def __init__(self, n: int, seed: str, board: List[List[int]] = None) -> None:
+    __slots__ = "n", "seed", "cells", "_box_size"
+
+    def __init__(
+        self,
+        n: int,
+        seed: str,
+        board: List[List[int]] = None,
+        cells: array = None,
+    ) -> None:
         self.n = n
         self.seed = seed
-        self.board = board
-        if not self.board:
+        self._box_size = None
+        if cells is not None:
+            self.cells = cells
+        elif board:
+            self.board = board
+        else:
             self._generate_solved_board()
 
+    def __reduce__(self):
+        return self.__class__, (self.n, self.seed, None, self.cells)
+
+    @property
+    def board(self) -> List[List[int]]:
+        n = self.n
+        return [_Row(self.cells, i, n) for i in range(0, len(self.cells), n)]
+
+    @board.setter
+    def board(self, board: List[List[int]]) -> None:
+        try:
+            if len(board) != self.n or any(len(row) != self.n for row in board):
+                raise SudokuBoardException(
+                    f"Board must have {self.n} rows of {self.n} cells"
+                )
+            self.cells = array(
+                _typecode(self.n), [number for row in board for number in row]
+            )
+        except (TypeError, OverflowError) as e:
+            raise SudokuBoardException(
+                "Board cells must be non-negative integers"
+            ) from e
+
     @property
     def valid(self) -> bool:
-        """Returns True if the board is valid, False otherwise"""
-        for row in range(self.n):
-            for col in range(self.n):
-                if not self._is_valid_location(row, col, self.board[row][col]):
+        """
+        Returns True if the board is valid, False otherwise
+
+        Every row, column and box is scanned once, keeping a bitmask of the numbers seen in each of them
+        (bit k set means k was already placed), so checking a board is O(n^2) rather than calling
+        _is_valid_location for every cell.
+        """
+        n = self.n
+        cells = self.cells
+        if len(cells) != n * n:
+            return False
+        box_rows, box_cols = self._get_box_size()
+        boxes_per_row = n // box_cols
+        col_masks = [0] * n
+        box_masks = [0] * n
+        for row_no in range(n):
+            row_mask = 0
+            box_offset = (row_no // box_rows) * boxes_per_row
+            for col_no, number in enumerate(cells[row_no * n : (row_no + 1) * n]):
+                if number == 0:
+                    continue
+                if number > n:
                     return False
+                bit = 1 << number
+                box_no = box_offset + col_no // box_cols
+                if (row_mask | col_masks[col_no] | box_masks[box_no]) & bit:
+                    return False
+                row_mask |= bit
+                col_masks[col_no] |= bit
+                box_masks[box_no] |= bit
         return True
 
     @property
     def solved(self) -> bool:
         """Returns True if the board is solved, False otherwise"""
-        return self.valid and all(0 not in row for row in self.board)
+        return self.valid and 0 not in self.cells
 
     def __str__(self):
         pretty_board = "\n".join(
@@ -57,15 +208,16 @@ class SudokuBoard:
 
     def _get_box_size(self) -> Tuple[int, int]:
         """Gets the dimensions of one sudoku box (i.e. if n=9, this returns (3, 3); if n=8 it's (2, 4))"""
+        if self._box_size is not None:
+            return self._box_size
 
         possible_factors = [
-            (i, self.n // i)
-            for i in range(1, int(self.n**0.5) + 1)
-            if self.n % i == 0
+            (i, self.n // i) for i in range(1, int(self.n**0.5) + 1) if self.n % i == 0
         ]
         sqrt_n = self.n**0.5
         # Find the tuple where the first element is closest (and lower) to sqrt_n
-        return min(possible_factors, key=lambda x: abs(x[0] - sqrt_n))
+        self._box_size = min(possible_factors, key=lambda x: abs(x[0] - sqrt_n))
+        return self._box_size
 
     def _is_valid_location(self, row: int, col: int, number: int) -> bool:
         """Checks if the location is valid"""
@@ -74,13 +226,15 @@ class SudokuBoard:
 
         if not 1 <= number <= self.n:
             return False
+        n = self.n
+        cells = self.cells
         # Check row
-        for i in range(self.n):
-            if self.board[row][i] == number and i != col:
+        for i in range(n):
+            if cells[row * n + i] == number and i != col:
                 return False
         # Check column
-        for i in range(self.n):
-            if self.board[i][col] == number and i != row:
+        for i in range(n):
+            if cells[i * n + col] == number and i != row:
                 return False
 
         # Check box
@@ -90,7 +244,7 @@ class SudokuBoard:
         top_left_x, top_left_y = box_horiz_no * box_size[0], box_vert_no * box_size[1]
         for i in range(top_left_x, top_left_x + box_size[0]):
             for j in range(top_left_y, top_left_y + box_size[1]):
-                if (i, j) != (row, col) and self.board[i][j] == number:
+                if (i, j) != (row, col) and cells[i * n + j] == number:
                     return False
         return True
 
@@ -101,14 +255,16 @@ class SudokuBoard:
         Stolen from Stackoverflow.
         """
         r_base, c_base = self._get_box_size()
-        random.seed(self.seed)
+        # A private generator seeded the same way as the module one used to be, so boards stay identical
+        # without other threads reseeding it halfway through
+        rng = random.Random(self.seed)
 
         def pattern(row: int, col: int) -> int:
             """Returns the pattern for the given row and column"""
             return (c_base * (row % r_base) + row // r_base + col) % self.n
 
         def shuffle(s):
-            return random.sample(s, len(s))
+            return rng.sample(s, len(s))
 
         row_range = range(r_base)
         col_range = range(c_base)
@@ -116,43 +272,64 @@ class SudokuBoard:
         cols = [g * c_base + c for g in shuffle(row_range) for c in shuffle(col_range)]
         nums = shuffle(range(1, self.n + 1))
 
-        self.board = [[nums[pattern(r, c)] for c in cols] for r in rows]
+        self.cells = array(
+            _typecode(self.n), [nums[pattern(r, c)] for r in rows for c in cols]
+        )
 
     def hide_squares(self, n: int) -> None:
-        random.seed(self.seed)
+        rng = random.Random(self.seed)
         if self.n**2 < n:
             raise SudokuBoardException("Cannot hide more squares than are available")
         indices_to_hide = list(range(self.n**2))
-        random.shuffle(indices_to_hide)
+        rng.shuffle(indices_to_hide)
+        cells = self.cells
         for i in range(n):
-            index = indices_to_hide[i]
-            row = index // self.n
-            col = index % self.n
-            self.board[row][col] = 0
+            cells[indices_to_hide[i]] = 0
 
     def encode(self) -> str:
-        json_board = {
-            "n": self.n,
-            "seed": self.seed,
-            "board": self.board,
-            "box_size": self._get_box_size(),
-        }
-        return base64.b64encode(json.dumps(json_board).encode()).decode()
+        """Encodes the board in the versioned binary format, see ENCODING_VERSION"""
+        box_rows, box_cols = self._get_box_size()
+        seed = str(self.seed).encode()
+        if len(seed) > _MAX_SEED_LENGTH:
+            raise SudokuBoardException(
+                f"Seed is too long to encode ({len(seed)} > {_MAX_SEED_LENGTH} bytes)"
+            )
+        header = _HEADER.pack(ENCODING_VERSION, self.n, box_rows, box_cols, len(seed))
+        cells = _pack_cells(self.cells, self.n.bit_length())
+        return base64.b64encode(header + seed + cells).decode()
 
     def is_valid_solution(self, other: "SudokuBoard") -> bool:
         """Checks if the other board is a valid solution to this board"""
-        if not other.solved:
+        if other.n != self.n or not other.solved:
             return False
-        for row in range(self.n):
-            for col in range(self.n):
-                if (
-                    self.board[row][col] != 0
-                    and self.board[row][col] != other.board[row][col]
-                ):
-                    return False
+        for number, other_number in zip(self.cells, other.cells):
+            if number != 0 and number != other_number:
+                return False
         return True
 
     @classmethod
     def decode(cls, encoded_board: str) -> "SudokuBoard":
-        json_board = json.loads(base64.b64decode(encoded_board).decode())
-        return cls(json_board["n"], json_board["seed"], json_board["board"])
+        data = base64.b64decode(encoded_board)
+        if data[:1] == _LEGACY_PREFIX:
+            # Boards encoded before the binary format were base64'd JSON
+            json_board = json.loads(data.decode())
+            return cls(json_board["n"], json_board["seed"], json_board["board"])
+
+        if len(data) < _HEADER.size:
+            raise SudokuBoardException("Encoded board is too short")
+        version, n, box_rows, box_cols, seed_length = _HEADER.unpack_from(data)
+        if version != ENCODING_VERSION:
+            raise SudokuBoardException(f"Unknown board encoding version {version}")
+        seed_end = _HEADER.size + seed_length
+        seed = data[_HEADER.size : seed_end].decode()
+
+        if n == 0:
+            raise SudokuBoardException("Encoded board is empty")
+        inst = cls(
+            n,
+            seed,
+            cells=_unpack_cells(data[seed_end:], n.bit_length(), n * n, _typecode(n)),
+        )
+        if (box_rows, box_cols) != inst._get_box_size():
+            raise SudokuBoardException("Encoded box size does not match board size")
+        return inst
@@ -1,10 +1,12 @@
 import base64
 import math
-import random
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Iterable, List, Tuple
 
 from blockchain.utils import CompositeNumbers
 
-from .sudoku_board import SudokuBoard
+from .sudoku_board import SudokuBoard, SudokuBoardException
 
 
 class SudokuGenerator:
@@ -19,6 +21,8 @@ class SudokuGenerator:
         <SudokuBoard> generate_puzzle: Generates the sudoku puzzle
         <str> encode(): Encodes self in base64
         <SudokuGenerator> decode(str): Decodes self from base64
+        <List<SudokuBoard>> generate_many(specs): Generates the puzzles for many (difficulty, seed) pairs
+        <List<bool>> verify_many(items): Checks many (difficulty, seed, encoded solution) triples
     """
 
     def __init__(self, difficulty: int, seed: str) -> None:
@@ -61,3 +65,47 @@ class SudokuGenerator:
     def decode(cls, encoded: str) -> "SudokuGenerator":
         difficulty, seed = base64.b64decode(encoded).decode().split(":")
         return cls(int(difficulty), seed)
+
+    @classmethod
+    def generate_many(
+        cls, specs: Iterable[Tuple[int, str]], max_workers: int = None
+    ) -> List[SudokuBoard]:
+        """
+        Generates the puzzles for many (difficulty, seed) pairs, in order, across a pool of processes.
+        Pass max_workers=1 to generate them in this process.
+        """
+        return _map(_generate, list(specs), max_workers)
+
+    @classmethod
+    def verify_many(
+        cls, items: Iterable[Tuple[int, str, str]], max_workers: int = None
+    ) -> List[bool]:
+        """
+        Checks many (difficulty, seed, encoded solution) triples across a pool of processes, returning
+        whether each solution solves the puzzle for its difficulty and seed.
+        """
+        return _map(_verify, list(items), max_workers)
+
+
+def _generate(spec: Tuple[int, str]) -> SudokuBoard:
+    difficulty, seed = spec
+    return SudokuGenerator(difficulty, seed).generate_board()
+
+
+def _verify(item: Tuple[int, str, str]) -> bool:
+    difficulty, seed, solution = item
+    try:
+        solution = SudokuBoard.decode(solution)
+    except (ValueError, KeyError, TypeError, SudokuBoardException):
+        return False
+    return _generate((difficulty, seed)).is_valid_solution(solution)
+
+
+def _map(function, items: list, max_workers: int = None) -> list:
+    if max_workers == 1 or len(items) < 2:
+        return [function(item) for item in items]
+    workers = max_workers or os.cpu_count() or 1
+    with ProcessPoolExecutor(workers) as executor:
+        return list(
+            executor.map(function, items, chunksize=max(1, len(items) // (4 * workers)))
+        )
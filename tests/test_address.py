@@ -0,0 +1,121 @@
+from unittest import TestCase
+
+from blockchain.wallet.address import Address
+
+
+class TestAddress(TestCase):
+    @classmethod
+    def tearDownClass(cls):
+        Address.shutdown_pool()
+
+    def test_derived_keys(self):
+        wallet = Address(12345)
+        self.assertEqual(wallet.to_public_key(), Address.GENERATOR * 12345)
+        self.assertIs(wallet.to_public_key(), wallet.to_public_key())
+        self.assertEqual(wallet.to_address(), (Address.GENERATOR * 12345).to_address())
+
+        signature = wallet.sign(b"message")
+        self.assertTrue(Address.verify(b"message", signature, wallet.to_public_key()))
+        self.assertFalse(Address.verify(b"other", signature, wallet.to_public_key()))
+
+    def test_changing_private_key(self):
+        wallet = Address(12345)
+        address = wallet.to_address()
+        wallet.sign(b"message")
+        wallet.private_key = 54321
+        self.assertNotEqual(wallet.to_address(), address)
+        self.assertEqual(wallet.to_public_key(), Address.GENERATOR * 54321)
+        signature = wallet.sign(b"message")
+        self.assertTrue(Address.verify(b"message", signature, wallet.to_public_key()))
+
+    def test_cached(self):
+        wallet = Address.cached(777)
+        self.assertIs(Address.cached(777), wallet)
+        self.assertIsNot(Address.cached(778), wallet)
+        self.assertEqual(wallet.to_address(), Address(777).to_address())
+
+        # Shared instances can't be changed under the other users
+        with self.assertRaises(AttributeError):
+            wallet.private_key = 778
+        self.assertEqual(Address.cached(777).private_key, 777)
+        self.assertEqual(Address.cached(777).to_address(), Address(777).to_address())
+        other = Address(777)
+        other.private_key = 778
+        self.assertEqual(other.to_address(), Address(778).to_address())
+
+    def test_verify_cache(self):
+        wallet = Address(4242)
+        signature = wallet.sign(b"cached")
+        self.assertTrue(Address.verify(b"cached", signature, wallet.to_public_key()))
+        hits = Address._verified_signatures.hits
+        self.assertTrue(Address.verify(b"cached", signature, wallet.to_public_key()))
+        self.assertEqual(Address._verified_signatures.hits, hits + 1)
+
+        # Failures aren't remembered, and a remembered signature doesn't vouch for other messages or keys
+        self.assertFalse(Address.verify(b"other", signature, wallet.to_public_key()))
+        self.assertFalse(Address.verify(b"other", signature, wallet.to_public_key()))
+        self.assertFalse(
+            Address.verify(b"cached", signature, Address(4243).to_public_key())
+        )
+
+    def test_verify_many(self):
+        wallets = [Address(1000 + i) for i in range(Address.PARALLEL_VERIFY_MIN + 4)]
+        items = [
+            (str(i).encode(), wallet.sign(str(i).encode()), wallet.to_public_key())
+            for i, wallet in enumerate(wallets)
+        ]
+        self.assertTrue(Address.verify_many([], max_workers=2))
+        self.assertTrue(Address.verify_many(items, max_workers=2))
+        self.assertTrue(Address.verify_many(items, max_workers=1))
+
+        forged = (b"forged", items[0][1], items[0][2])
+        for max_workers in (1, 2):
+            Address._verified_signatures.clear()
+            self.assertFalse(
+                Address.verify_many(items[1:] + [forged], max_workers=max_workers)
+            )
+        self.assertFalse(Address.verify(*forged))
+
+    def test_shared_pool(self):
+        wallets = [Address(2000 + i) for i in range(Address.PARALLEL_VERIFY_MIN)]
+        items = [
+            (b"pool", wallet.sign(b"pool"), wallet.to_public_key())
+            for wallet in wallets
+        ]
+        self.assertTrue(Address.verify_many(items[:-1] + [items[0]]))
+        pool = Address.pool()
+        Address._verified_signatures.clear()
+        self.assertTrue(Address.verify_many(items))
+        self.assertIs(Address.pool(), pool)
+
+        Address.shutdown_pool()
+        self.assertIsNone(Address._pool)
+        Address._verified_signatures.clear()
+        self.assertTrue(Address.verify_many(items))
+        self.assertIsNot(Address.pool(), pool)
+
+    def test_derive_addresses(self):
+        private_keys = [5, 6, 7, 8]
+        expected = [Address(key).to_address() for key in private_keys]
+        for max_workers in (1, 2):
+            self.assertEqual(
+                list(Address.derive_addresses(private_keys, max_workers)), expected
+            )
+
+        wallets = list(Address.create_many(3, max_workers=2))
+        self.assertEqual(len({wallet.private_key for wallet in wallets}), 3)
+        for wallet in wallets:
+            self.assertEqual(
+                wallet.to_address(), Address(wallet.private_key).to_address()
+            )
+
+    def test_closing_derivation(self):
+        wallets = Address.create_many(2000)
+        wallet = next(wallets)
+        self.assertEqual(wallet.to_address(), Address(wallet.private_key).to_address())
+        pool = Address.pool()
+        wallets.close()
+        # The chunks left are cancelled, and the shared pool keeps working
+        self.assertIs(Address.pool(), pool)
+        expected = [Address(key).to_address() for key in (5, 6)]
+        self.assertEqual(list(Address.derive_addresses([5, 6])), expected)
@@ -0,0 +1,63 @@
+from unittest import TestCase
+
+from blockchain.block_tree import BlockTree
+from blockchain.blocks import Block
+
+
+def make_block(index, prev_hash) -> Block:
+    return Block([], index, prev_hash, 1600000000, merkel_root="00" * 32)
+
+
+class TestBlockTree(TestCase):
+    def test_branches(self):
+        tree = BlockTree()
+        a1 = make_block(1, "root")
+        a2 = make_block(2, a1.hash())
+        b2 = make_block(2, a1.hash())
+        b2.timestamp += 1
+        b3 = make_block(3, b2.hash())
+        for block in (a1, a2, b2, b3):
+            tree.add(block)
+
+        self.assertIn(b2.hash(), tree)
+        self.assertIs(tree.best_tip(), b3)
+        self.assertEqual(tree.branch(b3.hash()), [a1, b2, b3])
+        tree.discard(a1.hash())
+        self.assertEqual(tree.branch(b3.hash()), [b2, b3])
+
+        tree.remove(b2.hash())
+        self.assertEqual(list(tree.blocks.values()), [a2])
+        tree.prune(3)
+        self.assertEqual(len(tree), 0)
+        self.assertIsNone(tree.best_tip())
+
+    def test_max_blocks(self):
+        tree = BlockTree(max_blocks=2)
+        a1 = make_block(1, "root")
+        a2 = make_block(2, a1.hash())
+        a3 = make_block(3, a2.hash())
+        self.assertTrue(tree.add(a1))
+        self.assertTrue(tree.add(a2))
+        self.assertFalse(tree.add(a3))
+        self.assertNotIn(a3.hash(), tree)
+        tree.discard(a1.hash())
+        self.assertTrue(tree.add(a3))
+
+    def test_orphans(self):
+        tree = BlockTree(max_orphans=2)
+        a1 = make_block(1, "root")
+        a2 = make_block(2, a1.hash())
+        tree.add_orphan(make_block(5, "unknown"))
+        tree.add_orphan(a2)
+        tree.add_orphan(make_block(7, "unknown"))
+        # The oldest orphan was dropped
+        self.assertEqual(len(tree.orphans), 2)
+        self.assertIn(a2.hash(), tree)
+        self.assertEqual(tree.adopt(a1), [a2])
+        self.assertNotIn(a2.hash(), tree)
+        self.assertEqual(tree.adopt(a1), [])
+
+        # Orphans claiming the wrong height are dropped
+        tree.add_orphan(make_block(4, a1.hash()))
+        self.assertEqual(tree.adopt(a1), [])
+        self.assertEqual(len(tree.orphans), 1)
@@ -0,0 +1,315 @@
+from unittest import TestCase
+from unittest.mock import patch
+
+from blockchain.blockchain import Blockchain
+from blockchain.blocks import Block, Input, Output, Tx
+from blockchain.db import DB
+from blockchain.verifiers import BlockOutOfChain, BlockVerifier
+from blockchain.wallet.address import Address
+from sudoku.sudoku_board import SudokuBoard
+from sudoku.sudoku_gen import SudokuGenerator
+
+
+class TestRollback(TestCase):
+    def setUp(self):
+        self.wallet = Address.create()
+        self.other = Address.create()
+        self.bc = Blockchain(DB(), self.wallet)
+
+    def add_block(self, txs=()):
+        block = self.bc.force_block()
+        block.txs = block.txs + list(txs)
+        self.bc.chain.append(block)
+        self.bc.db.increment_difficulty()
+        self.bc.rollover_block(block)
+        return block
+
+    def spend(self, prev_tx_hash, output_index, amount, change):
+        inp = Input(
+            prev_tx_hash, output_index, self.wallet.to_public_key().encode_b64(), 0
+        )
+        inp.sign(self.wallet)
+        return Tx(
+            [inp],
+            [
+                Output(self.other.to_address(), amount, 0),
+                Output(self.wallet.to_address(), change, 1),
+            ],
+        )
+
+    def state(self):
+        db = self.bc.db
+        return (
+            db.utxos.by_address(self.wallet.to_address()),
+            db.utxos.by_address(self.other.to_address()),
+            db.config["difficulty"],
+            db.block_index,
+        )
+
+    def test_rollback_blocks(self):
+        self.add_block()
+        before = self.state()
+
+        coinbase = self.bc.head.txs[0]
+        first = self.spend(coinbase.hash, 0, 10, 14)
+        # Spends an output created in the same block
+        second = self.spend(first.hash, 1, 4, 8)
+        block = self.add_block([first, second])
+        self.add_block()
+        self.assertEqual(self.bc.db.utxos.balance(self.other.to_address()), 14)
+
+        self.bc.rollback_blocks(2)
+        self.assertEqual(self.state(), before)
+        self.assertEqual(len(self.bc.chain), 1)
+        # The coinbase isn't a tx to mine again, nor is a tx spending the outputs of the rolled back block
+        self.assertEqual(list(self.bc.mempool), [first.hash])
+        self.assertEqual(self.bc.mempool.fee(first.hash), 1)
+        self.assertNotIn(block.txs[0].hash, self.bc.db.transaction_by_hash)
+        self.assertNotIn(second.hash, self.bc.db.transaction_by_hash)
+        self.assertNotIn(first.hash, self.bc.db.block_index_by_tx_hash)
+        self.assertFalse(self.bc.add_tx(self.spend(coinbase.hash, 0, 5, 19)))
+
+    def test_rollback_child_in_later_block(self):
+        self.add_block()
+        before = self.state()
+        first = self.spend(self.bc.head.txs[0].hash, 0, 10, 14)
+        self.add_block([first])
+        # Spends an output of the block before
+        second = self.spend(first.hash, 1, 4, 8)
+        self.add_block([second])
+
+        self.bc.rollback_blocks(2)
+        self.assertEqual(self.state(), before)
+        # The child went back to the pool first, then the outputs it spends went away
+        self.assertEqual(list(self.bc.mempool), [first.hash])
+
+    def test_rollover_unknown_tx(self):
+        self.add_block()
+        tx = self.spend(self.bc.head.txs[0].hash, 0, 10, 15)
+        # The tx came in a block from another node, it was never in this node's stack
+        self.add_block([tx])
+        self.assertEqual(self.bc.db.block_index_by_tx_hash[tx.hash], 1)
+
+
+class TestForks(TestCase):
+    def setUp(self):
+        self.wallet_a = Address.create()
+        self.wallet_b = Address.create()
+        self.a = Blockchain(DB(), self.wallet_a)
+        self.b = Blockchain(DB(), self.wallet_b)
+        for _ in range(2):
+            self.b.add_block(self.copy(self.mine(self.a)))
+
+    @staticmethod
+    def copy(block):
+        return Block.from_dict(block.as_dict)
+
+    @staticmethod
+    def mine(bc):
+        block = bc.force_block()
+        n = SudokuGenerator(bc.db.config["difficulty"], block.seed).n
+        block.puzzle_solution = SudokuBoard(n, block.seed).encode()
+        assert bc.add_block(TestForks.copy(block))
+        return block
+
+    def pay(self, bc, wallet, amount):
+        utxo = bc.db.utxos.by_address(wallet.to_address())[0]
+        inp = Input(utxo[0], utxo[1], wallet.to_public_key().encode_b64(), 0)
+        inp.sign(wallet)
+        tx = Tx([inp], [Output(wallet.to_address(), amount, 0)])
+        assert bc.add_tx(tx)
+        return tx
+
+    def state(self, bc):
+        return (
+            [b.hash() for b in bc.chain],
+            sorted(bc.db.utxos.by_address(self.wallet_a.to_address())),
+            sorted(bc.db.utxos.by_address(self.wallet_b.to_address())),
+            bc.db.config["difficulty"],
+        )
+
+    def test_reorganize(self):
+        tx = self.pay(self.a, self.wallet_a, 20)
+        a3 = self.mine(self.a)
+        self.assertEqual(a3.txs[1].hash, tx.hash)
+        b_blocks = [self.mine(self.b) for _ in range(3)]
+
+        self.assertFalse(self.a.add_block(self.copy(b_blocks[0])))
+        self.assertEqual(self.a.head.hash(), a3.hash())
+        self.assertTrue(self.a.add_block(self.copy(b_blocks[1])))
+        self.assertEqual(self.a.head.hash(), b_blocks[1].hash())
+        # The block of the old branch is kept, its tx waits for a block again
+        self.assertIn(a3.hash(), self.a.tree)
+        self.assertEqual(list(self.a.mempool), [tx.hash])
+        self.assertEqual(self.a.mempool.fee(tx.hash), 5)
+
+        self.assertTrue(self.a.add_block(self.copy(b_blocks[2])))
+        self.assertEqual(self.state(self.a), self.state(self.b))
+        self.assertFalse(self.a.add_block(self.copy(b_blocks[2])))
+
+    def test_orphans(self):
+        b_blocks = [self.mine(self.b) for _ in range(3)]
+        self.assertFalse(self.a.add_block(self.copy(b_blocks[2])))
+        self.assertFalse(self.a.add_block(self.copy(b_blocks[1])))
+        self.assertEqual(len(self.a.chain), 2)
+        self.assertTrue(self.a.add_block(self.copy(b_blocks[0])))
+        self.assertEqual(self.state(self.a), self.state(self.b))
+        self.assertEqual(len(self.a.tree.orphans), 0)
+
+    def test_invalid_branch(self):
+        a3 = self.mine(self.a)
+        before = self.state(self.a)
+        b3, b4 = self.mine(self.b), self.mine(self.b)
+        bad = dict(b4.as_dict)
+        bad["puzzle_solution"] = b3.puzzle_solution
+
+        self.assertFalse(self.a.add_block(self.copy(b3)))
+        self.assertFalse(self.a.add_block(Block.from_dict(bad)))
+        self.assertEqual(self.state(self.a), before)
+        self.assertEqual(self.a.head.hash(), a3.hash())
+        self.assertEqual(list(self.a.tree.blocks), [b3.hash()])
+        # The valid block of the branch is still there for a better one to build on
+        self.assertTrue(self.a.add_block(self.copy(b4)))
+        self.assertEqual(self.state(self.a), self.state(self.b))
+
+    def test_invalid_branch_restores_mempool(self):
+        self.mine(self.a)
+        tx = self.pay(self.a, self.wallet_a, 20)
+        # Spends the same output
+        conflict = self.pay(self.b, self.wallet_a, 15)
+        b3 = self.mine(self.b)
+        self.assertEqual(b3.txs[1].hash, conflict.hash)
+        # Solved, but pays itself too much
+        b4 = self.b.force_block()
+        b4.txs[0].outputs[0].amount += 1
+        b4.merkel_root = None
+        b4.build_merkel_tree()
+        n = SudokuGenerator(self.b.db.config["difficulty"], b4.seed).n
+        b4.puzzle_solution = SudokuBoard(n, b4.seed).encode()
+        before = self.state(self.a)
+
+        self.assertFalse(self.a.add_block(self.copy(b3)))
+        self.assertFalse(self.a.add_block(self.copy(b4)))
+        self.assertEqual(self.state(self.a), before)
+        self.assertEqual(list(self.a.mempool), [tx.hash])
+        self.assertEqual(self.a.mempool.fee(tx.hash), 5)
+
+    def test_side_blocks_checked(self):
+        self.mine(self.a)
+        b3, b4 = self.mine(self.b), self.mine(self.b)
+        wrong_solution = dict(b3.as_dict)
+        wrong_solution["puzzle_solution"] = b4.puzzle_solution
+        wrong_txs = dict(b3.as_dict)
+        wrong_txs["txs"] = [dict(b3.as_dict["txs"][0], timestamp=1)]
+        junk = dict(b4.as_dict)
+        junk["puzzle_solution"] = "junk"
+
+        for block in (wrong_solution, wrong_txs, junk):
+            self.assertFalse(self.a.add_block(Block.from_dict(block)))
+        self.assertEqual(len(self.a.tree), 0)
+        self.assertEqual(len(self.a.tree.orphans), 0)
+
+        # Blocks are checked at the difficulty of their height, ahead of the head too
+        self.assertFalse(self.a.add_block(self.copy(b4)))
+        self.assertEqual(list(self.a.tree.orphans), [b4.hash()])
+        self.assertTrue(self.a.add_block(self.copy(b3)))
+        self.assertEqual(self.state(self.a), self.state(self.b))
+
+    def test_side_blocks_capped(self):
+        c = Blockchain(DB(), Address.create())
+        for block in self.a.chain:
+            c.add_block(self.copy(block))
+        self.a.tree.max_blocks = 1
+        self.mine(self.a)
+        b3, c3 = self.mine(self.b), self.mine(c)
+
+        self.assertFalse(self.a.add_block(self.copy(b3)))
+        self.assertFalse(self.a.add_block(self.copy(c3)))
+        self.assertEqual(list(self.a.tree.blocks), [b3.hash()])
+
+    def test_orphan_at_wrong_height(self):
+        # The same puzzle at every height, so only the height check can stop the block
+        self.a.db.config["difficulty_step"] = 0
+        c = Blockchain(DB(), Address.create())
+        c.db.config["difficulty_step"] = 0
+        c.add_block(self.copy(self.a.chain[0]))
+        c1 = self.mine(c)
+        # Built on c1 but claims a height two above it
+        skip = Block([c.create_coinbase_tx()], c1.index + 2, c1.hash())
+        skip.build_merkel_tree()
+        n = SudokuGenerator(self.a.difficulty_at(skip.index), skip.seed).n
+        skip.puzzle_solution = SudokuBoard(n, skip.seed).encode()
+        before = self.state(self.a)
+
+        self.assertFalse(self.a.add_block(self.copy(skip)))
+        self.assertIn(skip.hash(), self.a.tree.orphans)
+        self.assertFalse(self.a.add_block(self.copy(c1)))
+        self.assertNotIn(skip.hash(), self.a.tree)
+        self.assertEqual(self.state(self.a), before)
+        # The chain still takes the next honest block
+        self.mine(self.a)
+
+    def test_verify_index(self):
+        block = self.a.force_block()
+        block.index += 1
+        n = SudokuGenerator(self.a.db.config["difficulty"], block.seed).n
+        block.puzzle_solution = SudokuBoard(n, block.seed).encode()
+        with self.assertRaises(BlockOutOfChain):
+            BlockVerifier(self.a.db).verify(self.a.head, block)
+
+    def spending(self, bc, wallet, amount, inputs=1):
+        utxo = bc.db.utxos.by_address(wallet.to_address())[0]
+        inps = []
+        for index in range(inputs):
+            inp = Input(utxo[0], utxo[1], wallet.to_public_key().encode_b64(), index)
+            inp.sign(wallet)
+            inps.append(inp)
+        return Tx(inps, [Output(wallet.to_address(), amount, 0)])
+
+    def double_spend_block(self, bc):
+        first = self.spending(bc, self.wallet_a, 20)
+        second = self.spending(bc, self.wallet_a, 15)
+        block = bc.force_block()
+        block.txs = [bc.create_coinbase_tx(10)] + [first, second]
+        block.merkel_root = None
+        block.build_merkel_tree()
+        n = SudokuGenerator(bc.db.config["difficulty"], block.seed).n
+        block.puzzle_solution = SudokuBoard(n, block.seed).encode()
+        return block
+
+    def test_tx_spending_output_twice(self):
+        tx = self.spending(self.a, self.wallet_a, 45, inputs=2)
+        with self.assertRaisesRegex(Exception, "spent twice"):
+            self.a.add_tx(tx)
+        self.assertEqual(len(self.a.mempool), 0)
+
+    def test_block_spending_output_twice(self):
+        block = self.double_spend_block(self.a)
+        before = self.state(self.a)
+        with self.assertRaisesRegex(Exception, "spent twice"):
+            BlockVerifier(self.a.db).verify(self.a.head, block)
+        with self.assertRaisesRegex(Exception, "spent twice"):
+            self.a.add_block(self.copy(block))
+        self.assertEqual(self.state(self.a), before)
+
+    def test_connect_block_is_atomic(self):
+        before = self.state(self.a)
+        with self.assertRaises(KeyError):
+            self.a.connect_block(self.double_spend_block(self.a))
+        self.assertEqual(self.state(self.a), before)
+        self.assertEqual(len(self.a.db.undo_by_block_index), 2)
+        self.mine(self.a)
+
+    def test_reorganize_to_unconnectable_branch(self):
+        a3 = self.mine(self.a)
+        before = self.state(self.a)
+        self.mine(self.b)
+        bad = self.double_spend_block(self.b)
+
+        # Even if verification let it through, the chain goes back to where it was
+        with patch.object(Blockchain, "is_valid_block", return_value=True):
+            self.assertFalse(self.a.add_block(self.copy(self.b.head)))
+            self.assertFalse(self.a.add_block(self.copy(bad)))
+        self.assertEqual(self.state(self.a), before)
+        self.assertEqual(self.a.head.hash(), a3.hash())
+        self.assertNotIn(bad.hash(), self.a.tree)
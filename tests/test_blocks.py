@@ -0,0 +1,122 @@
+import json
+from unittest import TestCase
+
+from blockchain import wire
+from blockchain.blocks import Block, Input, Output, Tx
+from blockchain.merkle import MerkleTree
+
+
+def make_tx() -> Tx:
+    inputs = [
+        Input("ab" * 32, 0, "pubkey", 0, "c2lnbmF0dXJl"),
+        Input("cd" * 32, 1, "pubkey", 0, b"c2lnbmF0dXJl"),
+    ]
+    outputs = [Output("address1", 1.5, 0), Output("address2", 3, 1)]
+    return Tx(inputs, outputs, 1600000000)
+
+
+class TestTx(TestCase):
+    # Hashes computed before the hashes and dicts were cached, they must not change
+    TX_HASH = "91361409c16fda75975b585ed236f53b4b6e1d88d1d826901896dac8e9cd07b9"
+    OUTPUT_HASHES = [
+        "2964d8e919efbc2ada24aec4ac4204eeebad55c4e82288516fcef8c32fce5415",
+        "bc7ea1abea7468f1e3a943852dd370a9c77e3ff939a9e0851b21a58dfbf74d0a",
+    ]
+
+    def test_hashes(self):
+        tx = make_tx()
+        self.assertEqual(tx.hash, self.TX_HASH)
+        self.assertEqual([out.hash for out in tx.outputs], self.OUTPUT_HASHES)
+
+        copy = Tx.from_dict(tx.as_dict)
+        self.assertEqual(copy.hash, self.TX_HASH)
+        self.assertEqual([out.hash for out in copy.outputs], self.OUTPUT_HASHES)
+        self.assertEqual(copy.as_dict, tx.as_dict)
+
+    def test_cached(self):
+        tx = make_tx()
+        self.assertIs(tx.as_dict, tx.as_dict)
+        self.assertIs(tx.inputs[0].as_dict, tx.as_dict["inputs"][0])
+
+    def test_mutation(self):
+        tx = make_tx()
+        tx.as_dict
+        tx.inputs[0].signature = b"b3RoZXI="
+        self.assertEqual(
+            tx.hash, "77127f8f088ce1bc73344bad60e0c702e517f71067d9c8b50643d9d39f079215"
+        )
+        self.assertEqual(
+            [out["hash"] for out in tx.as_dict["outputs"]],
+            [
+                "d39318f9406d99f32050989f92c2dc775bd43fa17013a8ea71be36c34203c9d2",
+                "20942c8f6a57fc6bea4b1c8b5b0c22067b76f6c9ad5b0f841b915831928ee14e",
+            ],
+        )
+
+        before = tx.hash
+        tx.outputs[0].amount = 2.5
+        self.assertNotEqual(tx.hash, before)
+        self.assertEqual(tx.as_dict["outputs"][0]["amount"], 2.5)
+
+        before = tx.hash
+        tx.timestamp += 1
+        self.assertNotEqual(tx.hash, before)
+        self.assertEqual(tx.as_dict["timestamp"], 1600000001)
+
+
+class TestBlock(TestCase):
+    def test_header_and_proof(self):
+        txs = [make_tx()]
+        for timestamp in range(1, 5):
+            tx = make_tx()
+            tx.timestamp = timestamp
+            txs.append(tx)
+        block = Block(txs, 3, "ff" * 32, 1600000000, "solution")
+
+        header = block.header
+        self.assertEqual(header["hash"], block.hash())
+        self.assertEqual(header["merkel_root"], block.merkel_root)
+        self.assertEqual(header["tx_count"], 5)
+        self.assertNotIn("txs", header)
+        self.assertEqual(Block.header_hash(header), block.hash())
+        self.assertNotEqual(
+            Block.header_hash(dict(header, puzzle_solution="other")), block.hash()
+        )
+        for i, tx in enumerate(txs):
+            self.assertTrue(
+                MerkleTree.validate_proof(
+                    block.tx_proof(i), tx.hash, header["merkel_root"]
+                )
+            )
+
+    def test_cached_encodings(self):
+        block = Block([make_tx()], 3, "ff" * 32, 1600000000, "solution")
+        block_hash = block.hash()
+        self.assertIs(block.as_dict, block.as_dict)
+        self.assertEqual(json.loads(block.as_json)["hash"], block_hash)
+        self.assertEqual(
+            wire.join_blocks([block.as_wire]), wire.encode_blocks([block.as_dict])
+        )
+
+        block.hash("other solution")
+        self.assertNotEqual(block.hash(), block_hash)
+        self.assertEqual(json.loads(block.as_json)["puzzle_solution"], "other solution")
+        self.assertEqual(
+            wire.decode_block(wire.join_blocks([block.as_wire]))["puzzle_solution"],
+            "other solution",
+        )
+
+        block_hash = block.hash()
+        block.txs[0].inputs[0].signature = b"b3RoZXI="
+        self.assertNotEqual(json.loads(block.as_json)["txs"][0]["hash"], TestTx.TX_HASH)
+        self.assertEqual(block.hash(), block_hash)  # the merkle root is kept once built
+
+    def test_lazy_from_dict(self):
+        block = Block([make_tx(), make_tx()], 3, "ff" * 32, 1600000000, "solution")
+        copy = Block.from_dict(block.as_dict)
+        self.assertEqual(copy.hash(), block.hash())
+        self.assertEqual(copy.header, block.header)
+        self.assertIsNone(copy._txs)  # nothing needed the txs yet
+
+        self.assertEqual([tx.hash for tx in copy.txs], [tx.hash for tx in block.txs])
+        self.assertEqual(copy.as_dict, block.as_dict)
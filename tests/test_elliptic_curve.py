@@ -0,0 +1,86 @@
+import hashlib
+import random
+from unittest import TestCase
+
+import ecdsa
+
+from blockchain.wallet.address import Address
+from blockchain.wallet.elliptic_curve import EllipticCurvePoint, FixedBaseTable
+
+ORDER = ecdsa.SECP256k1.order
+
+
+def reference_multiply(point: EllipticCurvePoint, times: int) -> EllipticCurvePoint:
+    """Plain affine double-and-add, as __mul__ used to be"""
+    result = EllipticCurvePoint(0, 0, point.curve)
+    while times:
+        if times % 2 == 1:
+            result += point
+        point += point
+        times >>= 1
+    return result
+
+
+class TestScalarMultiplication(TestCase):
+    SCALARS = [0, 1, 2, 3, 15, 16, 17, 31, 32, ORDER - 1, ORDER, ORDER + 1, 2**256 - 1]
+
+    def test_matches_ecdsa(self):
+        rng = random.Random("ecdsa")
+        for k in self.SCALARS + [rng.getrandbits(256) for _ in range(25)]:
+            point = Address.GENERATOR * k
+            expected = ecdsa.SECP256k1.generator * k
+            if expected == ecdsa.ellipticcurve.INFINITY:
+                self.assertTrue(point.is_point_at_infinity())
+            else:
+                self.assertEqual((point.x, point.y), (expected.x(), expected.y()))
+
+    def test_matches_double_and_add(self):
+        rng = random.Random("affine")
+        base = reference_multiply(Address.GENERATOR, 123456789)
+        for k in self.SCALARS + [rng.getrandbits(256) for _ in range(5)]:
+            self.assertEqual(base * k, reference_multiply(base, k))
+            self.assertEqual(k * base, base * k)
+
+    def test_point_at_infinity(self):
+        self.assertTrue((EllipticCurvePoint(0, 0) * 5).is_point_at_infinity())
+
+
+class TestFixedBaseTable(TestCase):
+    def test_matches_multiplication(self):
+        rng = random.Random("table")
+        table = Address.generator_table()
+        for k in TestScalarMultiplication.SCALARS + [
+            rng.getrandbits(256) for _ in range(25)
+        ]:
+            self.assertEqual(table.multiply(k), Address.GENERATOR * k)
+        self.assertEqual(table.multiply(2**300 + 5), Address.GENERATOR * (2**300 + 5))
+
+    def test_serialization(self):
+        table = FixedBaseTable(Address.GENERATOR, window=4)
+        loaded = FixedBaseTable.from_bytes(Address.GENERATOR, table.to_bytes())
+        self.assertEqual(loaded.multiply(123456789), Address.GENERATOR * 123456789)
+        with self.assertRaises(ValueError):
+            FixedBaseTable.from_bytes(Address.GENERATOR * 2, table.to_bytes())
+
+    def test_corrupted_serialization(self):
+        data = FixedBaseTable(Address.GENERATOR, window=4).to_bytes()
+        flipped = bytearray(data)
+        flipped[100] ^= 1
+        for corrupted in (data[:-1], data[:-64], bytes(flipped), b""):
+            with self.assertRaises(ValueError):
+                FixedBaseTable.from_bytes(Address.GENERATOR, corrupted)
+
+    def test_tampered_serialization(self):
+        body = bytearray(FixedBaseTable(Address.GENERATOR, window=4).to_bytes()[:-32])
+        # Another point of the curve in place of the first entry of the second row
+        other = Address.GENERATOR * 3
+        tampered = bytearray(body)
+        tampered[3 + 64 * 15 : 3 + 64 * 16] = other.encode()[1:]
+        # A point off the curve
+        off_curve = bytearray(body)
+        off_curve[3 + 64 * 20] ^= 1
+        for data in (tampered, off_curve):
+            with self.assertRaises(ValueError):
+                FixedBaseTable.from_bytes(
+                    Address.GENERATOR, bytes(data) + hashlib.sha256(data).digest()
+                )
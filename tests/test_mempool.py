@@ -0,0 +1,101 @@
+import random
+from unittest import TestCase
+
+from blockchain.blocks import Input, Output, Tx
+from blockchain.mempool import Mempool, _IndexedHeap
+
+
+def make_tx(prev_tx_hash, output_index=0, timestamp=1600000000) -> Tx:
+    return Tx(
+        [Input(prev_tx_hash, output_index, "pubkey", 0, "c2lnbmF0dXJl")],
+        [Output("address", 1, 0)],
+        timestamp,
+    )
+
+
+class TestIndexedHeap(TestCase):
+    def test_random(self):
+        rng = random.Random(1)
+        heap, keys = _IndexedHeap(), {}
+        for i in range(500):
+            if keys and rng.random() < 0.4:
+                item = rng.choice(list(keys))
+                heap.remove(item)
+                del keys[item]
+            else:
+                keys[i] = (rng.randrange(50), i)
+                heap.push(keys[i], i)
+            expected = sorted(keys, key=keys.get)
+            self.assertEqual(len(heap), len(keys))
+            self.assertEqual(heap.smallest(7), expected[:7])
+        self.assertEqual(heap.smallest(len(keys) + 1), sorted(keys, key=keys.get))
+
+
+class TestMempool(TestCase):
+    def test_top(self):
+        pool = Mempool()
+        txs = [make_tx("%064x" % i) for i in range(10)]
+        for i, tx in enumerate(txs):
+            self.assertTrue(pool.add(tx, [3, 1, 4, 1, 5, 9, 2, 6, 5, 3][i]))
+        self.assertEqual(
+            [fee for _, fee in pool.top(5)],
+            [9, 6, 5, 5, 4],
+        )
+        # First come first on ties
+        self.assertIs(pool.top(3)[2][0], txs[4])
+        self.assertEqual(len(pool.top(20)), 10)
+
+        self.assertIs(pool.remove(txs[5].hash), txs[5])
+        self.assertIsNone(pool.remove(txs[5].hash))
+        self.assertEqual([fee for _, fee in pool.top(2)], [6, 5])
+        self.assertEqual(len(pool), 9)
+
+    def test_conflicts(self):
+        pool = Mempool()
+        tx = make_tx("aa" * 32)
+        self.assertTrue(pool.add(tx, 1))
+        self.assertFalse(pool.add(tx, 1))
+        # Spends the same output
+        self.assertFalse(pool.add(make_tx("aa" * 32, timestamp=1), 5))
+        self.assertTrue(pool.add(make_tx("aa" * 32, 1), 1))
+
+        block_tx = make_tx("aa" * 32, timestamp=2)
+        removed = pool.remove_block_txs([block_tx])
+        self.assertEqual(removed, [tx])
+        self.assertTrue(pool.add(make_tx("aa" * 32, timestamp=3), 1))
+
+    def test_eviction(self):
+        pool = Mempool(max_txs=3)
+        txs = [make_tx("%064x" % i) for i in range(5)]
+        for tx, fee in zip(txs, [2, 1, 3]):
+            pool.add(tx, fee)
+        # Lower than everything in the full pool
+        self.assertFalse(pool.add(txs[3], 0.5))
+        self.assertTrue(pool.add(txs[4], 5))
+        self.assertNotIn(txs[1].hash, pool)
+        self.assertEqual([fee for _, fee in pool.top(3)], [5, 3, 2])
+
+        size = pool.size // 3
+        pool = Mempool(max_bytes=3 * size)
+        for tx, fee in zip(txs, [2, 1, 3]):
+            pool.add(tx, fee)
+        self.assertEqual(pool.size, 3 * size)
+        big = Tx(
+            [Input("ff" * 32, i, "pubkey", 0, "c2lnbmF0dXJl") for i in range(2)],
+            [Output("address", 1, 0)],
+            1600000000,
+        )
+        self.assertTrue(pool.add(big, 10))
+        # Two txs had to go to make room
+        self.assertEqual([tx.hash for tx, _ in pool.top(3)], [big.hash, txs[2].hash])
+        self.assertLessEqual(pool.size, pool.max_bytes)
+
+    def test_expire(self):
+        pool = Mempool(max_age=10)
+        txs = [make_tx("%064x" % i) for i in range(3)]
+        for i, tx in enumerate(txs):
+            pool.add(tx, 1, now=100 + i * 5)
+        self.assertEqual(pool.expire(now=111), [txs[0]])
+        self.assertEqual(pool.expire(now=200), txs[1:])
+        self.assertEqual(len(pool), 0)
+        self.assertEqual(pool.size, 0)
@@ -0,0 +1,73 @@
+from hashlib import sha256
+from unittest import TestCase
+
+from blockchain.merkle import MerkleTree
+
+
+def leaves(n):
+    return [sha256(str(i).encode()).hexdigest() for i in range(n)]
+
+
+class TestMerkleTree(TestCase):
+    # Roots merkletools built for leaves(n)
+    ROOTS = {
+        1: "5feceb66ffc86f38d952786c6d696c79c2dbc239dd4e91b46729d73a27fb57e9",
+        2: "b9b10a1bc77d2a241d120324db7f3b81b2edb67eb8e9cf02af9c95d30329aef5",
+        3: "c80f77387d860fa469920d7ac2f8a959ef83a651f76dc54923734ed76daaef53",
+        5: "ea030edba0761730b75f565d17f9c40ee2b10633c3f4a696197832a6e67edf47",
+        7: "e8a7fae8322910fba7beae39b1bf9f3993236dd79532f17f537cdfeb1fd895e4",
+        8: "3b828c4f4b48c5d4cb5562a474ec9e2fd8d5546fae40e90732ef635892e42720",
+        13: "a7239c7ec6fcdcbe558ebd8d507f38e355b0f0677375ae9cf52e1a046e29fbc7",
+    }
+
+    def test_root(self):
+        self.assertIsNone(MerkleTree().root)
+        for n, root in self.ROOTS.items():
+            self.assertEqual(MerkleTree(leaves(n)).root, root)
+
+    def test_incremental(self):
+        tree = MerkleTree()
+        for n in range(1, 14):
+            tree.append(leaves(n)[-1])
+            if n in self.ROOTS:
+                self.assertEqual(tree.root, self.ROOTS[n])
+
+        tree.truncate(5)
+        self.assertEqual(tree.root, self.ROOTS[5])
+        tree.update_leaf(0, leaves(13)[12])
+        self.assertEqual(tree.root, MerkleTree(leaves(13)[12:13] + leaves(5)[1:]).root)
+        tree.update_leaf(0, leaves(1)[0])
+        tree.extend(leaves(7)[5:])
+        self.assertEqual(tree.root, self.ROOTS[7])
+        self.assertEqual(tree.leaf(6), leaves(7)[6])
+
+    def test_proof(self):
+        tree = MerkleTree(leaves(5))
+        self.assertEqual(
+            tree.get_proof(4),
+            [
+                {
+                    "left": "c478fead0c89b79540638f844c8819d9a4281763af9272c7f3968776b6052345"
+                }
+            ],
+        )
+        self.assertEqual(
+            tree.get_proof(1),
+            [
+                {"left": leaves(1)[0]},
+                {
+                    "right": "a9f5b3ab61e28357cfcd14e2b42397f896aeea8d6998d19e6da85584e150d2b4"
+                },
+                {"right": leaves(5)[4]},
+            ],
+        )
+        self.assertIsNone(tree.get_proof(5))
+
+        for n in self.ROOTS:
+            tree = MerkleTree(leaves(n))
+            for i, leaf in enumerate(leaves(n)):
+                proof = tree.get_proof(i)
+                self.assertTrue(MerkleTree.validate_proof(proof, leaf, tree.root))
+                self.assertFalse(
+                    MerkleTree.validate_proof(proof, leaves(20)[19], tree.root)
+                )
@@ -0,0 +1,39 @@
+from unittest import TestCase
+
+from sudoku.puzzle_cache import PuzzleCache
+from sudoku.sudoku_gen import SudokuGenerator
+
+
+class TestPuzzleCache(TestCase):
+    def test_same_puzzle_as_generator(self):
+        cache = PuzzleCache()
+        board = cache.get_board(25, "seed")
+        self.assertEqual(str(board), str(SudokuGenerator(25, "seed").generate_board()))
+        self.assertEqual(
+            cache.get_encoded(25, "seed"),
+            SudokuGenerator(25, "seed").generate_board().encode(),
+        )
+        self.assertIs(cache.get_board(25, "seed"), board)
+
+    def test_counters(self):
+        cache = PuzzleCache()
+        cache.get_board(25, "seed")
+        cache.get_encoded(25, "seed")
+        cache.get_board(27, "seed")
+        cache.get_board(25, "other")
+        self.assertEqual(cache.stats["hits"], 1)
+        self.assertEqual(cache.stats["misses"], 3)
+        self.assertEqual(cache.stats["size"], 3)
+
+    def test_eviction(self):
+        cache = PuzzleCache(maxsize=2)
+        cache.get_board(25, "a")
+        cache.get_board(25, "b")
+        cache.get_board(25, "a")
+        cache.get_board(25, "c")  # evicts "b", the least recently used
+        cache.get_board(25, "a")
+        self.assertEqual(cache.stats["hits"], 2)
+        cache.get_board(25, "b")
+        self.assertEqual(cache.stats["misses"], 4)
+        cache.resize(1)
+        self.assertEqual(cache.stats["size"], 1)
@@ -0,0 +1,43 @@
+from unittest import TestCase
+
+from sudoku.solver import SolverBudgetExceeded, SudokuSolver, SudokuSolverException
+from sudoku.sudoku_board import SudokuBoard
+from sudoku.sudoku_gen import SudokuGenerator
+
+
+class TestSolver(TestCase):
+    def test_solves_generated_puzzles(self):
+        for difficulty in (22, 25, 100, 800, 10**5, 10**6):
+            puzzle = SudokuGenerator(difficulty, "seed").generate_board()
+            solution = SudokuSolver().solve(puzzle)
+            self.assertTrue(puzzle.is_valid_solution(solution))
+
+    def test_rectangular_boxes(self):
+        for n in (6, 8, 10, 12):
+            puzzle = SudokuBoard(n, "seed")
+            puzzle.hide_squares(4 * n * n // 5)
+            self.assertTrue(puzzle.is_valid_solution(SudokuSolver().solve(puzzle)))
+
+    def test_encoded_puzzle(self):
+        puzzle = SudokuGenerator(300, "seed").generate_board()
+        solution = SudokuSolver().solve(puzzle.encode())
+        self.assertTrue(puzzle.is_valid_solution(solution))
+
+    def test_no_solution(self):
+        # Nothing fits in the second cell of the first row
+        puzzle = SudokuBoard(
+            4, "seed", [[1, 0, 0, 0], [0, 2, 0, 0], [0, 3, 0, 0], [0, 4, 0, 0]]
+        )
+        with self.assertRaises(SudokuSolverException):
+            SudokuSolver().solve(puzzle)
+        puzzle = SudokuBoard(
+            4, "seed", [[1, 1, 0, 0], [0, 0, 0, 0], [0, 0, 0, 0], [0, 0, 0, 0]]
+        )
+        with self.assertRaises(SudokuSolverException):
+            SudokuSolver().solve(puzzle)
+
+    def test_budget(self):
+        puzzle = SudokuBoard(9, "seed", [[0] * 9 for _ in range(9)])
+        with self.assertRaises(SolverBudgetExceeded):
+            SudokuSolver(max_nodes=0).solve(puzzle)
+        self.assertTrue(SudokuSolver(max_nodes=1000).solve(puzzle).solved)
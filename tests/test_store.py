@@ -0,0 +1,217 @@
+import json
+import os
+import tempfile
+from unittest import TestCase
+
+from blockchain.blockchain import Blockchain
+from blockchain.blocks import Block, Input, Output, Tx
+from blockchain.db import PersistentDB
+from blockchain.store import BlockStore, StoreCorrupted
+from blockchain.wallet.address import Address
+
+
+def make_block(index, prev_hash) -> Block:
+    txs = [
+        Tx(
+            [Input("COINBASE", 0, "pubkey", 0, "c2lnbmF0dXJl")],
+            [Output("address%s" % index, 25, 0)],
+            1600000000 + index,
+        )
+    ]
+    return Block(txs, index, prev_hash, 1600000000 + index)
+
+
+def make_chain(length):
+    blocks, prev_hash = [], 0x0
+    for index in range(length):
+        blocks.append(make_block(index, prev_hash))
+        prev_hash = blocks[-1].hash()
+    return blocks
+
+
+class TestBlockStore(TestCase):
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.path = self.dir.name
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def test_append_and_reopen(self):
+        blocks = make_chain(5)
+        store = BlockStore(self.path)
+        for block in blocks:
+            store.append(block)
+        store.close()
+
+        store = BlockStore(self.path, cache_size=0)
+        self.assertEqual(len(store), 5)
+        self.assertEqual([b.hash() for b in store], [b.hash() for b in blocks])
+        self.assertEqual(store[-1].as_dict, blocks[-1].as_dict)
+        self.assertEqual([b.index for b in store[1:3]], [1, 2])
+        self.assertEqual(store.height_of(blocks[3].hash()), 3)
+        tx = blocks[2].txs[0]
+        self.assertEqual(store.tx(tx.hash), tx.as_dict)
+        self.assertEqual(store.tx_height(tx.hash), 2)
+        self.assertIsNone(store.tx("00" * 32))
+        with self.assertRaises(IndexError):
+            store[5]
+        store.close()
+
+    def test_records_are_not_pickled(self):
+        store = BlockStore(self.path)
+        store.save_undo(3, {"created": [("aa", 0)], "spent": [], "fees": [("aa", 1.5)]})
+        store.set_state("difficulty", 24)
+        store.close()
+
+        store = BlockStore(self.path)
+        (data,) = store._index.execute("SELECT data FROM undo").fetchone()
+        self.assertEqual(json.loads(data)["fees"], [["aa", 1.5]])
+        self.assertEqual(
+            store.pop_undo(3),
+            {"created": [["aa", 0]], "spent": [], "fees": [["aa", 1.5]]},
+        )
+        self.assertIsNone(store.pop_undo(3))
+        self.assertEqual(store.get_state("difficulty"), 24)
+        self.assertEqual(store.get_state("other", 7), 7)
+        store.close()
+
+    def test_pop(self):
+        blocks = make_chain(3)
+        store = BlockStore(self.path)
+        for block in blocks:
+            store.append(block)
+        self.assertEqual(store.pop().hash(), blocks[2].hash())
+        self.assertIsNone(store.tx_height(blocks[2].txs[0].hash))
+        # The popped record stays in the log, the next block goes after it
+        other = make_block(2, blocks[1].hash())
+        other.timestamp += 1
+        store.append(other)
+        store.close()
+
+        store = BlockStore(self.path, cache_size=0)
+        self.assertEqual(
+            [b.hash() for b in store], [b.hash() for b in blocks[:2]] + [other.hash()]
+        )
+        store.close()
+
+    def test_uncommitted_blocks_dropped(self):
+        blocks = make_chain(3)
+        store = BlockStore(self.path, sync_every=2)
+        for block in blocks:
+            store.append(block)
+            store.commit()
+        # Simulates a crash: the last block was never committed
+        store._log.flush()
+        store._index.close()
+
+        store = BlockStore(self.path)
+        self.assertEqual(len(store), 2)
+        self.assertEqual(
+            os.path.getsize(os.path.join(self.path, BlockStore.LOG_FILE)),
+            store._index.execute(
+                "SELECT MAX(offset + 8 + size) FROM blocks"
+            ).fetchone()[0],
+        )
+        store.close()
+
+    def test_corruption_detected(self):
+        store = BlockStore(self.path)
+        store.append(make_block(0, 0x0))
+        store.close()
+        with open(os.path.join(self.path, BlockStore.LOG_FILE), "r+b") as fp:
+            fp.seek(12)
+            byte = fp.read(1)
+            fp.seek(12)
+            fp.write(bytes([byte[0] ^ 0xFF]))
+
+        store = BlockStore(self.path, cache_size=0)
+        with self.assertRaises(StoreCorrupted):
+            store[0]
+        store.close()
+
+
+class TestPersistentDB(TestCase):
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.path = self.dir.name
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def add_blocks(self, bc, count):
+        for _ in range(count):
+            block = bc.force_block()
+            bc.chain.append(block)
+            bc.db.increment_difficulty()
+            bc.rollover_block(block)
+
+    def test_restart(self):
+        wallet = Address.create()
+        db = PersistentDB(self.path)
+        bc = Blockchain(db, wallet)
+        self.add_blocks(bc, 3)
+        head, difficulty = bc.head.hash(), db.config["difficulty"]
+        balances = db.utxos.by_address(wallet.to_address())
+        db.close()
+
+        db = PersistentDB(self.path)
+        bc = Blockchain(db, wallet)
+        self.assertEqual(len(bc.chain), 3)
+        self.assertEqual(bc.head.hash(), head)
+        self.assertEqual(db.config["difficulty"], difficulty)
+        self.assertEqual(db.block_index, 2)
+        self.assertEqual(db.utxos.by_address(wallet.to_address()), balances)
+        tx = bc.head.txs[0]
+        self.assertEqual(db.transaction_by_hash[tx.hash], tx.as_dict)
+        self.assertEqual(db.block_index_by_tx_hash[tx.hash], 2)
+        db.close()
+
+    def test_rollback(self):
+        db = PersistentDB(self.path)
+        bc = Blockchain(db, Address.create())
+        self.add_blocks(bc, 2)
+        tx = bc.head.txs[0]
+        balances = db.utxos.by_address(bc.wallet.to_address())
+        bc.rollback_block()
+        self.assertEqual(len(bc.chain), 1)
+        self.assertNotIn(tx.hash, db.block_index_by_tx_hash)
+        self.assertNotIn(tx.hash, db.transaction_by_hash)
+        self.assertEqual(db.utxos.by_address(bc.wallet.to_address()), balances[:1])
+        db.close()
+
+        # The undo records are kept with the blocks, with the outputs they spent
+        db = PersistentDB(self.path)
+        bc = Blockchain(db, bc.wallet)
+        wallet = bc.wallet
+        tx_hash, index, utxo = db.utxos.by_address(wallet.to_address())[0]
+        inp = Input(tx_hash, index, wallet.to_public_key().encode_b64(), 0)
+        inp.sign(wallet)
+        self.assertTrue(bc.add_tx(Tx([inp], [Output(wallet.to_address(), 20, 0)])))
+        self.add_blocks(bc, 1)
+        self.assertIsNone(db.utxos.get(tx_hash, index))
+        db.close()
+
+        db = PersistentDB(self.path)
+        bc = Blockchain(db, wallet)
+        bc.rollback_block()
+        self.assertEqual(db.utxos.get(tx_hash, index), utxo)
+        bc.rollback_block()
+        self.assertEqual(len(bc.chain), 0)
+        self.assertEqual(len(db.utxos), 0)
+        db.close()
+
+    def test_unspent_outputs_filled_for_old_stores(self):
+        wallet = Address.create()
+        db = PersistentDB(self.path)
+        self.add_blocks(Blockchain(db, wallet), 2)
+        balances = db.utxos.by_address(wallet.to_address())
+        # As written before the unspent outputs were stored
+        db.chain._index.execute("DELETE FROM utxos")
+        db.chain._index.execute("DELETE FROM state WHERE key = 'utxos'")
+        db.chain._index.commit()
+        db.chain.close()
+
+        db = PersistentDB(self.path)
+        self.assertEqual(db.utxos.by_address(wallet.to_address()), balances)
+        db.close()
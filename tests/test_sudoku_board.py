@@ -1,6 +1,10 @@
+import base64
+import json
+import pickle
+import random
 import unittest
 
-from sudoku.sudoku_board import SudokuBoard
+from sudoku.sudoku_board import SudokuBoard, SudokuBoardException
 
 
 class TestValidLocation(unittest.TestCase):
@@ -87,6 +91,27 @@ class TestGenerate(unittest.TestCase):
         )
         self.assertFalse(board.solved)
 
+    def test_valid_matches_per_cell_check(self):
+        rng = random.Random("valid")
+        for n in (4, 6, 8, 9, 12):
+            for _ in range(25):
+                board = SudokuBoard(n, str(rng.random()))
+                for _ in range(rng.randint(0, 3)):
+                    row, col = rng.randrange(n), rng.randrange(n)
+                    board.board[row][col] = rng.randint(0, n + 1)
+                expected = all(
+                    board._is_valid_location(row, col, board.board[row][col])
+                    for row in range(n)
+                    for col in range(n)
+                )
+                self.assertEqual(board.valid, expected)
+
+    def test_valid_large(self):
+        board = SudokuBoard(143, "seed")
+        self.assertTrue(board.valid)
+        board.board[5][7], board.board[5][8] = board.board[5][8], board.board[5][7]
+        self.assertFalse(board.valid)
+
     def test_generate_solved(self):
         board = SudokuBoard(4, "seed")
         self.assertTrue(board.valid)
@@ -98,6 +123,28 @@ class TestGenerate(unittest.TestCase):
         self.assertEqual(len(board.board), 6)
         self.assertEqual(len(board.board[0]), 6)
 
+    def test_flat_cells(self):
+        board = SudokuBoard(8, "seed")
+        self.assertEqual(len(board.cells), 64)
+        self.assertEqual(board.cells.itemsize, 1)
+        self.assertEqual(board.board[2], list(board.cells[16:24]))
+        row = board.board[2]
+        row[3] = 0  # Row writes go through to the cells
+        self.assertEqual(board.cells[19], 0)
+        self.assertEqual(board.board[2], row)
+        with self.assertRaises(SudokuBoardException):
+            row[3] = -1
+        copy = pickle.loads(pickle.dumps(board))
+        self.assertEqual(str(copy), str(board))
+
+    def test_board_rows(self):
+        rows = [[1, 4, 2, 3], [2, 3, 1, 4], [4, 2, 3, 1], [3, 1, 4, 2]]
+        board = SudokuBoard(4, "seed", rows)
+        self.assertEqual(board.board, rows)
+        for bad in ([[1, 2, 3]], rows[:3], rows[:3] + [[3, 1, 4]]):
+            with self.assertRaises(SudokuBoardException):
+                SudokuBoard(4, "seed", bad)
+
 
 class TestOtherIsValid(unittest.TestCase):
     def test_empty_board(self):
@@ -113,7 +160,63 @@ class TestOtherIsValid(unittest.TestCase):
         board.hide_squares(10)
         self.assertTrue(board.is_valid_solution(SudokuBoard(4, "seed")))
 
+    def test_different_size(self):
+        board = SudokuBoard(4, "seed")
+        board.hide_squares(16)
+        self.assertFalse(board.is_valid_solution(SudokuBoard(6, "seed")))
+
     def test_some_removed_invalid(self):
         board = SudokuBoard(4, "seed")
         board.hide_squares(10)
         self.assertFalse(board.is_valid_solution(SudokuBoard(4, "seedfsdf")))
+
+
+class TestEncoding(unittest.TestCase):
+    def test_round_trip(self):
+        for n in (3, 4, 6, 8, 9, 15, 16, 143, 256):
+            board = SudokuBoard(n, "seed")
+            board.hide_squares(n * n // 2)
+            decoded = SudokuBoard.decode(board.encode())
+            self.assertEqual(decoded.n, n)
+            self.assertEqual(decoded.seed, "seed")
+            self.assertEqual(str(decoded), str(board))
+            self.assertTrue(decoded.is_valid_solution(SudokuBoard(n, "seed")))
+
+    def test_legacy_format(self):
+        board = SudokuBoard(9, "seed")
+        board.hide_squares(40)
+        legacy = base64.b64encode(
+            json.dumps(
+                {
+                    "n": board.n,
+                    "seed": board.seed,
+                    "board": board.board,
+                    "box_size": board._get_box_size(),
+                }
+            ).encode()
+        ).decode()
+        self.assertEqual(str(SudokuBoard.decode(legacy)), str(board))
+        self.assertLess(len(board.encode()), len(legacy) // 4)
+
+    def test_long_seed(self):
+        board = SudokuBoard(4, "s" * 65535)
+        self.assertEqual(SudokuBoard.decode(board.encode()).seed, board.seed)
+        with self.assertRaises(SudokuBoardException):
+            SudokuBoard(4, "s" * 65536).encode()
+
+    def test_invalid(self):
+        encoded = base64.b64decode(SudokuBoard(8, "seed").encode())
+        with self.assertRaises(SudokuBoardException):
+            SudokuBoard.decode(base64.b64encode(b"\x02" + encoded[1:]))
+        with self.assertRaises(SudokuBoardException):
+            SudokuBoard.decode(base64.b64encode(encoded[:-1]))
+        with self.assertRaises(SudokuBoardException):
+            # 8x8 board claiming 4x2 boxes
+            SudokuBoard.decode(
+                base64.b64encode(
+                    encoded[:5]
+                    + (4).to_bytes(4, "big")
+                    + (2).to_bytes(4, "big")
+                    + encoded[13:]
+                )
+            )
@@ -1,5 +1,6 @@
 from unittest import TestCase
 
+from sudoku.sudoku_board import SudokuBoard
 from sudoku.sudoku_gen import SudokuGenerator
 
 
@@ -16,3 +17,19 @@ class TestSudokuGen(TestCase):
         board1 = s.generate_board()
         board2 = SudokuGenerator.decode(s.encode()).generate_board()
         self.assertEqual(board1.__str__(), board2.__str__())
+
+    def test_generate_many(self):
+        specs = [(25, "seed"), (300, "seed"), (25, "other")]
+        boards = SudokuGenerator.generate_many(specs, max_workers=2)
+        for (difficulty, seed), board in zip(specs, boards):
+            self.assertEqual(
+                str(board), str(SudokuGenerator(difficulty, seed).generate_board())
+            )
+
+    def test_verify_many(self):
+        solution = SudokuBoard(6, "seed").encode()
+        results = SudokuGenerator.verify_many(
+            [(25, "seed", solution), (25, "other", solution), (25, "seed", "garbage")],
+            max_workers=2,
+        )
+        self.assertEqual(results, [True, False, False])
@@ -0,0 +1,51 @@
+import tempfile
+from unittest import TestCase
+
+from blockchain.store import BlockStore
+from blockchain.utxo import UTXO, UTXOSet
+
+
+class TestUTXOSet(TestCase):
+    def make_set(self):
+        return UTXOSet()
+
+    def test_add_spend(self):
+        utxos = self.make_set()
+        utxos.add("aa", 0, "alice", 1.123456789, "h0")
+        utxos.add("aa", 1, "bob", 2, "h1")
+        utxos.add("bb", 0, "alice", 3, "h2")
+        self.assertEqual(len(utxos), 3)
+        self.assertEqual(utxos.get("aa", 0), UTXO("alice", 1.1234568, "h0"))
+        self.assertIsNone(utxos.get("aa", 2))
+        self.assertEqual(
+            utxos.by_address("alice"),
+            [
+                ("aa", 0, UTXO("alice", 1.1234568, "h0")),
+                ("bb", 0, UTXO("alice", 3, "h2")),
+            ],
+        )
+        self.assertAlmostEqual(utxos.balance("alice"), 4.1234568)
+
+        self.assertEqual(utxos.spend("aa", 0), UTXO("alice", 1.1234568, "h0"))
+        self.assertIsNone(utxos.get("aa", 0))
+        self.assertEqual([index for _, index, _ in utxos.by_address("bob")], [1])
+        self.assertEqual(utxos.balance("alice"), 3)
+        with self.assertRaises(KeyError):
+            utxos.spend("aa", 0)
+
+        utxos.spend("bb", 0)
+        self.assertEqual(utxos.by_address("alice"), [])
+        self.assertEqual(utxos.balance("nobody"), 0)
+
+
+class TestStoredUTXOSet(TestUTXOSet):
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.store = BlockStore(self.dir.name)
+
+    def tearDown(self):
+        self.store.close()
+        self.dir.cleanup()
+
+    def make_set(self):
+        return self.store.utxos
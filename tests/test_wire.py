@@ -0,0 +1,79 @@
+import base64
+from unittest import TestCase
+
+from blockchain import wire
+from blockchain.blocks import Block, Input, Output, Tx
+
+
+def make_block(index=1, prev_hash="ab" * 32) -> Block:
+    coinbase = Tx(
+        [Input("COINBASE", 0, "pubkey", 0, b"c2lnbmF0dXJl")],
+        [Output("miner", 25, 0)],
+        5,
+    )
+    tx = Tx(
+        [Input("cd" * 32, 1, base64.b64encode(bytes(65)).decode(), 0, "c2lnbmF0dXJl")],
+        [Output("address1", 1.25, 0), Output("address2", 0.1234567, 1)],
+        6,
+    )
+    return Block(
+        [coinbase, tx],
+        index,
+        prev_hash,
+        1600000000,
+        base64.b64encode(b"solution").decode(),
+    )
+
+
+class TestWire(TestCase):
+    def test_block_round_trip(self):
+        for block in (make_block(), make_block(0, 0x0)):
+            data = block.as_dict
+            decoded = wire.decode_block(wire.encode_block(data))
+            self.assertEqual(decoded["prev_hash"], data["prev_hash"])
+            self.assertEqual(decoded["puzzle_solution"], data["puzzle_solution"])
+            self.assertEqual(decoded["merkel_root"], data["merkel_root"])
+            self.assertEqual(
+                Block.from_dict(decoded).as_dict, Block.from_dict(data).as_dict
+            )
+            self.assertEqual(Block.from_dict(decoded).hash(), block.hash())
+
+        data = [make_block(i).as_dict for i in range(3)]
+        self.assertEqual(
+            [
+                Block.from_dict(b).hash()
+                for b in wire.decode_blocks(wire.encode_blocks(data))
+            ],
+            [b["hash"] for b in data],
+        )
+
+    def test_tx_round_trip(self):
+        for tx in make_block().txs:
+            decoded = wire.decode_tx(wire.encode_tx(tx.as_dict))
+            # signatures keep their type, it is part of the output hashes
+            self.assertEqual(decoded["inputs"][0]["signature"], tx.inputs[0].signature)
+            self.assertEqual(
+                Tx.from_dict(decoded).as_dict, Tx.from_dict(tx.as_dict).as_dict
+            )
+
+    def test_almost_hex_strings(self):
+        tx = make_block().txs[0].as_dict
+        for address in ("ab" * 30 + "  ab", "ab" * 31 + "\nab", "AB" * 32, "ab" * 32):
+            data = dict(tx, outputs=[dict(tx["outputs"][0], address=address)])
+            decoded = wire.decode_tx(wire.encode_tx(data))
+            self.assertEqual(decoded["outputs"][0]["address"], address)
+            self.assertEqual(
+                decoded["outputs"][0]["amount"], tx["outputs"][0]["amount"]
+            )
+
+    def test_smaller_than_json(self):
+        data = make_block().as_dict
+        self.assertLess(len(wire.encode_block(data)), len(repr(data)) // 2)
+
+    def test_invalid(self):
+        encoded = wire.encode_block(make_block().as_dict)
+        for data in (b"", b"\x02" + encoded[1:], encoded[:-1], encoded + b"\x00"):
+            with self.assertRaises(wire.WireFormatException):
+                wire.decode_block(data)
+        with self.assertRaises(wire.WireFormatException):
+            wire.encode_tx({"inputs": [], "outputs": [], "timestamp": -1})
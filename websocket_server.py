@@ -1,4 +1,3 @@
-import websockets
 import asyncio
 from typing_extensions import TypedDict
 from threading import Thread
@@ -40,6 +39,8 @@ class WebsocketServer:
     def start(self):
         """Start the websocket server in a separate thread"""
 
+        import websockets
+
         def run():
             loop = asyncio.new_event_loop()
             asyncio.set_event_loop(loop)